@@ -1,10 +1,5 @@
-from backend.connections import get_neo4j_driver, get_redis_client, get_mysql_conn, get_openai_client
+from backend.connections import get_redis_client, get_mysql_conn, get_openai_client, close_all_connections
 
-def close_neo4j_connection():
-    driver = get_neo4j_driver()
-    if driver:
-        driver.close()
-
-# 注册关闭函数
+# 注册关闭函数：只关闭已经创建的连接，不会在退出时新建连接
 import atexit
-atexit.register(close_neo4j_connection) 
\ No newline at end of file
+atexit.register(close_all_connections)
@@ -1,29 +1,34 @@
 from django.apps import AppConfig
+from django.conf import settings
+import os
+import sys
 import logging
+import importlib
+
+logger = logging.getLogger(__name__)
+
+# 会预热后端的管理命令，其余命令（migrate 等）不预热
+WARM_UP_COMMANDS = ('runserver',)
 
 class BackendConfig(AppConfig):
     name = 'backend'
     verbose_name = '后端服务'
 
     def ready(self):
-        from backend.connections import get_neo4j_driver, get_redis_client, get_mysql_conn, get_openai_client
-        try:
-            get_neo4j_driver()
-            logging.info("=== Neo4j实例初始化成功 ===")
-        except Exception as e:
-            logging.error(f"=== Neo4j实例初始化失败: {e} ===")
-        try:
-            get_redis_client()
-            logging.info("=== Redis实例初始化成功 ===")
-        except Exception as e:
-            logging.error(f"=== Redis实例初始化失败: {e} ===")
-        try:
-            get_mysql_conn()
-            logging.info("=== MySQL实例初始化成功 ===")
-        except Exception as e:
-            logging.error(f"=== MySQL实例初始化失败: {e} ===")
-        try:
-            get_openai_client()
-            logging.info("=== OpenAI/Ark实例初始化成功 ===")
-        except Exception as e:
-            logging.error(f"=== OpenAI/Ark实例初始化失败: {e} ===") 
\ No newline at end of file
+        """后端连接改为首次使用时创建；开启 BACKEND_WARMUP 时在服务进程中并行预热"""
+        if not getattr(settings, 'BACKEND_WARMUP', False) or not self._is_server_process():
+            return
+        from backend.registry import services
+        # 图谱存储在首次导入时登记，预热前先导入
+        importlib.import_module('backend.graph_store')
+        services.warm_up(timeout=settings.BACKEND_WARMUP_TIMEOUT)
+
+    @staticmethod
+    def _is_server_process():
+        """manage.py 管理命令（migrate 等）不预热；runserver 只在自动重载的子进程中预热"""
+        if not sys.argv or not os.path.basename(sys.argv[0]).startswith('manage'):
+            return True
+        command = sys.argv[1] if len(sys.argv) > 1 else ''
+        if command not in WARM_UP_COMMANDS:
+            return False
+        return '--noreload' in sys.argv or os.environ.get('RUN_MAIN') == 'true'
@@ -0,0 +1,77 @@
+"""
+熔断器模块
+
+后端持续故障时快速失败，由调用方改走本地逻辑；大模型网关与Neo4j查询共用。
+"""
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败 failure_threshold 次后打开，cooldown 秒内直接拒绝；冷却结束后
+    进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。探测请求
+    超过 cooldown 仍无结果时允许再放行一个。
+
+    Args:
+        failure_threshold (int): 连续失败多少次后打开
+        cooldown (float): 打开后的冷却秒数
+        name (str): 日志中显示的后端名称
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, cooldown=30, name=''):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._probe_started = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """是否允许发起请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._probe_started = None
+            if self.state == self.HALF_OPEN and (
+                    self._probe_started is None or now - self._probe_started >= self.cooldown):
+                self._probe_started = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probe_started = None
+            if self.state != self.CLOSED:
+                logger.info("%s熔断器关闭，恢复正常调用", self.name)
+            self.state = self.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_started = None
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("%s熔断器打开: 连续失败 %s 次，%s 秒内快速失败", self.name, self._failures, self.cooldown)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release_probe(self):
+        """放行后没有真正调用后端时归还半开状态的探测名额，不影响失败计数"""
+        with self._lock:
+            self._probe_started = None
@@ -0,0 +1,201 @@
+"""
+缓存序列化模块
+
+Redis中的图谱查询缓存和会话数据统一用本模块编码，包括：
+- codec.dumps() / codec.loads()：紧凑的二进制编码（orjson或msgpack，超过阈值时压缩）；
+  不带编码头的旧值按JSON文本解码，旧数据不需要停机迁移，下次写入时自动换成新格式
+- CacheSerializer：django_redis 序列化器，替代默认的pickle；旧的pickle值仍可读取。
+  该缓存同时承载缓存会话、接口限流等第三方数据，只有完全由JSON原生类型构成的值
+  才用紧凑编码，其余的值（元组、datetime、UUID、非字符串键的dict、缓存的用户对象等）
+  仍用pickle，读回的类型与写入时一致
+- recode_cache 命令用 codec.is_encoded() 找出仍为旧格式的键并批量转换
+
+编码格式：b'\\x00' + 序列化方式(1字节) + 压缩方式(1字节) + 数据。旧的JSON文本
+不会以 \\x00 开头，pickle以 \\x80 开头，因此新旧格式可以直接区分。
+"""
+
+import json
+import zlib
+import pickle
+import logging
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'\x00'
+HEADER_SIZE = 3
+
+
+def _json_dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _load_orjson():
+    import orjson
+    # 不自动转换datetime、dataclass、str子类等，无法原样表示的值直接报错
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_PASSTHROUGH_SUBCLASS
+    return (lambda obj: orjson.dumps(obj, option=option)), orjson.loads
+
+
+def _load_msgpack():
+    import msgpack
+    return (
+        lambda obj: msgpack.packb(obj, use_bin_type=True),
+        lambda data: msgpack.unpackb(data, raw=False, strict_map_key=False)
+    )
+
+
+def _load_zstd():
+    import zstandard
+    compressor = zstandard.ZstdCompressor(level=3)
+    decompressor = zstandard.ZstdDecompressor()
+    return compressor.compress, decompressor.decompress
+
+
+def _load_lz4():
+    import lz4.frame
+    return lz4.frame.compress, lz4.frame.decompress
+
+
+# 名称 -> (编码头字节, 加载函数)；加载函数返回 (编码函数, 解码函数)，可选依赖在首次使用时才导入
+SERIALIZERS = {
+    'json': (b'j', lambda: (_json_dumps, json.loads)),
+    'orjson': (b'o', _load_orjson),
+    'msgpack': (b'm', _load_msgpack),
+    'pickle': (b'p', lambda: ((lambda obj: pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)), pickle.loads)),
+}
+COMPRESSORS = {
+    'none': (b'n', lambda: ((lambda data: data), (lambda data: data))),
+    'zlib': (b'z', lambda: ((lambda data: zlib.compress(data, 3)), zlib.decompress)),
+    'zstd': (b's', _load_zstd),
+    'lz4': (b'l', _load_lz4),
+}
+# auto 时按顺序选第一个已安装的
+AUTO_SERIALIZERS = ('orjson', 'msgpack', 'json')
+AUTO_COMPRESSORS = ('zstd', 'lz4', 'zlib')
+
+
+class Codec:
+    """缓存编码器
+
+    Args:
+        serializer (str): auto / orjson / msgpack / json
+        compression (str): auto / zstd / lz4 / zlib / none
+        compress_min_bytes (int): 序列化结果达到该字节数才压缩，压缩后不变小时保留原文
+    """
+
+    def __init__(self, serializer=None, compression=None, compress_min_bytes=None):
+        self._loaded = {}
+        self.serializer = self._choose(
+            serializer or getattr(settings, 'CACHE_SERIALIZER', 'auto'), SERIALIZERS, AUTO_SERIALIZERS, 'json')
+        self.compression = self._choose(
+            compression or getattr(settings, 'CACHE_COMPRESSION', 'auto'), COMPRESSORS, AUTO_COMPRESSORS, 'zlib')
+        self.compress_min_bytes = (getattr(settings, 'CACHE_COMPRESS_MIN_BYTES', 1024)
+                                   if compress_min_bytes is None else compress_min_bytes)
+        # 编码头字节 -> 名称，解码时使用
+        self._serializer_names = {tag: name for name, (tag, _) in SERIALIZERS.items()}
+        self._compressor_names = {tag: name for name, (tag, _) in COMPRESSORS.items()}
+
+    def _load(self, table, name):
+        key = (id(table), name)
+        if key not in self._loaded:
+            self._loaded[key] = table[name][1]()
+        return self._loaded[key]
+
+    def _choose(self, name, table, auto, default):
+        """选择实现：auto 时取第一个已安装的；指定的实现未安装时退回默认实现并告警"""
+        candidates = auto if name == 'auto' else (name,)
+        for candidate in candidates:
+            if candidate not in table:
+                logger.warning("未知的缓存编码方式: %s", candidate)
+                continue
+            try:
+                self._load(table, candidate)
+                return candidate
+            except ImportError:
+                if name != 'auto':
+                    logger.warning("缓存编码方式 %s 的依赖未安装，改用 %s", candidate, default)
+        return default
+
+    def dumps(self, obj, serializer=None):
+        """编码为带编码头的字节串
+
+        Raises:
+            TypeError: 对象无法用所选序列化方式表示
+        """
+        name = serializer or self.serializer
+        try:
+            data = self._load(SERIALIZERS, name)[0](obj)
+        except (TypeError, ValueError, OverflowError):
+            if name in ('json', 'pickle'):
+                raise
+            # orjson/msgpack 不支持的值（如超出64位的整数）改用标准库json
+            name = 'json'
+            data = _json_dumps(obj)
+        compression = 'none'
+        if self.compression != 'none' and len(data) >= self.compress_min_bytes:
+            compressed = self._load(COMPRESSORS, self.compression)[0](data)
+            if len(compressed) < len(data):
+                data, compression = compressed, self.compression
+        return MAGIC + SERIALIZERS[name][0] + COMPRESSORS[compression][0] + data
+
+    def loads(self, data, allow_pickle=False):
+        """解码 dumps() 的结果；不带编码头的旧值按JSON文本（allow_pickle 时也按pickle）解码"""
+        if isinstance(data, str):
+            return json.loads(data)
+        data = bytes(data)
+        if not self.is_encoded(data):
+            if allow_pickle and data[:1] == b'\x80':
+                return pickle.loads(data)
+            return json.loads(data)
+        serializer = self._serializer_names.get(data[1:2])
+        compressor = self._compressor_names.get(data[2:3])
+        if serializer is None or compressor is None or (serializer == 'pickle' and not allow_pickle):
+            raise ValueError(f"无法识别的缓存编码头: {data[:HEADER_SIZE]!r}")
+        payload = self._load(COMPRESSORS, compressor)[1](data[HEADER_SIZE:])
+        return self._load(SERIALIZERS, serializer)[1](payload)
+
+    @staticmethod
+    def is_encoded(data):
+        """是否为本模块编码的值"""
+        return isinstance(data, (bytes, bytearray, memoryview)) and bytes(data[:1]) == MAGIC
+
+
+# 创建全局编码器实例
+codec = Codec()
+
+
+_PLAIN_SCALARS = (str, int, float, bool, type(None))
+
+
+def _is_plain(value):
+    """是否完全由JSON原生类型构成：dict的键均为字符串，不含元组、子类等解码后类型会改变的值"""
+    cls = type(value)
+    if cls in _PLAIN_SCALARS:
+        return True
+    if cls is list:
+        return all(_is_plain(item) for item in value)
+    if cls is dict:
+        return all(type(key) is str and _is_plain(item) for key, item in value.items())
+    return False
+
+
+class CacheSerializer:
+    """django_redis 序列化器（settings.CACHES 的 OPTIONS.SERIALIZER）
+
+    读回的值与写入的值类型完全一致：JSON原生类型用紧凑编码，其余一律用pickle。
+    """
+
+    def __init__(self, options=None):
+        self.options = options or {}
+
+    def dumps(self, value):
+        if _is_plain(value):
+            try:
+                return codec.dumps(value)
+            except (TypeError, ValueError, OverflowError):
+                pass
+        return codec.dumps(value, serializer='pickle')
+
+    def loads(self, value):
+        return codec.loads(value, allow_pickle=True)
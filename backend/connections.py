@@ -3,34 +3,47 @@
 
 提供各种外部服务的连接管理，包括：
 - Neo4j数据库连接
-- OpenAI API客户端
-- Redis连接
+- OpenAI API客户端及调用网关
+- Redis连接（文本连接，以及存取二进制编码数据的连接）
 - MySQL连接
+
+各连接在首次获取时才创建，驱动库也在此时才导入；全部登记到服务注册中心，
+可在启动时按需并行预热（见 backend.registry）。
 """
 
 import logging
-from neo4j import GraphDatabase
-from openai import OpenAI
-import redis
-import mysql.connector
+import threading
 from django.conf import settings
+from backend.metrics import InstrumentedRedis
+from backend.registry import services
 
 logger = logging.getLogger(__name__)
 
 # 全局连接实例
 _neo4j_driver = None
 _openai_client = None
+_llm_gateway = None
 _redis_client = None
+_redis_binary_client = None
 _mysql_conn = None
 
+# 防止请求线程与预热线程同时创建同一连接；按后端分锁，某个后端连接缓慢不影响其他后端
+_init_locks = {name: threading.Lock() for name in ('neo4j', 'openai', 'llm', 'redis', 'redis_binary', 'mysql')}
+
 def get_neo4j_driver():
     """获取Neo4j数据库连接"""
     global _neo4j_driver
-    if _neo4j_driver is None:
+    if _neo4j_driver is not None:
+        return _neo4j_driver
+    with _init_locks['neo4j']:
+        if _neo4j_driver is not None:
+            return _neo4j_driver
         try:
+            from neo4j import GraphDatabase
             _neo4j_driver = GraphDatabase.driver(
                 settings.NEO4J_URI,
-                auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+                auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD),
+                connection_timeout=settings.NEO4J_CONNECTION_TIMEOUT
             )
             logger.info("Neo4j连接成功")
         except Exception as e:
@@ -40,8 +53,13 @@ def get_neo4j_driver():
 def get_openai_client():
     """获取API客户端"""
     global _openai_client
-    if _openai_client is None:
+    if _openai_client is not None:
+        return _openai_client
+    with _init_locks['openai']:
+        if _openai_client is not None:
+            return _openai_client
         try:
+            from openai import OpenAI
             _openai_client = OpenAI(
                 api_key=settings.OPENAI_API_KEY,
                 base_url=settings.OPENAI_BASE_URL
@@ -51,28 +69,86 @@ def get_openai_client():
             logger.error(f"API客户端初始化失败: {str(e)}")
     return _openai_client
 
+def get_llm_gateway():
+    """获取大模型调用网关（超时、并发上限、重试与熔断）"""
+    global _llm_gateway
+    if _llm_gateway is not None:
+        return _llm_gateway
+    client = get_openai_client()
+    if client is None:
+        return None
+    with _init_locks['llm']:
+        if _llm_gateway is not None:
+            return _llm_gateway
+        from backend.llm_gateway import LLMGateway
+        _llm_gateway = LLMGateway(
+            client,
+            timeout=settings.LLM_TIMEOUT,
+            max_concurrency=settings.LLM_MAX_CONCURRENCY,
+            max_retries=settings.LLM_MAX_RETRIES,
+            backoff_base=settings.LLM_RETRY_BACKOFF,
+            breaker_threshold=settings.LLM_BREAKER_THRESHOLD,
+            breaker_cooldown=settings.LLM_BREAKER_COOLDOWN,
+            hedge_delay=settings.LLM_HEDGE_DELAY
+        )
+        logger.info("大模型调用网关初始化成功")
+    return _llm_gateway
+
 def get_redis_client():
     """获取Redis连接"""
     global _redis_client
-    if _redis_client is None:
+    if _redis_client is not None:
+        return _redis_client
+    with _init_locks['redis']:
+        if _redis_client is not None:
+            return _redis_client
         try:
-            _redis_client = redis.Redis(
+            import redis
+            # 逐条命令统计次数与耗时，见 /metrics 的 backend_calls_total
+            _redis_client = InstrumentedRedis(redis.Redis(
                 host=settings.REDIS_HOST,
                 port=settings.REDIS_PORT,
                 password=settings.REDIS_PASSWORD,
                 db=settings.REDIS_DB,
                 decode_responses=True
-            )
+            ))
             logger.info("Redis连接成功")
         except Exception as e:
             logger.error(f"Redis连接失败: {str(e)}")
     return _redis_client
 
+def get_redis_binary_client():
+    """获取不解码响应的Redis连接，用于存取 backend.codec 编码的二进制数据"""
+    global _redis_binary_client
+    if _redis_binary_client is not None:
+        return _redis_binary_client
+    with _init_locks['redis_binary']:
+        if _redis_binary_client is not None:
+            return _redis_binary_client
+        try:
+            import redis
+            _redis_binary_client = InstrumentedRedis(redis.Redis(
+                host=settings.REDIS_HOST,
+                port=settings.REDIS_PORT,
+                password=settings.REDIS_PASSWORD,
+                db=settings.REDIS_DB,
+                decode_responses=False
+            ))
+            logger.info("Redis二进制连接成功")
+        except Exception as e:
+            logger.error("Redis二进制连接失败: %s", e)
+    return _redis_binary_client
+
 def get_mysql_conn():
     """获取MySQL连接"""
     global _mysql_conn
-    if _mysql_conn is None:
+    if _mysql_conn is not None:
+        return _mysql_conn
+    with _init_locks['mysql']:
+        if _mysql_conn is not None:
+            return _mysql_conn
         try:
+            import mysql.connector
             _mysql_conn = mysql.connector.connect(
                 host=settings.MYSQL_HOST,
                 port=settings.MYSQL_PORT,
@@ -87,7 +163,7 @@ def get_mysql_conn():
 
 def close_all_connections():
     """关闭所有连接"""
-    global _neo4j_driver, _redis_client, _mysql_conn
+    global _neo4j_driver, _redis_client, _redis_binary_client, _mysql_conn
     
     if _neo4j_driver:
         try:
@@ -103,9 +179,25 @@ def close_all_connections():
         except Exception as e:
             logger.error(f"Error closing Redis connection: {str(e)}")
     
+    if _redis_binary_client:
+        try:
+            _redis_binary_client.close()
+            logger.info("Redis binary connection closed")
+        except Exception as e:
+            logger.error(f"Error closing Redis binary connection: {str(e)}")
+    
     if _mysql_conn:
         try:
             _mysql_conn.close()
             logger.info("MySQL connection closed")
         except Exception as e:
-            logger.error(f"Error closing MySQL connection: {str(e)}") 
\ No newline at end of file
+            logger.error(f"Error closing MySQL connection: {str(e)}")
+
+
+# 登记到服务注册中心：获取函数自身缓存连接，注册中心只负责计时与预热
+services.register('neo4j', get_neo4j_driver, probe=lambda driver: driver.verify_connectivity(), cache=False,
+                  warm=getattr(settings, 'GRAPH_STORE_BACKEND', 'neo4j') == 'neo4j')
+services.register('redis', get_redis_client, probe=lambda client: client.ping(), cache=False)
+services.register('redis_binary', get_redis_binary_client, probe=lambda client: client.ping(), cache=False)
+services.register('mysql', get_mysql_conn, probe=lambda conn: conn.ping(reconnect=True), cache=False)
+services.register('llm', get_llm_gateway, cache=False)
@@ -1,9 +1,17 @@
 from neo4j import GraphDatabase
 from django.conf import settings
-import csv
+import re
 from pathlib import Path
 import logging
 import redis
+from backend.vocabulary import vocabulary
+from backend.graph_snapshot import (
+    export_snapshot, write_snapshot, graph_snapshot, query_graph, GraphUnavailableError
+)
+from backend.ingestion import (
+    IngestionPipeline, iter_rows, read_staged, discard_staged, resolve_source, diff_staged, format_timings
+)
+from backend.timing import RequestTimer
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -28,10 +36,25 @@ class GraphConfig:
     # 节点颜色配置
     NODE_COLORS = {
         'disease': '#2C3E50',    # 病害节点 - 深灰色
+        'pest': '#C0392B',       # 虫害节点 - 红色
         'weather': '#3498DB',    # 气象节点 - 蓝色
         'growth_stage': '#9B59B6',  # 生育期节点 - 紫色
         'plant_part': '#27AE60',    # 部位节点 - 绿色
         'region': '#E67E22',        # 地区节点 - 橙色
+        'host_crop': '#16A085',     # 寄主作物节点 - 青色
+        'natural_enemy': '#F1C40F', # 天敌节点 - 黄色
+    }
+    
+    # 节点标签配置
+    NODE_LABELS = {
+        'disease': 'Disease',
+        'pest': 'Pest',
+        'weather': 'Weather',
+        'growth_stage': 'GrowthStage',
+        'plant_part': 'PlantPart',
+        'region': 'Region',
+        'host_crop': 'HostCrop',
+        'natural_enemy': 'NaturalEnemy',
     }
     
     # 关系类型配置
@@ -39,8 +62,17 @@ class GraphConfig:
         'weather': 'OCCURS_IN_WEATHER',
         'growth_stage': 'OCCURS_IN_STAGE',
         'plant_part': 'AFFECTS_PART',
-        'region': 'OCCURS_IN_REGION'
+        'region': 'OCCURS_IN_REGION',
+        'host_crop': 'DAMAGES_CROP',
+        'natural_enemy': 'HAS_NATURAL_ENEMY'
     }
+    
+    # 数据源文件
+    DISEASE_CSV = Path('static/File/小麦病害信息.csv')
+    PEST_CSV = Path('static/File/小麦虫害信息.csv')
+    
+    # 单次UNWIND写入的行数
+    BATCH_SIZE = 500
 
 class Neo4jError(Exception):
     """Neo4j操作相关错误"""
@@ -52,435 +84,421 @@ class GraphManager:
     负责知识图谱的初始化、数据导入、关键词提取等核心功能
     """
     def __init__(self):
-        try:
-            self.driver = GraphDatabase.driver(
-                settings.NEO4J_URI,
-                auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
-            )
-            # 测试连接
-            with self.driver.session() as session:
-                result = session.run("MATCH (n) RETURN count(n) as count")
-                count = result.single()["count"]
-                logger.info(f"Neo4j连接成功，当前数据库有 {count} 个节点")
-        except Exception as e:
-            logger.error(f"Neo4j连接失败: {str(e)}")
-            self.driver = None
-        
-        # Redis连接
-        try:
-            self.redis_client = redis.StrictRedis(
-                host='127.0.0.1',
-                port=6379,
-                db=1,
-                decode_responses=True
-            )
-            self.redis_client.ping()
-            logger.info("Redis连接成功")
-        except Exception as e:
-            logger.error(f"Redis连接失败: {str(e)}")
-            self.redis_client = None
-        
-        # 定义标准关键词集
-        self.region_keywords = {
-            "黑龙江", "吉林", "辽宁", "河北", "山西", "山东", "河南", "江苏", "浙江",
-            "安徽", "江西", "福建", "广东", "广西", "海南", "湖北", "湖南", "四川",
-            "贵州", "云南", "陕西", "甘肃", "青海", "台湾", "北京", "天津", "上海", 
-            "重庆", "内蒙古", "新疆", "西藏", "宁夏", 
-            "东北", "华北", "华东", "华南", 
-            "华中", "西北", "西南", 
-            "东北平原区", "云贵高原区", "北方干旱半干旱区", 
-            "华南区", "四川盆地区", "长江中下游区", "青藏高原区", "黄土高原区", 
-            "黄淮海平原区", 
-            "全国各地", "南方", "北方", "西部", "东部"
-        }
-        
-        self.plant_part_keywords = {
-            "叶片", "茎秆", "根系", "麦穗", "叶鞘", "籽粒", "幼苗", "基部", "穗部",
-            "节间", "叶尖", "叶缘", "叶面", "叶背", "茎基", "茎部", "穗轴", "颖壳",
-            "护颖", "芒", "根冠", "根毛", "分蘖", "主茎", "种子", "胚芽", "胚根",
-            "叶基", "茎节", "穗颈", "颖片", "子房", "花药", "花丝", "胚乳", "胚部"
-        }
-        
-        self.growth_stage_keywords = {
-            "全生育期", "生长全期", "全生长期", "苗期", "幼苗期", "出苗期", 
-            "3-4叶期", "4-6叶期", "越冬期", "冬前", "返青期", "拔节期", 
-            "分蘖期", "茎节期", "起身期", "抽穗期", "孕穗期", "开花期", 
-            "扬花期", "灌浆期", "乳熟期", "成熟期", "收获期", "播种期",
-            "发芽期", "生育中期", "生育后期", "抽穗扬花期", "成株期"
-        }
+        # Neo4j与Redis连接在首次使用时才创建，构造本类不访问网络
+        self._driver = None
+        self._driver_resolved = False
+        self._redis_client = None
+        self._redis_resolved = False
         
-        self.weather_keywords = {
-            # 温度相关
-            "高温", "低温", "寒潮", "倒春寒", "热浪", "冷凉", "温暖",
-            # 降水相关
-            "干旱", "潮湿", "阴雨", "连阴雨", "梅雨", "暴雨", "降雨", "多雨",
-            # 湿度相关
-            "干燥", "湿润", "高湿", "低湿",
-            # 其他气象条件
-            "大风", "霜冻", "积雪", "冰雹", "沙尘", "阴天", "晴天",
-            # 复合条件
-            "高温高湿", "低温多雨", "干旱高温"
-        }
+        # 关键词词表由全局词表注册中心统一提供，与聊天症状提取共用
+        self.vocabulary = vocabulary
 
-        # 定义标准关键词映射关系
-        self.growth_stage_mapping = {
-            "开花": "开花期",
-            "抽穗": "抽穗期",
-            "返青": "返青期",
-            "成熟": "成熟期",
-            "播种": "播种期",
-            "发芽": "发芽期",
-            "越冬": "越冬期",
-            "拔节": "拔节期",
-            "分蘖": "分蘖期",
-            "灌浆": "灌浆期",
-            "收获": "收获期",
-            "出苗": "出苗期",
-            "幼苗": "幼苗期",
-            "孕穗": "孕穗期",
-            "扬花": "扬花期",
-            "生育中": "生育中期",
-            "生育后": "生育后期",
-            "全生育": "全生育期",
-            "生长全": "全生育期",
-            # 时间相关
-            "初期": "苗期",
-            "前期": "苗期",
-            "中期": "生育中期",
-            "后期": "生育后期",
-            "末期": "成熟期",
-            
-            # 复合表达
-            "抽穗开花": "抽穗期",
-            "抽穗扬花": "抽穗期",
-            "灌浆成熟": "灌浆期",
-            
-            # 同义表达
-            ("出苗", "发苗"): "出苗期",
-            ("幼苗", "小苗"): "幼苗期",
-            ("成熟", "成熟时"): "成熟期",
-        }
+    @property
+    def driver(self):
+        """Neo4j驱动，首次访问时创建，创建失败时为 None"""
+        if not self._driver_resolved:
+            self._driver_resolved = True
+            try:
+                self._driver = GraphDatabase.driver(
+                    settings.NEO4J_URI,
+                    auth=(settings.NEO4J_USER, settings.NEO4J_PASSWORD)
+                )
+            except Exception as e:
+                logger.error("Neo4j连接失败: %s", e)
+                self._driver = None
+        return self._driver
 
-        self.plant_part_mapping = {
-            # 基本映射
-            "叶": "叶片",
-            "茎": "茎秆",
-            "根": "根系",
-            "穗": "麦穗",
-            "颖": "颖壳",
-            "芽": "胚芽",
-            "胚": "胚部",
-            "花": "花药",
-            
-            # 扩展映射
-            "心叶": "叶片",
-            "老叶": "叶片",
-            "基部叶片": "叶片",
-            "上部叶片": "叶片",
-            "新叶": "叶片",
-            "旗叶": "叶片",
-            "叶尖": "叶片",
-            "叶基": "叶片",
-            "叶鞘": "叶鞘",
-            
-            "茎基": "茎秆",
-            "茎部": "茎秆",
-            "秆": "茎秆",
-            "节间": "茎秆",
-            "茎节": "茎秆",
-            "基部": "茎秆",
-            
-            "根冠": "根系",
-            "根毛": "根系",
-            "幼根": "根系",
-            "种子根": "根系",
-            
-            "穗部": "麦穗",
-            "穗轴": "麦穗",
-            "小穗": "麦穗",
-            "穗颈": "麦穗",
-            
-            "颖壳": "颖壳",
-            "护颖": "颖壳",
-            "颖片": "颖壳",
-            
-            "胚芽鞘": "胚芽",
-            "幼芽": "胚芽",
-            
-            "子房": "胚部",
-            "胚根": "胚部",
-            "胚乳": "胚部",
-            
-            "花丝": "花药",
-            "花器": "花药",
-        }
+    @driver.setter
+    def driver(self, value):
+        self._driver = value
+        self._driver_resolved = True
 
-        self.weather_mapping = {
-            "温度高": "高温",
-            "气温高": "高温",
-            "温度低": "低温",
-            "气温低": "低温",
-            "降水": "降雨",
-            "下雨": "降雨",
-            "雨天": "阴雨",
-            "干燥": "干旱",
-            "湿润": "潮湿",
-            # 温度组合
-            ("高温", "温度高", "气温高"): "高温",
-            ("低温", "温度低", "气温低"): "低温",
-            
-            # 降水组合
-            ("降水", "下雨", "降雨"): "降雨",
-            ("干旱", "干燥", "缺水"): "干旱",
-            
-            # 复合条件
-            "高温干旱": ["高温", "干旱"],
-            "低温阴雨": ["低温", "阴雨"],
-        }
+    @property
+    def redis_client(self):
+        """Redis连接，首次访问时创建，创建失败时为 None"""
+        if not self._redis_resolved:
+            self._redis_resolved = True
+            try:
+                self._redis_client = redis.StrictRedis(
+                    host='127.0.0.1',
+                    port=6379,
+                    db=1,
+                    decode_responses=True
+                )
+            except Exception as e:
+                logger.error("Redis连接失败: %s", e)
+                self._redis_client = None
+        return self._redis_client
 
-    def extract_keywords(self, text, keyword_set, mapping=None):
+    @redis_client.setter
+    def redis_client(self, value):
+        self._redis_client = value
+        self._redis_resolved = True
+
+    def extract_keywords(self, text, category):
         """从文本中提取标准关键词
         
         Args:
             text (str): 待分析文本
-            keyword_set (set): 标准关键词集合
-            mapping (dict): 关键词映射字典
+            category (str): 关键词类别，plant_part / weather / growth_stage / region
         
         Returns:
             list: 提取的标准关键词列表
         """
         if not text:
             return []
+        return self.vocabulary.extract(self._clean_text(text), category)
+
+    def close(self):
+        if self._driver is not None:
+            self._driver.close()
+
+    def save_snapshot(self):
+        """导出本地图谱快照，供Neo4j不可用时诊断使用；导出失败不影响导入结果"""
+        try:
+            export_snapshot(self.driver)
+        except Exception as e:
+            logger.warning("写入图谱快照失败: %s", e)
+
+    def _stage(self, disease_file, pest_file, workers, timer):
+        return IngestionPipeline(self, workers=workers).stage([
+            ('disease', disease_file or GraphConfig.DISEASE_CSV, True),
+            ('pest', pest_file or GraphConfig.PEST_CSV, False),
+        ], timer=timer)
+
+    def init_graph(self, disease_file=None, pest_file=None, workers=None, timer=None):
+        """初始化基础知识图谱数据
+
+        先由导入流水线流式读取CSV/XLSX、在进程池中提取关键词并写入暂存文件，
+        再在一个事务中按批次读回暂存结果，用UNWIND批量写入病害、虫害节点及其
+        关联节点，数据库事务只包住最终的写入。
+
+        Args:
+            disease_file (Path): 病害数据文件，默认 GraphConfig.DISEASE_CSV
+            pest_file (Path): 虫害数据文件，默认 GraphConfig.PEST_CSV
+            workers (int): 提取进程数，默认 settings.GRAPH_INGEST_WORKERS
+            timer (RequestTimer): 阶段计时器，记录 parse / extract / stage / write / snapshot 耗时
+        """
+        timer = timer or RequestTimer()
+        embedded = getattr(settings, 'GRAPH_STORE_BACKEND', 'neo4j') == 'embedded'
+        if not embedded and not self.driver:
+            raise Neo4jError("Neo4j连接未初始化")
         
-        keywords = set()
-        text = self._clean_text(text)  # 使用清理文本方法
-        
-        # 1. 首先处理复合关键词（避免被单个关键词匹配影响）
-        if mapping:
-            for key, value in mapping.items():
-                if isinstance(key, tuple):
-                    continue  # 先跳过同义词组
-                if isinstance(value, list) and key.lower() in text:
-                    keywords.update(v for v in value if v in keyword_set)
-        
-        # 2. 处理标准关键词（较长的优先）
-        sorted_keywords = sorted(keyword_set, key=len, reverse=True)
-        for keyword in sorted_keywords:
-            if keyword.lower() in text:
-                keywords.add(keyword)
-                # 从文本中移除已匹配的关键词，避免重复匹配
-                text = text.replace(keyword.lower(), '')
-        
-        # 3. 处理同义词组
-        if mapping:
-            for key, value in mapping.items():
-                if isinstance(key, tuple):
-                    # 同义词组匹配时考虑上下文
-                    context_words = 5  # 上下文窗口大小
-                    for k in key:
-                        k = k.lower()
-                        if k in text:
-                            # 获取关键词周围的上下文
-                            start = max(0, text.find(k) - context_words)
-                            end = min(len(text), text.find(k) + len(k) + context_words)
-                            context = text[start:end]
-                            
-                            # 根据上下文确认是否为目标含义
-                            if self._validate_context(context, k):
-                                if isinstance(value, str) and value in keyword_set:
-                                    keywords.add(value)
-                                elif isinstance(value, list):
-                                    keywords.update(v for v in value if v in keyword_set)
+        try:
+            staged = self._stage(disease_file, pest_file, workers, timer)
+            
+            if embedded:
+                # 进程内图谱存储：直接由暂存结果生成本地快照，不需要Neo4j
+                with timer.span('snapshot'):
+                    records = {'disease': [], 'pest': []}
+                    for kind, batch in read_staged(staged['path']):
+                        records[kind].extend(batch)
+                    nodes, edges = self._snapshot_records(records['disease'], records['pest'])
+                    write_snapshot(settings.GRAPH_SNAPSHOT_PATH, nodes, edges, source='csv')
+                    graph_snapshot.invalidate()
+            else:
+                with timer.span('write'), self.driver.session() as session:
+                    with session.begin_transaction() as tx:
+                        # 清空现有数据
+                        tx.run("MATCH (n) DETACH DELETE n")
+                        for kind, batch in read_staged(staged['path'], GraphConfig.BATCH_SIZE):
+                            self._write_records(tx, kind, batch)
+                        tx.commit()
+            # 写入成功后删除暂存文件；失败时保留，便于排查
+            discard_staged(staged['path'])
+            
+            logger.info("病害数据导入完成: 成功 %s 条，失败 %s 条",
+                        staged['counts']['disease'], staged['errors']['disease'])
+            logger.info("虫害数据导入完成: 成功 %s 条，失败 %s 条",
+                        staged['counts']['pest'], staged['errors']['pest'])
+            if not embedded:
+                with timer.span('snapshot'):
+                    self.save_snapshot()
+            logger.info("图谱导入阶段耗时: %s", format_timings(timer.stages))
+            return True
+                
+        except Neo4jError:
+            raise
+        except Exception as e:
+            raise Neo4jError(f"初始化知识图谱失败: {str(e)}")
+
+    def dry_run(self, disease_file=None, pest_file=None, workers=None, timer=None):
+        """只解析和提取数据文件并与当前图谱比较，不写入Neo4j或本地快照
+
+        用于离线验证词表改动：每个主节点的提取结果及其相对当前图谱的变化都会列出。
+
+        Returns:
+            dict: diff_staged() 的结果，另含 'counts'、'errors'（成功、失败行数）
+        """
+        timer = timer or RequestTimer()
+        staged = self._stage(disease_file, pest_file, workers, timer)
+        try:
+            with timer.span('load_current'):
+                current = self.current_records()
+            with timer.span('diff'):
+                report = diff_staged(staged['path'], current)
+        finally:
+            discard_staged(staged['path'])
+        report.update(counts=staged['counts'], errors=staged['errors'])
+        logger.info("图谱导入预演阶段耗时: %s", format_timings(timer.stages))
+        return report
+
+    def current_records(self):
+        """读取当前图谱中的病虫害节点及其关联节点，Neo4j不可用时读本地快照
+
+        Returns:
+            dict: {(类别, 名称): {'properties': 属性, 'links': {关联类别: set(名称)}}}，
+                  Neo4j与快照都不可用时为空
+        """
+        categories = {rel_type: category for category, rel_type in GraphConfig.RELATIONSHIPS.items()}
+        kinds = {label: kind for kind, label in GraphConfig.NODE_LABELS.items()}
+
+        def add(result, label, props, links):
+            node = {'properties': props, 'links': {}}
+            for rel_type, target in links:
+                if rel_type in categories and target is not None:
+                    node['links'].setdefault(categories[rel_type], set()).add(target)
+            result[(kinds[label], props.get('name'))] = node
+
+        def from_neo4j():
+            result = {}
+            with self.driver.session() as session:
+                for record in session.run("""
+                MATCH (n) WHERE n:Disease OR n:Pest
+                OPTIONAL MATCH (n)-[r]->(t)
+                RETURN labels(n)[0] AS label, properties(n) AS props, collect([type(r), t.name]) AS links
+                """):
+                    add(result, record['label'], dict(record['props']), record['links'])
+            return result
+
+        def from_snapshot(snapshot):
+            result = {}
+            for node in snapshot.main_nodes():
+                links = [(rel_type, target['name']) for rel_type, target, _ in snapshot.neighbors(node)]
+                add(result, node['label'], dict(node['props']), links)
+            return result
+
+        embedded = getattr(settings, 'GRAPH_STORE_BACKEND', 'neo4j') == 'embedded'
+        try:
+            return query_graph(None if embedded else self.driver, 'load_import_state', from_neo4j, from_snapshot)
+        except GraphUnavailableError as e:
+            logger.warning("无法读取当前图谱，全部按新增比较: %s", e)
+            return {}
+
+    def _load_records(self, csv_file, validate, extract, required=True):
+        """在当前进程中读取数据文件并提取每行的节点属性和关联节点
+
+        Args:
+            csv_file (Path): CSV或XLSX文件路径
+            validate (callable): 行校验函数
+            extract (callable): 行提取函数
+            required (bool): 文件不存在时是否报错
         
-        # 4. 应用特殊规则
-        keywords = self._apply_special_rules(keywords, text)
+        Returns:
+            tuple: (提取结果列表, 失败行数)
+        """
+        source = resolve_source(csv_file)
+        if source is None:
+            if required:
+                raise Neo4jError(f"CSV文件不存在: {csv_file}")
+            logger.warning("CSV文件不存在，跳过: %s", csv_file)
+            return [], 0
         
-        return list(keywords)
+        records = []
+        error_count = 0
+        for row in iter_rows(source):
+            try:
+                if validate(row):
+                    records.append(extract(row))
+                else:
+                    error_count += 1
+                    logger.warning("跳过无效数据行: %s", row)
+            except Exception as e:
+                error_count += 1
+                logger.error("处理数据行失败: %s", e)
+        return records, error_count
 
-    def _validate_context(self, context, keyword):
-        """验证关键词在上下文中的有效性
+    def _extract_disease_row(self, row):
+        """提取单行病害数据
         
         Args:
-            context (str): 关键词周围的上下文
-            keyword (str): 待验证的关键词
-            
+            row (dict): CSV数据行
+        
         Returns:
-            bool: 是否为有效匹配
+            dict: {'properties': 节点属性, 'links': {类别: [关联节点名称]}}
         """
-        # 否定词列表
-        negative_words = {'不', '没有', '无', '未'}
+        # 提取疾病名称和别名
+        disease_name = row['病害名称(别名)'].split('(')[0].strip()
+        alias = row['病害名称(别名)'].split('(')[1].rstrip(')') if '(' in row['病害名称(别名)'] else ''
         
-        # 检查上下文中是否有否定词
-        for word in negative_words:
-            if word in context:
-                return False
-                
-        return True
+        weather = set(self.extract_keywords(row.get('气象', ''), 'weather'))
+        weather.update(self.extract_keywords(row.get('病原', ''), 'weather'))
+        
+        growth_stages = set(self.extract_keywords(row.get('病害发生生育期', ''), 'growth_stage'))
+        growth_stages.update(self.extract_keywords(row.get('为害特征', ''), 'growth_stage'))
         
-    def _apply_special_rules(self, keywords, text):
-        """应用特殊规则处理关键词
+        # 合并病害发生部位和为害特征两个来源的部位信息
+        plant_parts = set(self.extract_keywords(row.get('病害发生部位', ''), 'plant_part'))
+        plant_parts.update(self.extract_keywords(row.get('为害特征', ''), 'plant_part'))
+        
+        regions = self.extract_keywords(row.get('发病地区', ''), 'region')
+        
+        return {
+            'properties': {
+                'name': disease_name,
+                'alias': alias,
+                'pathogen': row.get('病原', ''),
+                'symptoms': row.get('为害特征', ''),
+                'treatment': row.get('防治措施', '')
+            },
+            'links': {
+                'weather': sorted(weather),
+                'growth_stage': sorted(growth_stages),
+                'plant_part': sorted(plant_parts),
+                'region': sorted(regions)
+            }
+        }
+
+    def _extract_pest_row(self, row):
+        """提取单行虫害数据
         
         Args:
-            keywords (set): 已提取的关键词集合
-            text (str): 原始文本
-            
+            row (dict): CSV数据行
+        
         Returns:
-            set: 处理后的关键词集合
+            dict: {'properties': 节点属性, 'links': {类别: [关联节点名称]}}
         """
-        # 1. 处理互斥关键词
-        if '高温' in keywords and '低温' in keywords:
-            # 根据上下文判断保留哪个
-            if text.find('高温') < text.find('低温'):
-                keywords.remove('低温')
-            else:
-                keywords.remove('高温')
-                
-        # 2. 处理生育期的顺序关系
-        growth_stages = {'苗期', '拔节期', '抽穗期', '灌浆期'}
-        found_stages = keywords.intersection(growth_stages)
-        if len(found_stages) > 1:
-            # 保留文本中最先提到的生育期
-            first_stage = min(found_stages, key=lambda x: text.find(x))
-            keywords = {k for k in keywords if k not in growth_stages or k == first_stage}
-            
-        return keywords
+        name, alias = self._split_pest_name(row['虫害名称(别名)'])
+        damage = self._clean_text(row.get('为害特征', ''))
+        pattern = self._clean_text(row.get('发生规律', ''))
+        
+        weather = self.extract_keywords(pattern, 'weather')
+        growth_stages = set(self.extract_keywords(damage, 'growth_stage'))
+        growth_stages.update(self.extract_keywords(pattern, 'growth_stage'))
+        plant_parts = self.extract_keywords(damage, 'plant_part')
+        regions = self.extract_keywords(row.get('分布地区', ''), 'region')
+        
+        return {
+            'properties': {
+                'name': name,
+                'alias': alias,
+                'distribution': self._clean_text(row.get('分布地区', '')),
+                'host': self._clean_text(row.get('为害作物', '')),
+                'damage': damage,
+                'morphology': self._clean_text(row.get('形态特征', '')),
+                'habits': self._clean_text(row.get('生活习性', '')),
+                'pattern': pattern,
+                'treatment': self._clean_text(row.get('防治措施', '')),
+                'natural_enemies': self._clean_text(row.get('天敌', ''))
+            },
+            'links': {
+                'weather': sorted(weather),
+                'growth_stage': sorted(growth_stages),
+                'plant_part': sorted(plant_parts),
+                'region': sorted(regions),
+                'host_crop': self._split_list_field(row.get('为害作物', ''), suffixes=('寄主植物', '作物', '植物')),
+                'natural_enemy': self._split_list_field(row.get('天敌', ''))
+            }
+        }
 
-    def close(self):
-        self.driver.close()
+    def _split_pest_name(self, text):
+        """拆分“名称(别名)”字段，兼容全角括号和别名中嵌套的学名括号"""
+        match = re.match(r'\s*([^（(]+)[（(](.*?)[）)]?\s*$', text)
+        if not match:
+            return text.strip(), ''
+        alias = match.group(2).strip()
+        return match.group(1).strip(), '' if '未提及' in alias else alias
 
-    def init_graph(self):
-        """初始化基础知识图谱数据"""
-        if not self.driver:
-            raise Neo4jError("Neo4j连接未初始化")
-        
-        try:
-            with self.driver.session() as session:
-                with session.begin_transaction() as tx:
-                    # 清空现有数据
-                    tx.run("MATCH (n) DETACH DELETE n")
-                    
-                    csv_file = Path('static/File/小麦病害信息.csv')
-                    if not csv_file.exists():
-                        raise Neo4jError(f"CSV文件不存在: {csv_file}")
-                    
-                    processed_count = 0
-                    error_count = 0
-                    
-                    with open(csv_file, 'r', encoding='utf-8-sig') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            try:
-                                if self._validate_csv_data(row):
-                                    self._process_disease_row(tx, row)
-                                    processed_count += 1
-                                else:
-                                    error_count += 1
-                                    logger.warning(f"跳过无效数据行: {row}")
-                            except Exception as e:
-                                error_count += 1
-                                logger.error(f"处理数据行失败: {str(e)}")
-                    
-                    logger.info(f"数据导入完成: 成功 {processed_count} 条，失败 {error_count} 条")
-                    return True
-                
-        except Exception as e:
-            raise Neo4jError(f"初始化知识图谱失败: {str(e)}")
+    def _split_list_field(self, text, suffixes=()):
+        """把“A、B、C等”形式的字段拆分为名称列表"""
+        items = []
+        for item in re.split(r'[、，,；;]', text or ''):
+            item = item.strip()
+            # 跳过“未提及”及带括号的说明性文字
+            if not item or '未提及' in item or re.search(r'[（）()]', item):
+                continue
+            item = item.split('等')[0].strip() or item
+            for suffix in suffixes:
+                if item.endswith(suffix) and len(item) > len(suffix):
+                    item = item[:-len(suffix)]
+            if item and item not in items:
+                items.append(item)
+        return items
 
-    def _process_disease_row(self, tx, row):
-        """处理单行疾病数据
+    def _write_records(self, tx, kind, records):
+        """批量写入主节点及其关联节点和关系
         
         Args:
             tx: Neo4j事务对象
-            row (dict): CSV数据行
+            kind (str): 主节点类别，disease 或 pest
+            records (list): _extract_*_row 的结果列表
         """
-        # 提取疾病名称和别名
-        disease_name = row['病害名称(别名)'].split('(')[0].strip()
-        alias = row['病害名称(别名)'].split('(')[1].rstrip(')') if '(' in row['病害名称(别名)'] else ''
-        
-        # 创建疾病节点
-        tx.run("""
-        MERGE (d:Disease {
-            name: $name,
-            alias: $alias,
-            pathogen: $pathogen,
-            symptoms: $symptoms,
-            treatment: $treatment,
-            type: 'disease',
-            color: '#2C3E50'
-        })
-        """, {
-            'name': disease_name,
-            'alias': alias,
-            'pathogen': row.get('病原', ''),
-            'symptoms': row.get('为害特征', ''),
-            'treatment': row.get('防治措施', '')
-        })
+        if not records:
+            return
+        label = GraphConfig.NODE_LABELS[kind]
         
-        # 处理相关节点
-        self._process_weather_nodes(tx, row, disease_name)
-        self._process_growth_stage_nodes(tx, row, disease_name)
-        self._process_plant_part_nodes(tx, row, disease_name)
-        self._process_region_nodes(tx, row, disease_name)
-
-    def _process_weather_nodes(self, tx, row, disease_name):
-        weather_conditions = set()
-        weather_conditions.update(self.extract_keywords(row.get('气象', ''), self.weather_keywords, self.weather_mapping))
-        weather_conditions.update(self.extract_keywords(row.get('病原', ''), self.weather_keywords, self.weather_mapping))
-        for weather in weather_conditions:
-            tx.run("""
-            MERGE (weather:Weather {name: $weather, type: 'weather', color: '#3498DB'})
-            WITH weather
-            MATCH (d:Disease {name: $disease})
-            MERGE (d)-[:OCCURS_IN_WEATHER]->(weather)
-            """, {'weather': weather, 'disease': disease_name})
-
-    def _process_growth_stage_nodes(self, tx, row, disease_name):
-        growth_stages = set()
-        growth_stages.update(self.extract_keywords(row.get('病害发生生育期', ''), self.growth_stage_keywords, self.growth_stage_mapping))
-        growth_stages.update(self.extract_keywords(row.get('为害特征', ''), self.growth_stage_keywords, self.growth_stage_mapping))
-        for stage in growth_stages:
-            tx.run("""
-            MERGE (stage:GrowthStage {name: $stage, type: 'growth_stage', color: '#9B59B6'})
-            WITH stage
-            MATCH (d:Disease {name: $disease})
-            MERGE (d)-[:OCCURS_IN_STAGE]->(stage)
-            """, {'stage': stage, 'disease': disease_name})
-
-    def _process_plant_part_nodes(self, tx, row, disease_name):
-        plant_parts = set()
-        # 从病害发生部位字段提取
-        parts1 = self.extract_keywords(
-            row.get('病害发生部位', ''), 
-            self.plant_part_keywords,
-            self.plant_part_mapping
-        )
-        # 从为害特征字段提取
-        parts2 = self.extract_keywords(
-            row.get('为害特征', ''), 
-            self.plant_part_keywords,
-            self.plant_part_mapping
-        )
-        # 合并两个来源的部位信息
-        plant_parts.update(parts1)
-        plant_parts.update(parts2)
+        for start in range(0, len(records), GraphConfig.BATCH_SIZE):
+            batch = records[start:start + GraphConfig.BATCH_SIZE]
+            tx.run(f"""
+            UNWIND $rows AS row
+            MERGE (n:{label} {{name: row.name}})
+            SET n += row, n.type = $type, n.color = $color
+            """, {
+                'rows': [record['properties'] for record in batch],
+                'type': kind,
+                'color': GraphConfig.NODE_COLORS[kind]
+            })
         
-        for part in plant_parts:
-            tx.run("""
-            MERGE (part:PlantPart {name: $part, type: 'plant_part', color: '#27AE60'})
-            WITH part
-            MATCH (d:Disease {name: $disease})
-            MERGE (d)-[:AFFECTS_PART]->(part)
-            """, {'part': part, 'disease': disease_name})
-
-    def _process_region_nodes(self, tx, row, disease_name):
-        regions = self.extract_keywords(row.get('发病地区', ''), self.region_keywords)
-        for region in regions:
-            tx.run("""
-            MERGE (region:Region {name: $region, type: 'region', color: '#E67E22'})
-            WITH region
-            MATCH (d:Disease {name: $disease})
-            MERGE (d)-[:OCCURS_IN_REGION]->(region)
-            """, {'region': region, 'disease': disease_name})
+        categories = {category for record in records for category in record['links']}
+        for category in sorted(categories):
+            links = [
+                {'source': record['properties']['name'], 'target': target}
+                for record in records
+                for target in record['links'].get(category, [])
+            ]
+            target_label = GraphConfig.NODE_LABELS[category]
+            rel_type = GraphConfig.RELATIONSHIPS[category]
+            for start in range(0, len(links), GraphConfig.BATCH_SIZE):
+                tx.run(f"""
+                UNWIND $links AS link
+                MERGE (t:{target_label} {{name: link.target}})
+                ON CREATE SET t.type = $type, t.color = $color
+                WITH t, link
+                MATCH (s:{label} {{name: link.source}})
+                MERGE (s)-[:{rel_type}]->(t)
+                """, {
+                    'links': links[start:start + GraphConfig.BATCH_SIZE],
+                    'type': category,
+                    'color': GraphConfig.NODE_COLORS[category]
+                })
+
+    def _snapshot_records(self, diseases, pests):
+        """按 _write_records 的合并规则把提取结果转换为快照的节点和关系
+
+        Returns:
+            tuple: (节点列表 [(节点ID, 标签, 属性)], 关系列表 [(起点ID, 关系类型, 终点ID)])
+        """
+        nodes = {}
+        edges = {}
+        for kind, records in (('disease', diseases), ('pest', pests)):
+            label = GraphConfig.NODE_LABELS[kind]
+            for record in records:
+                key = f"{label}:{record['properties']['name']}"
+                props = nodes.setdefault(key, (label, {}))[1]
+                props.update(record['properties'], type=kind, color=GraphConfig.NODE_COLORS[kind])
+            for record in records:
+                source = f"{label}:{record['properties']['name']}"
+                for category in sorted(record['links']):
+                    target_label = GraphConfig.NODE_LABELS[category]
+                    for target in record['links'][category]:
+                        target_key = f"{target_label}:{target}"
+                        if target_key not in nodes:
+                            nodes[target_key] = (target_label, {
+                                'name': target, 'type': category, 'color': GraphConfig.NODE_COLORS[category]
+                            })
+                        # MERGE语义：同一对节点间的同类关系只保留一条，dict保持写入顺序
+                        edges.setdefault((source, GraphConfig.RELATIONSHIPS[category], target_key), None)
+        return [(key, label, props) for key, (label, props) in nodes.items()], list(edges)
 
     def _create_node(self, tx, label, properties):
         """创建或更新节点
@@ -560,6 +578,18 @@ class GraphManager:
         required_fields = ['病害名称(别名)', '病原', '为害特征', '防治措施']
         return all(row.get(field) for field in required_fields)
 
+    def _validate_pest_data(self, row):
+        """验证虫害CSV数据行
+        
+        Args:
+            row (dict): CSV数据行
+        
+        Returns:
+            bool: 数据是否有效
+        """
+        required_fields = ['虫害名称(别名)', '为害特征', '防治措施']
+        return all(row.get(field) for field in required_fields)
+
     def _clean_text(self, text):
         """清理文本数据
         
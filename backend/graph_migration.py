@@ -0,0 +1,347 @@
+"""
+图谱迁移模块
+
+在环境之间（或从本地快照到Neo4j）分批迁移整个知识图谱，包括：
+- Neo4jSource / SnapshotSource：按稳定顺序流式读取节点和关系，可从游标处继续
+- Neo4jTarget：按 (标签, name) 合并写入节点和关系，重复写入同一批次不会产生重复数据
+- GraphMigration：先迁移全部节点再迁移关系，多个线程并行写入批次，按顺序推进检查点，
+  中断后用同一检查点重新运行即可从最后一个已完成的批次继续，并定期输出吞吐量
+
+节点以 (标签, name) 识别，与 init_graph 的 MERGE 规则一致。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+
+
+class MigrationError(Exception):
+    """图谱迁移相关错误"""
+    pass
+
+
+def _quote(name):
+    """Cypher标识符转义，标签和关系类型来自源数据，不能直接拼接"""
+    return '`' + str(name).replace('`', '``') + '`'
+
+
+class Neo4jSource:
+    """从Neo4j读取，按 elementId 排序，游标为最后一个已读取的 elementId"""
+
+    def __init__(self, driver, uri):
+        self.driver = driver
+        self.name = f"neo4j:{uri}"
+
+    def counts(self):
+        with self.driver.session() as session:
+            nodes = session.run("MATCH (n) RETURN count(n) AS count").single()['count']
+            edges = session.run("MATCH ()-[r]->() RETURN count(r) AS count").single()['count']
+        return nodes, edges
+
+    def nodes(self, after):
+        """Yields: (游标, {'label', 'props'})"""
+        with self.driver.session() as session:
+            result = session.run("""
+            MATCH (n) WHERE $after IS NULL OR elementId(n) > $after
+            RETURN elementId(n) AS id, labels(n)[0] AS label, properties(n) AS props
+            ORDER BY id
+            """, after=after)
+            for record in result:
+                yield record['id'], {'label': record['label'], 'props': dict(record['props'])}
+
+    def edges(self, after):
+        """Yields: (游标, {'source_label', 'source', 'type', 'target_label', 'target', 'props'})"""
+        with self.driver.session() as session:
+            result = session.run("""
+            MATCH (a)-[r]->(b) WHERE $after IS NULL OR elementId(r) > $after
+            RETURN elementId(r) AS id, labels(a)[0] AS source_label, a.name AS source, type(r) AS type,
+                   labels(b)[0] AS target_label, b.name AS target, properties(r) AS props
+            ORDER BY id
+            """, after=after)
+            for record in result:
+                yield record['id'], {
+                    'source_label': record['source_label'], 'source': record['source'],
+                    'type': record['type'],
+                    'target_label': record['target_label'], 'target': record['target'],
+                    'props': dict(record['props']),
+                }
+
+
+class SnapshotSource:
+    """从本地SQLite快照读取，按 rowid 排序，游标为最后一个已读取的 rowid"""
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise MigrationError(f"图谱快照不存在: {path}")
+        self.path = path
+        self.name = f"snapshot:{os.path.abspath(path)}"
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def counts(self):
+        conn = self._connect()
+        try:
+            nodes = conn.execute("SELECT count(*) FROM nodes").fetchone()[0]
+            edges = conn.execute("SELECT count(*) FROM edges").fetchone()[0]
+        finally:
+            conn.close()
+        return nodes, edges
+
+    def nodes(self, after):
+        conn = self._connect()
+        try:
+            for rowid, label, props in conn.execute(
+                    "SELECT rowid, label, props FROM nodes WHERE rowid > ? ORDER BY rowid", (after or 0,)):
+                yield rowid, {'label': label, 'props': json.loads(props)}
+        finally:
+            conn.close()
+
+    def edges(self, after):
+        conn = self._connect()
+        try:
+            for rowid, source_label, source, rel_type, target_label, target in conn.execute("""
+                SELECT e.rowid, s.label, s.name, e.type, t.label, t.name
+                FROM edges e JOIN nodes s ON s.id = e.source JOIN nodes t ON t.id = e.target
+                WHERE e.rowid > ? ORDER BY e.rowid
+            """, (after or 0,)):
+                yield rowid, {
+                    'source_label': source_label, 'source': source, 'type': rel_type,
+                    'target_label': target_label, 'target': target, 'props': {},
+                }
+        finally:
+            conn.close()
+
+
+class Neo4jTarget:
+    """写入Neo4j，每个批次一个托管事务（瞬时错误由驱动自动重试）"""
+
+    def __init__(self, driver, uri):
+        self.driver = driver
+        self.name = f"neo4j:{uri}"
+
+    def clear(self, batch_size=10000):
+        """分批清空目标库，避免一次删除占用过多事务内存"""
+        deleted = 0
+        with self.driver.session() as session:
+            while True:
+                count = session.run(
+                    "MATCH (n) WITH n LIMIT $limit DETACH DELETE n RETURN count(n) AS count", limit=batch_size
+                ).single()['count']
+                deleted += count
+                if count < batch_size:
+                    break
+        logger.info("目标库已清空: 删除 %s 个节点", deleted)
+
+    def ensure_indexes(self, labels):
+        """为各标签的 name 建索引，节点合并和关系写入都按名称匹配节点"""
+        with self.driver.session() as session:
+            for label in sorted(labels):
+                session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{_quote(label)}) ON (n.name)")
+
+    def write_nodes(self, rows):
+        groups = {}
+        for row in rows:
+            groups.setdefault(row['label'], []).append(row['props'])
+
+        def work(tx):
+            for label, props in groups.items():
+                tx.run(f"""
+                UNWIND $rows AS row
+                MERGE (n:{_quote(label)} {{name: row.name}})
+                SET n += row
+                """, rows=props)
+
+        with self.driver.session() as session:
+            session.execute_write(work)
+
+    def write_edges(self, rows):
+        groups = {}
+        for row in rows:
+            key = (row['source_label'], row['type'], row['target_label'])
+            groups.setdefault(key, []).append(
+                {'source': row['source'], 'target': row['target'], 'props': row['props']})
+
+        def work(tx):
+            for (source_label, rel_type, target_label), links in groups.items():
+                tx.run(f"""
+                UNWIND $links AS link
+                MATCH (s:{_quote(source_label)} {{name: link.source}})
+                MATCH (t:{_quote(target_label)} {{name: link.target}})
+                MERGE (s)-[r:{_quote(rel_type)}]->(t)
+                SET r += link.props
+                """, links=links)
+
+        with self.driver.session() as session:
+            session.execute_write(work)
+
+
+class GraphMigration:
+    """分批、可续传的图谱迁移
+
+    Args:
+        source: Neo4jSource 或 SnapshotSource
+        target (Neo4jTarget): 迁移目标
+        checkpoint_path (str): 检查点文件路径
+        batch_size (int): 每个批次的节点或关系数
+        workers (int): 并行写入的线程数
+        report_interval (float): 输出进度的最短间隔秒数
+    """
+
+    PHASES = ('nodes', 'edges')
+
+    def __init__(self, source, target, checkpoint_path, batch_size=1000, workers=4, report_interval=5.0):
+        if source.name == target.name:
+            raise MigrationError("迁移源与目标相同")
+        self.source = source
+        self.target = target
+        self.checkpoint_path = checkpoint_path
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.report_interval = report_interval
+        self.state = None
+
+    def _new_state(self):
+        return {
+            'version': CHECKPOINT_VERSION,
+            'source': self.source.name,
+            'target': self.target.name,
+            'phase': 'nodes',
+            'cursor': {'nodes': None, 'edges': None},
+            'done': {'nodes': 0, 'edges': 0},
+            'skipped': {'nodes': 0, 'edges': 0},
+            'labels': [],
+            'started_at': time.time(),
+        }
+
+    def load_checkpoint(self):
+        """读取检查点，不存在时返回None；源或目标不一致时报错，避免续传到错误的库"""
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise MigrationError(f"检查点版本不兼容: {state.get('version')}")
+        if state['source'] != self.source.name or state['target'] != self.target.name:
+            raise MigrationError(
+                f"检查点属于另一次迁移（{state['source']} -> {state['target']}），"
+                f"请换用其他检查点文件或不带 --resume 重新开始"
+            )
+        return state
+
+    def _save_checkpoint(self):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _batches(self, rows):
+        batch = []
+        cursor = None
+        for cursor, row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield cursor, batch
+                batch = []
+        if batch:
+            yield cursor, batch
+
+    def _valid(self, phase, row):
+        if phase == 'nodes':
+            return row['label'] is not None and row['props'].get('name') is not None
+        return None not in (row['source_label'], row['source'], row['target_label'], row['target'])
+
+    def _run_phase(self, phase, executor, progress):
+        """按读取顺序提交批次；只有某批次及其之前的批次都写完后检查点才推进到该批次"""
+        rows = getattr(self.source, phase)(self.state['cursor'][phase])
+        write = self.target.write_nodes if phase == 'nodes' else self.target.write_edges
+        labels = set(self.state['labels'])
+        pending = deque()
+
+        def complete():
+            cursor, count, future = pending.popleft()
+            future.result()
+            self.state['cursor'][phase] = cursor
+            self.state['done'][phase] += count
+            self._save_checkpoint()
+            progress(phase)
+
+        for cursor, batch in self._batches(rows):
+            valid = [row for row in batch if self._valid(phase, row)]
+            self.state['skipped'][phase] += len(batch) - len(valid)
+            if phase == 'nodes':
+                # 节点按 (标签, name) 合并，遇到新标签时先为其 name 建索引
+                new_labels = {row['label'] for row in valid} - labels
+                if new_labels:
+                    self.target.ensure_indexes(new_labels)
+                    labels.update(new_labels)
+                    self.state['labels'] = sorted(labels)
+            pending.append((cursor, len(valid), executor.submit(write, valid)))
+            # 先完成的批次在队首批次完成前不推进检查点，排队的批次数有上限
+            while pending and (pending[0][2].done() or len(pending) >= self.workers * 2):
+                complete()
+        while pending:
+            complete()
+
+    def run(self, resume=False, clear_target=False):
+        """执行迁移
+
+        Args:
+            resume (bool): 从检查点继续；没有检查点时从头开始
+            clear_target (bool): 从头开始时先清空目标库（续传时忽略）
+
+        Returns:
+            dict: 检查点状态，另含 'seconds'
+        """
+        self.state = self.load_checkpoint() if resume else None
+        if self.state is None:
+            self.state = self._new_state()
+            if clear_target:
+                self.target.clear()
+            self._save_checkpoint()
+        elif self.state['phase'] == 'done':
+            logger.info("检查点显示迁移已完成: %s", self.checkpoint_path)
+            return {**self.state, 'seconds': 0.0}
+        else:
+            logger.info("从检查点继续迁移: 阶段 %s，已完成节点 %s 个、关系 %s 条",
+                        self.state['phase'], self.state['done']['nodes'], self.state['done']['edges'])
+
+        node_total, edge_total = self.source.counts()
+        totals = {'nodes': node_total, 'edges': edge_total}
+        started = time.perf_counter()
+        # 各阶段开始时间和开始时已完成的数量，吞吐量只按本次运行计算
+        phase_start = {}
+        last_report = [started]
+
+        def progress(phase, force=False):
+            now = time.perf_counter()
+            if not force and now - last_report[0] < self.report_interval:
+                return
+            last_report[0] = now
+            begin, done_before = phase_start[phase]
+            rate = (self.state['done'][phase] - done_before) / max(now - begin, 1e-9)
+            logger.info("迁移%s: %s/%s，%.0f 条/秒", '节点' if phase == 'nodes' else '关系',
+                        self.state['done'][phase], totals[phase], rate)
+
+        with ThreadPoolExecutor(self.workers, thread_name_prefix='graph-migrate') as executor:
+            for phase in self.PHASES[self.PHASES.index(self.state['phase']):]:
+                self.state['phase'] = phase
+                phase_start[phase] = (time.perf_counter(), self.state['done'][phase])
+                self._run_phase(phase, executor, progress)
+                progress(phase, force=True)
+
+        self.state['phase'] = 'done'
+        self._save_checkpoint()
+        seconds = time.perf_counter() - started
+        logger.info("图谱迁移完成: 节点 %s 个，关系 %s 条，跳过 %s 条，耗时 %.2fs",
+                    self.state['done']['nodes'], self.state['done']['edges'],
+                    sum(self.state['skipped'].values()), seconds)
+        return {**self.state, 'seconds': seconds}
@@ -0,0 +1,261 @@
+"""
+图谱本地快照模块
+
+Neo4j不可用时用本地只读快照继续提供诊断和图谱查询，包括：
+- export_snapshot()：从Neo4j导出全部节点和关系，写入SQLite快照文件（原子替换）
+- GraphSnapshot：按需加载快照到内存，提供按名称查节点、按关系取邻居等查询
+- graph_breaker：Neo4j熔断器，连接失败后冷却期内直接读快照，不再等待连接超时
+- query_graph()：优先查询Neo4j，不可用时自动改用快照
+
+快照同时是进程内图谱存储（backend.graph_store.EmbeddedGraphStore）的数据来源。
+
+快照在每次成功导入图谱（init_graph）后写入，也可用 export_graph_snapshot 命令手动导出。
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from django.conf import settings
+from backend.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# 病虫害主节点标签
+MAIN_LABELS = ('Disease', 'Pest')
+
+
+class GraphUnavailableError(Exception):
+    """Neo4j不可用且没有可用的本地快照"""
+    pass
+
+
+def is_unavailable_error(error):
+    """是否为连接类错误（服务不可达、会话失效、网络错误），查询语句本身的错误不算"""
+    try:
+        from neo4j.exceptions import ServiceUnavailable, SessionExpired
+    except ImportError:
+        return isinstance(error, OSError)
+    return isinstance(error, (ServiceUnavailable, SessionExpired, OSError))
+
+
+def write_snapshot(path, nodes, edges, source='neo4j'):
+    """写入快照文件
+
+    先写临时文件再原子替换，读取方不会看到写了一半的快照。
+
+    Args:
+        path (str): 快照文件路径
+        nodes (list): [(节点ID, 标签, 属性字典)]
+        edges (list): [(起点ID, 关系类型, 终点ID)]
+        source (str): 数据来源说明
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript("""
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE nodes (id TEXT PRIMARY KEY, label TEXT, name TEXT, props TEXT);
+            CREATE TABLE edges (source TEXT, type TEXT, target TEXT);
+            CREATE INDEX idx_nodes_name ON nodes (name);
+        """)
+        conn.executemany(
+            "INSERT INTO nodes VALUES (?, ?, ?, ?)",
+            ((str(node_id), label, props.get('name'), json.dumps(props, ensure_ascii=False, default=str))
+             for node_id, label, props in nodes)
+        )
+        conn.executemany("INSERT INTO edges VALUES (?, ?, ?)",
+                         ((str(source_id), rel_type, str(target_id)) for source_id, rel_type, target_id in edges))
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [
+            ('version', str(SNAPSHOT_VERSION)),
+            ('created_at', str(time.time())),
+            ('source', source),
+            ('node_count', str(len(nodes))),
+            ('edge_count', str(len(edges))),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    logger.info("图谱快照已写入 %s: %s 个节点，%s 条关系", path, len(nodes), len(edges))
+
+
+def export_snapshot(driver, path=None):
+    """从Neo4j导出全部节点和关系写入快照文件"""
+    path = path or settings.GRAPH_SNAPSHOT_PATH
+    with driver.session() as session:
+        nodes = [
+            (record['id'], record['label'], dict(record['props']))
+            for record in session.run("MATCH (n) RETURN elementId(n) AS id, labels(n)[0] AS label, properties(n) AS props")
+        ]
+        edges = [
+            (record['source'], record['type'], record['target'])
+            for record in session.run(
+                "MATCH (a)-[r]->(b) RETURN elementId(a) AS source, type(r) AS type, elementId(b) AS target")
+        ]
+    write_snapshot(path, nodes, edges)
+    graph_snapshot.invalidate()
+    return len(nodes), len(edges)
+
+
+class GraphSnapshot:
+    """只读图谱快照
+
+    首次使用时把快照文件整体读入内存（图谱只有数百个节点），文件被替换后下次
+    使用时自动重新加载。节点以字典表示：{'id', 'label', 'name', 'props'}。
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._mtime = None
+        self._nodes = {}
+        self._by_name = {}
+        self._out = {}
+        self._in = {}
+        self.meta = {}
+        self._main = []
+        # 已加载的次数，派生索引据此判断是否需要重建
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self._path or settings.GRAPH_SNAPSHOT_PATH
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def invalidate(self):
+        with self._lock:
+            self._mtime = None
+
+    def _ensure_loaded(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            raise GraphUnavailableError(f"图谱快照不存在: {self.path}")
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            self._load(mtime)
+
+    def _load(self, mtime):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            meta = dict(conn.execute("SELECT key, value FROM meta"))
+            if int(meta.get('version', 0)) != SNAPSHOT_VERSION:
+                raise GraphUnavailableError(f"图谱快照版本不兼容: {meta.get('version')}")
+            nodes = {}
+            by_name = {}
+            for node_id, label, name, props in conn.execute("SELECT id, label, name, props FROM nodes ORDER BY rowid"):
+                node = {'id': node_id, 'label': label, 'name': name, 'props': json.loads(props)}
+                nodes[node_id] = node
+                by_name.setdefault(name, []).append(node)
+            out_edges = {}
+            in_edges = {}
+            for source, rel_type, target in conn.execute("SELECT source, type, target FROM edges ORDER BY rowid"):
+                if source in nodes and target in nodes:
+                    out_edges.setdefault(source, []).append((rel_type, nodes[target]))
+                    in_edges.setdefault(target, []).append((rel_type, nodes[source]))
+        finally:
+            conn.close()
+        self._nodes, self._by_name, self._out, self._in, self.meta = nodes, by_name, out_edges, in_edges, meta
+        self._main = [node for node in nodes.values() if node['label'] in MAIN_LABELS]
+        self._mtime = mtime
+        self.version += 1
+        logger.info("图谱快照已加载: %s 个节点（生成于 %s）", len(nodes),
+                    time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(float(meta.get('created_at', 0)))))
+
+    def nodes(self):
+        """全部节点"""
+        self._ensure_loaded()
+        return list(self._nodes.values())
+
+    def main_nodes(self):
+        """全部病害、虫害节点"""
+        self._ensure_loaded()
+        return self._main
+
+    def get(self, node_id):
+        """按节点ID获取节点"""
+        self._ensure_loaded()
+        return self._nodes.get(node_id)
+
+    def find(self, name, label=None):
+        """按名称（及标签）查找节点，不存在时返回None"""
+        self._ensure_loaded()
+        for node in self._by_name.get(name, ()):
+            if label is None or node['label'] == label:
+                return node
+        return None
+
+    def neighbors(self, node, direction='out', rel_type=None):
+        """节点的邻居
+
+        Args:
+            node (dict): 节点
+            direction (str): out / in / both
+            rel_type (str): 只返回该类型的关系，None表示全部
+
+        Returns:
+            list: [(关系类型, 邻居节点, 是否为出边)]
+        """
+        self._ensure_loaded()
+        result = []
+        if direction in ('out', 'both'):
+            result.extend((t, n, True) for t, n in self._out.get(node['id'], ()))
+        if direction in ('in', 'both'):
+            result.extend((t, n, False) for t, n in self._in.get(node['id'], ()))
+        if rel_type is not None:
+            result = [item for item in result if item[0] == rel_type]
+        return result
+
+
+# 创建全局图谱快照实例
+graph_snapshot = GraphSnapshot()
+
+# Neo4j熔断器：一次连接失败即打开，冷却期内查询直接读快照
+graph_breaker = CircuitBreaker(failure_threshold=1, cooldown=settings.GRAPH_RETRY_INTERVAL, name='Neo4j')
+
+
+def neo4j_available(driver):
+    """Neo4j当前是否可用（驱动已创建且熔断器未打开），不占用半开状态的探测名额"""
+    return driver is not None and graph_breaker.state != graph_breaker.OPEN
+
+
+def query_graph(driver, operation, query, fallback):
+    """优先查询Neo4j，Neo4j不可用时改用本地快照
+
+    Args:
+        driver: Neo4j驱动，为None时直接使用快照
+        operation (str): 操作名称，用于日志
+        query (callable): 无参函数，查询Neo4j并返回结果
+        fallback (callable): 接收 GraphSnapshot，从快照计算相同结构的结果
+
+    Raises:
+        GraphUnavailableError: Neo4j与快照都不可用
+    """
+    if driver is not None and graph_breaker.allow():
+        try:
+            result = query()
+        except Exception as e:
+            if not is_unavailable_error(e):
+                graph_breaker.record_success()
+                raise
+            graph_breaker.record_failure()
+            logger.warning("Neo4j不可用（%s），改用本地图谱快照: %s", operation, e)
+        else:
+            graph_breaker.record_success()
+            return result
+    return fallback(graph_snapshot)
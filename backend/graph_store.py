@@ -0,0 +1,669 @@
+"""
+图谱存储模块
+
+聊天诊断和知识图谱接口用到的全部图谱查询统一在这里实现，包括：
+- GraphStore：图谱存储接口（诊断匹配、病害详情、完整图谱、节点详情、相关节点、子图）
+- Neo4jGraphStore：查询Neo4j，Neo4j不可用时自动改用本地快照
+- EmbeddedGraphStore：基于本地SQLite快照的进程内邻接表，不依赖任何外部图数据库
+- get_graph_store()：按 GRAPH_STORE_BACKEND 配置返回全局图谱存储
+
+两种实现返回结构完全相同的结果，上层服务无需关心数据来自哪里。
+"""
+
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Any
+from django.conf import settings
+from backend.metrics import track
+from backend.registry import services
+from backend.graph_snapshot import graph_snapshot, query_graph, neo4j_available, MAIN_LABELS
+
+logger = logging.getLogger(__name__)
+
+# 症状类别 -> (关系类型, 节点标签)
+SYMPTOM_RELATIONS = {
+    'plant_part': ('AFFECTS_PART', 'PlantPart'),
+    'weather': ('OCCURS_IN_WEATHER', 'Weather'),
+    'growth_stage': ('OCCURS_IN_STAGE', 'GrowthStage'),
+    'region': ('OCCURS_IN_REGION', 'Region')
+}
+
+# 前端节点类型 -> 图谱标签
+LABEL_MAP = {
+    'disease': 'Disease',
+    'pest': 'Pest',
+    'plantpart': 'PlantPart',
+    'region': 'Region',
+    'weather': 'Weather',
+    'growthstage': 'GrowthStage',
+    'hostcrop': 'HostCrop',
+    'naturalenemy': 'NaturalEnemy',
+}
+
+# 前端节点类型 -> 颜色
+NODE_COLORS = {
+    'disease': '#2C3E50',
+    'pest': '#C0392B',
+    'weather': '#3498DB',
+    'region': '#E67E22',
+    'plantpart': '#27AE60',
+    'growthstage': '#E67E22',
+    'hostcrop': '#16A085',
+    'naturalenemy': '#F1C40F',
+    # 其他类型...
+}
+
+
+def normalize_label(node_type: str) -> str:
+    """将前端传来的 node_type 转换为图谱标准标签"""
+    return LABEL_MAP.get(node_type.lower(), node_type.capitalize())
+
+
+def node_color(node_type: str) -> str:
+    return NODE_COLORS.get(node_type, '#888888')
+
+
+def create_node_dict(record: Any) -> Dict:
+    """从节点记录（name、label、color及病虫害属性）创建完整图谱中的节点字典"""
+    node = {
+        'id': record['name'],
+        'name': record['name'],
+        'type': record['label'].lower(),
+        'color': record['color']
+    }
+
+    # 为Disease节点添加描述信息
+    if record['label'] == 'Disease':
+        description = []
+        if record['alias']:
+            description.append(f"别名: {record['alias']}")
+        if record['pathogen']:
+            description.append(f"病原: {record['pathogen']}")
+        if record['symptoms']:
+            description.append(f"症状: {record['symptoms']}")
+        if record['treatment']:
+            description.append(f"防治: {record['treatment']}")
+
+        if description:
+            node['description'] = '\n'.join(description)
+
+        node['details'] = {
+            'alias': record['alias'] or '',
+            'pathogen': record['pathogen'] or '',
+            'symptoms': record['symptoms'] or '',
+            'treatment': record['treatment'] or ''
+        }
+
+    # 为Pest节点添加描述信息
+    elif record['label'] == 'Pest':
+        description = []
+        if record['alias']:
+            description.append(f"别名: {record['alias']}")
+        if record['host']:
+            description.append(f"为害作物: {record['host']}")
+        if record['symptoms']:
+            description.append(f"为害特征: {record['symptoms']}")
+        if record['treatment']:
+            description.append(f"防治: {record['treatment']}")
+
+        if description:
+            node['description'] = '\n'.join(description)
+
+        node['details'] = {
+            'alias': record['alias'] or '',
+            'host': record['host'] or '',
+            'symptoms': record['symptoms'] or '',
+            'treatment': record['treatment'] or '',
+            'natural_enemies': record['natural_enemies'] or ''
+        }
+
+    return node
+
+
+def _subgraph_node(name, node_type):
+    return {'id': name, 'name': name, 'type': node_type, 'color': node_color(node_type)}
+
+
+class GraphStore(ABC):
+    """图谱存储接口"""
+
+    backend = None
+
+    @abstractmethod
+    def is_connected(self) -> bool:
+        """当前能否提供查询"""
+
+    @abstractmethod
+    def match_diseases(self, params: Dict[str, List[str]], categories: List[str], limit: int = 3) -> List[Dict]:
+        """按症状匹配病虫害
+
+        每个命中的症状类别计1分，只返回得分最高的一档；同分时命中的症状取值多的优先，再按名称排序，病害与虫害不分先后。
+
+        Args:
+            params (dict): {症状类别: 取值列表}，类别见 SYMPTOM_RELATIONS
+            categories (list): 有取值的症状类别
+            limit (int): 最多返回条数
+
+        Returns:
+            list: [{'name', 'alias', 'pathogen', 'symptoms', 'treatment', 'kind', 'score'}]
+        """
+
+    @abstractmethod
+    def disease_details(self, name: str) -> Optional[Dict]:
+        """病害（或虫害）详情：{'name', 'alias', 'pathogen', 'description', 'control_method'}"""
+
+    @abstractmethod
+    def main_nodes(self) -> List[Dict]:
+        """全部病虫害的详情列表，结构同 disease_details，供实体识别使用"""
+
+    @abstractmethod
+    def full_graph(self) -> Dict[str, List]:
+        """完整图谱：{'nodes', 'links'}"""
+
+    @abstractmethod
+    def node_details(self, name: str) -> Optional[Dict]:
+        """节点属性及出边关系"""
+
+    @abstractmethod
+    def related_nodes(self, name: str, relation_type: Optional[str] = None) -> List[Dict]:
+        """节点出边指向的相关节点，可按关系类型过滤"""
+
+    @abstractmethod
+    def disease_subgraph(self, name: str) -> Dict[str, List]:
+        """病虫害节点及其直接关联的非病虫害节点"""
+
+    @abstractmethod
+    def node_subgraph(self, name: str, node_type: str) -> Dict[str, List]:
+        """非病虫害节点及其直接关联的病虫害节点"""
+
+
+class EmbeddedGraphStore(GraphStore):
+    """进程内图谱存储
+
+    数据来自本地SQLite快照（见 backend.graph_snapshot），加载后全部查询都在内存
+    邻接表上完成。症状匹配额外使用 (关系类型, 目标名称) -> 病虫害 的倒排索引。
+    """
+
+    backend = 'embedded'
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot or graph_snapshot
+        self._index = None
+        self._index_version = 0
+        self._lock = threading.Lock()
+
+    def is_connected(self) -> bool:
+        return self.snapshot.exists()
+
+    def _symptom_index(self):
+        """(关系类型, 目标标签, 目标名称) -> 病虫害节点ID集合，快照更新后重建"""
+        main_nodes = self.snapshot.main_nodes()
+        if self._index_version == self.snapshot.version:
+            return self._index
+        with self._lock:
+            if self._index_version != self.snapshot.version:
+                index = {}
+                for node in main_nodes:
+                    for rel_type, target, _ in self.snapshot.neighbors(node, 'out'):
+                        index.setdefault((rel_type, target['label'], target['name']), set()).add(node['id'])
+                self._index = index
+                self._index_version = self.snapshot.version
+        return self._index
+
+    @staticmethod
+    def _row(node, score=None):
+        props = node['props']
+        return {
+            'name': node['name'],
+            'alias': props.get('alias'),
+            'pathogen': props.get('pathogen'),
+            'symptoms': props.get('symptoms') or props.get('damage'),
+            'treatment': props.get('treatment'),
+            'kind': 'pest' if node['label'] == 'Pest' else 'disease',
+            'score': score
+        }
+
+    @classmethod
+    def _details(cls, node):
+        row = cls._row(node)
+        return {
+            'name': row['name'],
+            'alias': row['alias'],
+            'pathogen': row['pathogen'],
+            'description': row['symptoms'],
+            'control_method': row['treatment']
+        }
+
+    def match_diseases(self, params, categories, limit=3):
+        index = self._symptom_index()
+        scores = {}
+        # 命中的症状取值数，同分时命中取值多的优先，再按名称排序，病害与虫害不分先后
+        hits = {}
+        for category in categories:
+            rel, label = SYMPTOM_RELATIONS[category]
+            matched = set()
+            for value in params[category]:
+                nodes = index.get((rel, label, value), set())
+                matched |= nodes
+                for node_id in nodes:
+                    hits[node_id] = hits.get(node_id, 0) + 1
+            for node_id in matched:
+                scores[node_id] = scores.get(node_id, 0) + 1
+        if not scores:
+            return []
+        best = max(scores.values())
+        ranked = sorted(
+            (node_id for node_id, score in scores.items() if score == best),
+            key=lambda node_id: (-hits[node_id], self.snapshot.get(node_id)['name'])
+        )
+        return [self._row(self.snapshot.get(node_id), best) for node_id in ranked[:limit]]
+
+    def disease_details(self, name):
+        node = self.snapshot.find(name, 'Disease') or self.snapshot.find(name, 'Pest')
+        return self._details(node) if node is not None else None
+
+    def main_nodes(self):
+        return [{key: value or '' for key, value in self._details(node).items()}
+                for node in self.snapshot.main_nodes() if node['name']]
+
+    def full_graph(self):
+        nodes = {}
+        links = []
+        for node in self.snapshot.nodes():
+            props = node['props']
+            if node['name'] not in nodes:
+                nodes[node['name']] = create_node_dict({
+                    'name': node['name'],
+                    'label': node['label'],
+                    'color': props.get('color'),
+                    'alias': props.get('alias'),
+                    'pathogen': props.get('pathogen'),
+                    'symptoms': props.get('symptoms') or props.get('damage'),
+                    'treatment': props.get('treatment'),
+                    'host': props.get('host'),
+                    'natural_enemies': props.get('natural_enemies')
+                })
+            for rel_type, target, _ in self.snapshot.neighbors(node, 'out'):
+                links.append({'source': node['name'], 'target': target['name'], 'type': rel_type})
+        return {'nodes': list(nodes.values()), 'links': links}
+
+    def node_details(self, name):
+        node = self.snapshot.find(name)
+        if node is None:
+            return None
+        relations = []
+        for rel_type, target, _ in self.snapshot.neighbors(node, 'out'):
+            relation = {'rel': rel_type, 'target': target['name']}
+            if relation not in relations:
+                relations.append(relation)
+        return {
+            'id': node['name'],
+            'name': node['name'],
+            'type': node['label'],
+            'properties': node['props'],
+            # 与Cypher中 OPTIONAL MATCH + collect 的结果保持一致
+            'relations': relations or [{'rel': None, 'target': None}]
+        }
+
+    def related_nodes(self, name, relation_type=None):
+        node = self.snapshot.find(name)
+        if node is None:
+            return []
+        return [{
+            'id': target['name'],
+            'name': target['name'],
+            'type': target['label'],
+            'relation_type': rel_type
+        } for rel_type, target, _ in self.snapshot.neighbors(node, 'out', relation_type)]
+
+    def disease_subgraph(self, name):
+        nodes = {}
+        links = []
+        for label in MAIN_LABELS:
+            disease = self.snapshot.find(name, label)
+            if disease is None:
+                continue
+            d_type = 'pest' if label == 'Pest' else 'disease'
+            for rel_type, other, _ in self.snapshot.neighbors(disease, 'both'):
+                if other['label'] in MAIN_LABELS:
+                    continue
+                nodes[disease['name']] = _subgraph_node(disease['name'], d_type)
+                nodes[other['name']] = _subgraph_node(other['name'], other['label'].lower())
+                links.append({'source': disease['name'], 'target': other['name'], 'type': rel_type})
+        return {'nodes': list(nodes.values()), 'links': links}
+
+    def node_subgraph(self, name, node_type):
+        nodes = {}
+        links = []
+        node = self.snapshot.find(name, normalize_label(node_type))
+        if node is not None:
+            for rel_type, other, _ in self.snapshot.neighbors(node, 'both'):
+                if other['label'] not in MAIN_LABELS:
+                    continue
+                d_type = 'pest' if other['label'] == 'Pest' else 'disease'
+                nodes[node['name']] = _subgraph_node(node['name'], node['label'].lower())
+                nodes[other['name']] = _subgraph_node(other['name'], d_type)
+                links.append({'source': node['name'], 'target': other['name'], 'type': rel_type})
+        return {'nodes': list(nodes.values()), 'links': links}
+
+
+class Neo4jGraphStore(GraphStore):
+    """Neo4j图谱存储，连接失败时由 EmbeddedGraphStore 读本地快照作答"""
+
+    backend = 'neo4j'
+
+    def __init__(self, driver_getter=None, fallback=None):
+        if driver_getter is None:
+            from backend.connections import get_neo4j_driver
+            driver_getter = get_neo4j_driver
+        self._driver_getter = driver_getter
+        self.fallback = fallback or EmbeddedGraphStore()
+
+    @property
+    def driver(self):
+        return self._driver_getter()
+
+    def is_connected(self):
+        """驱动已创建且最近没有连接失败"""
+        return neo4j_available(self.driver)
+
+    def _query(self, operation, run, *args):
+        """执行Neo4j查询，Neo4j不可用时调用快照存储的同名方法"""
+        driver = self.driver
+        return query_graph(driver, operation, lambda: run(driver, *args),
+                           lambda snapshot: getattr(self.fallback, operation)(*args))
+
+    def match_diseases(self, params, categories, limit=3):
+        return self._query('match_diseases', self._match_diseases, params, categories, limit)
+
+    @staticmethod
+    def _match_diseases(driver, params, categories, limit):
+        # 每个类别一个 EXISTS 子查询，命中计1分；同分时按命中的症状取值数、名称排序，病害与虫害不分先后
+        relations = [(category, rel, label) for category, (rel, label) in SYMPTOM_RELATIONS.items()
+                     if category in categories]
+        score_terms = [
+            f"CASE WHEN EXISTS {{ MATCH (d)-[:{rel}]->(n:{label}) WHERE n.name IN ${category} }} THEN 1 ELSE 0 END"
+            for category, rel, label in relations
+        ]
+        hit_terms = [
+            f"COUNT {{ MATCH (d)-[:{rel}]->(n:{label}) WHERE n.name IN ${category} }}"
+            for category, rel, label in relations
+        ]
+        query = f"""
+        MATCH (d)
+        WHERE d:Disease OR d:Pest
+        WITH d, {' + '.join(score_terms)} AS score
+        WHERE score > 0
+        WITH max(score) AS best, collect({{d: d, score: score}}) AS rows
+        UNWIND rows AS row
+        WITH row, best
+        WHERE row.score = best
+        WITH row.d AS d, row.score AS score, {' + '.join(hit_terms)} AS hits
+        RETURN d.name as name,
+               d.alias as alias,
+               d.pathogen as pathogen,
+               coalesce(d.symptoms, d.damage) as symptoms,
+               d.treatment as treatment,
+               CASE WHEN d:Pest THEN 'pest' ELSE 'disease' END as kind,
+               score as matched_symptoms,
+               hits
+        ORDER BY hits DESC, name
+        LIMIT {int(limit)}
+        """
+        with track('neo4j', 'query_disease'), driver.session() as session:
+            logger.debug("查询参数: %s", params)
+            return [{
+                'name': record['name'],
+                'alias': record.get('alias'),
+                'pathogen': record.get('pathogen'),
+                'symptoms': record.get('symptoms'),
+                'treatment': record.get('treatment'),
+                'kind': record['kind'],
+                'score': record['matched_symptoms']
+            } for record in session.run(query, params)]
+
+    def disease_details(self, name):
+        return self._query('disease_details', self._disease_details, name)
+
+    @staticmethod
+    def _disease_details(driver, name):
+        with track('neo4j', 'get_disease_details'), driver.session() as session:
+            query = """
+            MATCH (d {name: $name})
+            WHERE d:Disease OR d:Pest
+            RETURN d.name as name,
+                   d.alias as alias,
+                   d.pathogen as pathogen,
+                   coalesce(d.symptoms, d.damage) as symptoms,
+                   d.treatment as treatment
+            LIMIT 1
+            """
+
+            result = session.run(query, {'name': name})
+            record = result.single()
+
+            if record:
+                return {
+                    'name': record['name'],
+                    'alias': record.get('alias', ''),
+                    'pathogen': record.get('pathogen', ''),
+                    'description': record.get('symptoms', ''),  # 使用symptoms作为description
+                    'control_method': record.get('treatment', '')
+                }
+            return None
+
+    def main_nodes(self):
+        return self._query('main_nodes', self._main_nodes)
+
+    @staticmethod
+    def _main_nodes(driver):
+        with track('neo4j', 'load_entities'), driver.session() as session:
+            result = session.run("""
+            MATCH (d)
+            WHERE d:Disease OR d:Pest
+            RETURN d.name as name,
+                   d.alias as alias,
+                   d.pathogen as pathogen,
+                   coalesce(d.symptoms, d.damage) as symptoms,
+                   d.treatment as treatment
+            """)
+            return [{
+                'name': record['name'],
+                'alias': record['alias'] or '',
+                'pathogen': record['pathogen'] or '',
+                'description': record['symptoms'] or '',
+                'control_method': record['treatment'] or ''
+            } for record in result if record['name']]
+
+    def full_graph(self):
+        return self._query('full_graph', self._full_graph)
+
+    @staticmethod
+    def _full_graph(driver):
+        with track('neo4j', 'get_full_graph'), driver.session() as session:
+            result = session.run("""
+                MATCH (n)
+                OPTIONAL MATCH (n)-[r]->(m)
+                RETURN DISTINCT
+                    n.name as name,
+                    labels(n)[0] as label,
+                    n.color as color,
+                    n.alias as alias,
+                    n.pathogen as pathogen,
+                    coalesce(n.symptoms, n.damage) as symptoms,
+                    n.treatment as treatment,
+                    n.host as host,
+                    n.natural_enemies as natural_enemies,
+                    type(r) as relationship,
+                    m.name as target
+            """)
+
+            nodes = {}
+            links = []
+
+            for record in result:
+                # 处理节点
+                node_id = record['name']
+                if node_id not in nodes:
+                    nodes[node_id] = create_node_dict(record)
+
+                # 处理关系
+                if record['relationship'] and record['target']:
+                    links.append({
+                        'source': node_id,
+                        'target': record['target'],
+                        'type': record['relationship']
+                    })
+
+            return {
+                'nodes': list(nodes.values()),
+                'links': links
+            }
+
+    def node_details(self, name):
+        return self._query('node_details', self._node_details, name)
+
+    @staticmethod
+    def _node_details(driver, name):
+        with track('neo4j', 'get_node_details'), driver.session() as session:
+            result = session.run("""
+                MATCH (n {name: $name})
+                OPTIONAL MATCH (n)-[r]->(m)
+                RETURN n,
+                       collect(distinct {rel: type(r), target: m.name}) as relations
+            """, name=name)
+
+            record = result.single()
+            if not record:
+                return None
+
+            node = record['n']
+            return {
+                'id': node['name'],
+                'name': node['name'],
+                'type': list(node.labels)[0],
+                'properties': dict(node),
+                'relations': record['relations']
+            }
+
+    def related_nodes(self, name, relation_type=None):
+        return self._query('related_nodes', self._related_nodes, name, relation_type)
+
+    @staticmethod
+    def _related_nodes(driver, name, relation_type):
+        with track('neo4j', 'get_related_nodes'), driver.session() as session:
+            query = """
+                MATCH (n {name: $name})
+                OPTIONAL MATCH (n)-[r]->(m)
+                WHERE $relation_type IS NULL OR type(r) = $relation_type
+                RETURN m, type(r) as relation_type
+            """
+
+            result = session.run(query, name=name, relation_type=relation_type)
+
+            related_nodes = []
+            for record in result:
+                if record['m']:
+                    node = record['m']
+                    related_nodes.append({
+                        'id': node['name'],
+                        'name': node['name'],
+                        'type': list(node.labels)[0],
+                        'relation_type': record['relation_type']
+                    })
+            return related_nodes
+
+    def disease_subgraph(self, name):
+        return self._query('disease_subgraph', self._disease_subgraph, name)
+
+    @staticmethod
+    def _disease_subgraph(driver, name):
+        with track('neo4j', 'get_disease_subgraph'), driver.session() as session:
+            result = session.run("""
+                MATCH (d {name: $disease_name})-[r]-(n)
+                WHERE (d:Disease OR d:Pest) AND NOT (n:Disease OR n:Pest)
+                RETURN d, r, n
+            """, disease_name=name)
+
+            nodes = {}
+            links = []
+            for record in result:
+                d = record['d']
+                n = record['n']
+                r = record['r']
+                # 病虫害节点
+                d_type = 'pest' if 'Pest' in d.labels else 'disease'
+                nodes[d['name']] = _subgraph_node(d['name'], d_type)
+                # 非病害节点
+                n_type = list(n.labels)[0].lower() if n.labels else 'unknown'
+                nodes[n['name']] = _subgraph_node(n['name'], n_type)
+                links.append({
+                    'source': d['name'],
+                    'target': n['name'],
+                    'type': r.type
+                })
+            return {
+                'nodes': list(nodes.values()),
+                'links': links
+            }
+
+    def node_subgraph(self, name, node_type):
+        return self._query('node_subgraph', self._node_subgraph, name, node_type)
+
+    @staticmethod
+    def _node_subgraph(driver, name, node_type):
+        with track('neo4j', 'get_node_subgraph'), driver.session() as session:
+            label = normalize_label(node_type)
+            cypher = f"""
+                MATCH (n:{label} {{name: $node_name}})-[r]-(d)
+                WHERE d:Disease OR d:Pest
+                RETURN n, r, d
+            """
+            result = session.run(cypher, node_name=name)
+            nodes = {}
+            links = []
+            for record in result:
+                n = record['n']
+                d = record['d']
+                r = record['r']
+                n_type = list(n.labels)[0].lower() if n.labels else 'unknown'
+                nodes[n['name']] = _subgraph_node(n['name'], n_type)
+                d_type = 'pest' if 'Pest' in d.labels else 'disease'
+                nodes[d['name']] = _subgraph_node(d['name'], d_type)
+                links.append({
+                    'source': n['name'],
+                    'target': d['name'],
+                    'type': r.type
+                })
+            return {
+                'nodes': list(nodes.values()),
+                'links': links
+            }
+
+
+GRAPH_STORE_BACKENDS = {
+    'neo4j': Neo4jGraphStore,
+    'embedded': EmbeddedGraphStore,
+}
+
+_graph_store = None
+_graph_store_lock = threading.Lock()
+
+
+def get_graph_store():
+    """获取全局图谱存储（GRAPH_STORE_BACKEND：neo4j / embedded）"""
+    global _graph_store
+    if _graph_store is None:
+        with _graph_store_lock:
+            if _graph_store is None:
+                backend = getattr(settings, 'GRAPH_STORE_BACKEND', 'neo4j')
+                if backend not in GRAPH_STORE_BACKENDS:
+                    raise ValueError(f"未知的图谱存储后端: {backend}")
+                _graph_store = GRAPH_STORE_BACKENDS[backend]()
+                logger.info("图谱存储后端: %s", backend)
+    return _graph_store
+
+
+# 预热时加载快照或建立Neo4j连接
+services.register('graph_store', get_graph_store, probe=lambda store: store.main_nodes(), cache=False)
@@ -0,0 +1,102 @@
+"""
+小麦生育期模型
+
+把生育期名称统一到一条有序的时间轴上，每个名称对应轴上的一个区间，预先
+编码为位掩码，包括：
+- 单个生育期（拔节期、抽穗期……）占一位
+- 宽泛说法（全生育期、生育后期、苗期……）占连续多位
+- 两个生育期区间有交集即视为重叠，重叠关系在构建时一次算好
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 按发生先后排列的基本生育期，每个占掩码中的一位
+ORDERED_STAGES = (
+    '播种期', '发芽期', '出苗期', '三叶期', '分蘖期', '越冬期', '返青期', '起身期',
+    '拔节期', '孕穗期', '抽穗期', '扬花期', '灌浆期', '乳熟期', '成熟期', '收获期',
+)
+
+# 宽泛或同义的生育期 -> (起始生育期, 结束生育期)，闭区间
+STAGE_RANGES = {
+    '全生育期': ('播种期', '收获期'),
+    '生长全期': ('播种期', '收获期'),
+    '全生长期': ('播种期', '收获期'),
+    '苗期': ('出苗期', '起身期'),
+    '幼苗期': ('出苗期', '分蘖期'),
+    '3-4叶期': ('三叶期', '三叶期'),
+    '4-6叶期': ('三叶期', '分蘖期'),
+    '冬前': ('出苗期', '越冬期'),
+    '茎节期': ('拔节期', '拔节期'),
+    '开花期': ('扬花期', '扬花期'),
+    '抽穗扬花期': ('抽穗期', '扬花期'),
+    '生育中期': ('起身期', '孕穗期'),
+    '生育后期': ('抽穗期', '成熟期'),
+    '成株期': ('拔节期', '成熟期'),
+}
+
+# 关键节点：同一段文本提到多个时只保留一个
+MILESTONES = ('苗期', '拔节期', '抽穗期', '灌浆期')
+
+
+class GrowthStageIndex:
+    """生育期区间索引
+
+    mask(name) 返回生育期对应的位掩码；overlapping(name) 返回与之有交集的全部
+    已知生育期名称，结果在构建时预先算好。
+    """
+
+    def __init__(self, ordered_stages=ORDERED_STAGES, stage_ranges=STAGE_RANGES, milestones=MILESTONES):
+        self.order = {stage: i for i, stage in enumerate(ordered_stages)}
+        self.milestones = frozenset(milestones)
+        self._masks = {stage: 1 << i for stage, i in self.order.items()}
+        for name, (start, end) in stage_ranges.items():
+            lo, hi = self.order[start], self.order[end]
+            self._masks[name] = ((1 << (hi - lo + 1)) - 1) << lo
+        self._overlapping = {
+            name: frozenset(other for other, other_mask in self._masks.items() if mask & other_mask)
+            for name, mask in self._masks.items()
+        }
+        logger.info("生育期索引构建完成: %s 个生育期", len(self._masks))
+
+    def mask(self, name):
+        """生育期位掩码，未知生育期返回0"""
+        return self._masks.get(name, 0)
+
+    def overlaps(self, a, b):
+        """两个生育期区间是否有交集"""
+        return a == b or bool(self.mask(a) & self.mask(b))
+
+    def overlapping(self, name):
+        """与该生育期区间有交集的全部生育期名称（含自身）"""
+        return self._overlapping.get(name) or frozenset([name])
+
+    def expand(self, names):
+        """把一组生育期展开为与其重叠的全部生育期，保持输入顺序在前"""
+        if isinstance(names, str):
+            names = [names]
+        expanded = []
+        seen = set()
+        for name in names or []:
+            for stage in [name] + sorted(self.overlapping(name), key=self.sort_key):
+                if stage and stage not in seen:
+                    seen.add(stage)
+                    expanded.append(stage)
+        return expanded
+
+    def sort_key(self, name):
+        """按区间起点、再按区间长度排序；未知生育期排在最后"""
+        mask = self.mask(name)
+        if not mask:
+            return (len(self.order), 0, name)
+        start = (mask & -mask).bit_length() - 1
+        return (start, bin(mask).count('1'), name)
+
+    def earliest(self, names):
+        """返回一组生育期中最早开始的一个"""
+        return min(names, key=self.sort_key)
+
+
+# 创建全局生育期索引实例
+growth_stage_index = GrowthStageIndex()
@@ -0,0 +1,225 @@
+"""
+健康检查模块
+
+提供给负载均衡和运维使用的两个接口：
+- /healthz：存活检查，只说明进程能处理请求，不访问任何后端
+- /readyz：就绪检查，并发探测Redis、Neo4j、MySQL和大模型接口，关键依赖不可用时
+  返回503，负载均衡据此把本实例摘出，避免用户请求一直等到超时；Neo4j不可用但本地
+  图谱快照可用时只报告降级（degraded），实例仍可用快照回答图谱查询
+
+探测结果缓存 HEALTH_CACHE_TTL 秒，同一时间只有一轮探测在进行，频繁轮询不会压垮后端。
+"""
+
+import time
+import logging
+import threading
+from django.conf import settings
+from django.http import JsonResponse
+from backend.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# 依赖是否可用（1可用，0不可用）及最近一次探测耗时
+DEPENDENCY_UP = registry.gauge(
+    'backend_dependency_up', '就绪检查中各依赖是否可用', ('dependency',)
+)
+DEPENDENCY_PROBE_SECONDS = registry.gauge(
+    'backend_dependency_probe_seconds', '就绪检查中各依赖最近一次探测耗时', ('dependency',)
+)
+
+
+def probe_redis():
+    from backend.connections import get_redis_client
+    client = get_redis_client()
+    if client is None:
+        raise RuntimeError("Redis客户端未初始化")
+    client.ping()
+
+
+def probe_neo4j():
+    from backend.connections import get_neo4j_driver
+    driver = get_neo4j_driver()
+    if driver is None:
+        raise RuntimeError("Neo4j驱动未初始化")
+    from backend.graph_snapshot import graph_breaker
+    try:
+        driver.verify_connectivity()
+    except Exception:
+        # 探测失败时查询直接改用本地快照，不必再等一次连接超时
+        graph_breaker.record_failure()
+        raise
+    if graph_breaker.state != graph_breaker.CLOSED:
+        graph_breaker.record_success()
+
+
+def probe_graph_snapshot():
+    """本地图谱快照：检查快照能否加载"""
+    from backend.graph_snapshot import graph_snapshot
+    if not graph_snapshot.exists():
+        raise RuntimeError(f"本地图谱快照不存在: {graph_snapshot.path}")
+    return f"{len(graph_snapshot.nodes())} nodes"
+
+
+def probe_mysql():
+    """探测Django实际使用的数据库，探测线程中的连接用完即关"""
+    from django.db import connection
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    finally:
+        connection.close()
+
+
+def probe_llm():
+    """探测大模型接口是否可达：能收到HTTP响应即视为可达，熔断打开时视为不可用"""
+    from openai import APIStatusError
+    from backend.connections import get_llm_gateway
+    gateway = get_llm_gateway()
+    if gateway is None:
+        raise RuntimeError("大模型客户端未初始化")
+    if gateway.breaker.state == gateway.breaker.OPEN:
+        raise RuntimeError("大模型调用已熔断")
+    try:
+        gateway.client.with_options(timeout=settings.HEALTH_PROBE_TIMEOUT, max_retries=0).models.list()
+    except APIStatusError as e:
+        return f"HTTP {e.status_code}"
+
+
+class HealthChecker:
+    """依赖探测器
+
+    Args:
+        probes (dict): {依赖名称: 探测函数}，探测函数失败时抛出异常，可返回附加说明
+        critical (tuple): 关键依赖名称，任一不可用时就绪检查失败
+        fallbacks (dict): {关键依赖名称: 备用依赖名称}，关键依赖不可用但备用依赖可用时只报告降级
+        timeout (float): 单个探测的最长等待秒数
+        cache_ttl (float): 探测结果缓存秒数
+    """
+
+    def __init__(self, probes, critical=(), fallbacks=None, timeout=2.0, cache_ttl=5.0):
+        self.probes = probes
+        self.critical = set(critical)
+        self.fallbacks = fallbacks or {}
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self._cached = None
+        self._cached_at = 0.0
+        self._lock = threading.Lock()
+        # 仍在运行的探测线程；上一轮超时未返回的依赖不会被重复探测
+        self._running = {}
+
+    def _run_probe(self, name, probe, result):
+        start = time.perf_counter()
+        try:
+            detail = probe()
+            result.update(status='up', detail=detail)
+        except Exception as e:
+            result.update(status='down', error=str(e))
+        finally:
+            result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    def _probe_all(self):
+        started = time.perf_counter()
+        pending = {}
+        for name, probe in self.probes.items():
+            result = {'status': 'timeout'}
+            thread = self._running.get(name)
+            if thread is not None and thread.is_alive():
+                result['error'] = "上一次探测仍未返回"
+                pending[name] = (None, result)
+                continue
+            thread = threading.Thread(target=self._run_probe, args=(name, probe, result),
+                                      name=f"health-{name}", daemon=True)
+            thread.start()
+            self._running[name] = thread
+            pending[name] = (thread, result)
+
+        deadline = started + self.timeout
+        dependencies = {}
+        for name, (thread, result) in pending.items():
+            if thread is not None:
+                thread.join(max(0.0, deadline - time.perf_counter()))
+                if thread.is_alive():
+                    result = {'status': 'timeout', 'error': f"探测超过 {self.timeout}s 未返回",
+                              'latency_ms': round(self.timeout * 1000, 1)}
+            item = {key: value for key, value in dict(result).items() if value is not None}
+            item['critical'] = name in self.critical
+            dependencies[name] = item
+            DEPENDENCY_UP.set(1 if item['status'] == 'up' else 0, name)
+            if 'latency_ms' in item:
+                DEPENDENCY_PROBE_SECONDS.set(item['latency_ms'] / 1000, name)
+
+        failed = [name for name, item in dependencies.items() if item['status'] != 'up']
+        degraded = []
+        for name in failed:
+            fallback = self.fallbacks.get(name)
+            if name in self.critical and fallback and dependencies.get(fallback, {}).get('status') == 'up':
+                dependencies[name]['fallback'] = fallback
+                degraded.append(name)
+        ready = not any(name in self.critical and name not in degraded for name in failed)
+        if failed:
+            logger.warning("就绪检查发现依赖不可用: %s", ', '.join(failed))
+        return {
+            'status': ('degraded' if degraded else 'ready') if ready else 'unavailable',
+            'ready': ready,
+            'checked_at': time.time(),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'dependencies': dependencies,
+        }
+
+    def check(self, refresh=False):
+        """返回就绪检查结果，缓存期内直接复用上一次的结果"""
+        with self._lock:
+            age = time.monotonic() - self._cached_at
+            if self._cached is None or refresh or age >= self.cache_ttl:
+                self._cached = self._probe_all()
+                self._cached_at = time.monotonic()
+                age = 0.0
+            return {**self._cached, 'cache_age_s': round(age, 2)}
+
+
+def _build_checker():
+    probes = {'redis': probe_redis, 'neo4j': probe_neo4j, 'mysql': probe_mysql, 'llm': probe_llm}
+    critical = settings.HEALTH_CRITICAL_DEPENDENCIES
+    fallbacks = {}
+    if getattr(settings, 'GRAPH_STORE_BACKEND', 'neo4j') == 'embedded':
+        # 进程内图谱存储不依赖Neo4j，改为检查本地快照
+        del probes['neo4j']
+        probes['graph'] = probe_graph_snapshot
+        critical = tuple('graph' if name == 'neo4j' else name for name in critical)
+    else:
+        # Neo4j不可用时图谱查询改用本地快照，快照可用就不必摘除实例
+        probes['graph'] = probe_graph_snapshot
+        fallbacks['neo4j'] = 'graph'
+    return HealthChecker(
+        probes,
+        critical=critical,
+        fallbacks=fallbacks,
+        timeout=settings.HEALTH_PROBE_TIMEOUT,
+        cache_ttl=settings.HEALTH_CACHE_TTL
+    )
+
+
+_checker = None
+_checker_lock = threading.Lock()
+
+
+def get_health_checker():
+    """获取全局依赖探测器"""
+    global _checker
+    if _checker is None:
+        with _checker_lock:
+            if _checker is None:
+                _checker = _build_checker()
+    return _checker
+
+
+def healthz_view(request):
+    """存活检查：进程能响应即返回200"""
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz_view(request):
+    """就绪检查：关键依赖都可用（或由备用依赖顶替）时返回200，否则返回503"""
+    report = get_health_checker().check()
+    return JsonResponse(report, status=200 if report['ready'] else 503)
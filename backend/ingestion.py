@@ -0,0 +1,357 @@
+"""
+图谱数据导入流水线
+
+导入按地区整理的大型病虫害目录时使用，包括：
+- iter_rows()：流式读取CSV或XLSX数据行，不把整张表读入内存
+- IngestionPipeline.stage()：把数据行按块分发到进程池提取关键词，结果按原始行序
+  逐条写入JSONL暂存文件（默认在系统临时目录中创建，写入完成后由 discard_staged() 删除）
+- read_staged()：按批次读回暂存结果，供写入Neo4j或生成本地快照
+- diff_staged()：把暂存结果与当前图谱逐行比较，供 init_graph --dry-run 输出差异报告
+
+提取全部完成并落盘后才打开数据库事务，事务内只做批量写入，不再持锁等待提取。
+"""
+
+import os
+import csv
+import json
+import time
+import logging
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from backend.timing import RequestTimer
+
+logger = logging.getLogger(__name__)
+
+# 支持的数据文件格式
+SOURCE_SUFFIXES = ('.csv', '.xlsx')
+
+# 主节点类别 -> (行校验方法, 行提取方法)，均为 GraphManager 的方法
+EXTRACTORS = {
+    'disease': ('_validate_csv_data', '_extract_disease_row'),
+    'pest': ('_validate_pest_data', '_extract_pest_row'),
+}
+
+
+def resolve_source(path):
+    """返回实际存在的数据文件：指定文件不存在时尝试同名的其他格式（CSV与XLSX互为备选）"""
+    path = Path(path)
+    if path.exists():
+        return path
+    for suffix in SOURCE_SUFFIXES:
+        candidate = path.with_suffix(suffix)
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _iter_xlsx_rows(path):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError(f"读取XLSX文件需要安装openpyxl: {path}")
+
+    # 只读模式按行解析，内存占用与表格大小无关
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        fields = [_cell_text(cell) for cell in header]
+        for values in rows:
+            if values is None or all(cell is None for cell in values):
+                continue
+            yield {field: _cell_text(value) for field, value in zip(fields, values) if field}
+    finally:
+        workbook.close()
+
+
+def iter_rows(path):
+    """逐行读取数据文件
+
+    Args:
+        path (Path): CSV（UTF-8，可带BOM）或XLSX（读取第一个工作表，首行为表头）文件
+
+    Yields:
+        dict: {列名: 单元格文本}
+    """
+    path = Path(path)
+    if path.suffix.lower() == '.xlsx':
+        yield from _iter_xlsx_rows(path)
+        return
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        yield from csv.DictReader(f)
+
+
+def extract_rows(manager, kind, rows):
+    """校验并提取一批数据行
+
+    Args:
+        manager (GraphManager): 提供校验和提取方法的图谱管理器
+        kind (str): disease 或 pest
+        rows (list): 数据行
+
+    Returns:
+        tuple: (提取结果列表, 失败原因列表)
+    """
+    validate_name, extract_name = EXTRACTORS[kind]
+    validate = getattr(manager, validate_name)
+    extract = getattr(manager, extract_name)
+    records = []
+    errors = []
+    for row in rows:
+        try:
+            if validate(row):
+                records.append(extract(row))
+            else:
+                errors.append(f"跳过无效数据行: {row}")
+        except Exception as e:
+            errors.append(f"处理数据行失败: {e}")
+    return records, errors
+
+
+# 工作进程内的图谱管理器，只借用提取逻辑，不建立任何连接
+_worker_manager = None
+
+
+def _init_worker():
+    global _worker_manager
+    from backend.graph_manager import GraphManager
+    from backend.vocabulary import vocabulary
+
+    _worker_manager = GraphManager.__new__(GraphManager)
+    _worker_manager.driver = None
+    _worker_manager.vocabulary = vocabulary
+
+
+def _extract_chunk(kind, rows):
+    """工作进程入口，同时返回本块的提取耗时"""
+    start = time.perf_counter()
+    records, errors = extract_rows(_worker_manager, kind, rows)
+    return records, errors, time.perf_counter() - start
+
+
+def read_staged(path, batch_size=None):
+    """按批次读回暂存文件
+
+    Yields:
+        tuple: (主节点类别, 提取结果列表)，同一批次内类别相同
+    """
+    batch_size = batch_size or settings.GRAPH_INGEST_CHUNK_SIZE
+    kind = None
+    batch = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            item = json.loads(line)
+            if batch and (item['kind'] != kind or len(batch) >= batch_size):
+                yield kind, batch
+                batch = []
+            kind = item['kind']
+            batch.append({'properties': item['properties'], 'links': item['links']})
+    if batch:
+        yield kind, batch
+
+
+def discard_staged(path):
+    """删除用完的暂存文件"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class IngestionPipeline:
+    """数据导入流水线
+
+    Args:
+        manager (GraphManager): 单进程提取时使用的图谱管理器
+        workers (int): 提取进程数，0表示使用全部CPU核心，1表示在当前进程中提取
+        chunk_size (int): 每个任务包含的行数
+        staging_path (str): 暂存文件路径，为空时每次暂存都在系统临时目录中新建文件
+    """
+
+    def __init__(self, manager, workers=None, chunk_size=None, staging_path=None):
+        self.manager = manager
+        workers = settings.GRAPH_INGEST_WORKERS if workers is None else workers
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size or settings.GRAPH_INGEST_CHUNK_SIZE
+        self.staging_path = staging_path or settings.GRAPH_INGEST_STAGING_PATH or None
+
+    def _chunks(self, path, timer):
+        """按块读取数据行，读取耗时计入 parse 阶段（生成器挂起期间不计时）"""
+        chunk = []
+        start = time.perf_counter()
+        for row in iter_rows(path):
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                timer.add('parse', time.perf_counter() - start)
+                yield chunk
+                chunk = []
+                start = time.perf_counter()
+        timer.add('parse', time.perf_counter() - start)
+        if chunk:
+            yield chunk
+
+    def _extract(self, kind, path, executor, timer):
+        """按原始行序产出每块的提取结果；进程池中同时排队的块数有上限，读取不会远超提取进度
+
+        extract 阶段为各进程提取耗时之和，进程池模式下可能大于实际经过的时间。
+        """
+        if executor is None:
+            for chunk in self._chunks(path, timer):
+                with timer.span('extract'):
+                    result = extract_rows(self.manager, kind, chunk)
+                yield result
+            return
+        pending = deque()
+
+        def collect():
+            records, errors, seconds = pending.popleft().result()
+            timer.add('extract', seconds)
+            return records, errors
+
+        for chunk in self._chunks(path, timer):
+            pending.append(executor.submit(_extract_chunk, kind, chunk))
+            if len(pending) >= self.workers * 2:
+                yield collect()
+        while pending:
+            yield collect()
+
+    def stage(self, sources, timer=None):
+        """提取全部数据文件并写入暂存文件
+
+        Args:
+            sources (list): [(主节点类别, 数据文件路径, 文件不存在时是否报错)]
+            timer (RequestTimer): 阶段计时器，累加 parse / extract / stage 三个阶段
+
+        Returns:
+            dict: {'path': 暂存文件, 'counts': {类别: 成功行数}, 'errors': {类别: 失败行数}, 'seconds': 耗时}
+
+        Raises:
+            FileNotFoundError: 必需的数据文件不存在
+        """
+        timer = timer or RequestTimer()
+        started = time.perf_counter()
+        resolved = []
+        for kind, path, required in sources:
+            source = resolve_source(path)
+            if source is None:
+                if required:
+                    raise FileNotFoundError(f"数据文件不存在: {path}")
+                logger.warning("数据文件不存在，跳过: %s", path)
+                continue
+            resolved.append((kind, source))
+
+        counts = {kind: 0 for kind, _, _ in sources}
+        errors = dict(counts)
+        staging_path = self.staging_path
+        if staging_path is None:
+            fd, staging_path = tempfile.mkstemp(prefix='graph_staging_', suffix='.jsonl')
+            os.close(fd)
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(staging_path)), exist_ok=True)
+        tmp_path = f"{staging_path}.tmp"
+
+        executor = ProcessPoolExecutor(self.workers, initializer=_init_worker) if self.workers > 1 else None
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for kind, source in resolved:
+                    for records, failures in self._extract(kind, source, executor, timer):
+                        with timer.span('stage'):
+                            for record in records:
+                                f.write(json.dumps({'kind': kind, **record}, ensure_ascii=False))
+                                f.write('\n')
+                        for message in failures:
+                            logger.warning("%s", message)
+                        counts[kind] += len(records)
+                        errors[kind] += len(failures)
+                    logger.info("%s 提取完成: 成功 %s 行，失败 %s 行", source, counts[kind], errors[kind])
+        except BaseException:
+            discard_staged(tmp_path)
+            if self.staging_path is None:
+                discard_staged(staging_path)
+            raise
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        os.replace(tmp_path, staging_path)
+
+        seconds = time.perf_counter() - started
+        logger.info("图谱数据暂存完成: %s（%s 个进程，耗时 %.2fs）", staging_path, self.workers, seconds)
+        return {'path': staging_path, 'counts': counts, 'errors': errors, 'seconds': seconds}
+
+
+def format_timings(stages):
+    """把阶段耗时格式化为一行文本，如 “parse 0.02s, extract 0.35s”"""
+    return ', '.join(f"{name} {seconds:.2f}s" for name, seconds in stages.items())
+
+
+def _staged_nodes(path):
+    """按 MERGE 语义合并暂存结果：同名主节点的属性后写覆盖先写，关联节点取并集"""
+    nodes = {}
+    for kind, batch in read_staged(path):
+        for record in batch:
+            key = (kind, record['properties']['name'])
+            node = nodes.setdefault(key, {'properties': {}, 'links': {}})
+            node['properties'].update(record['properties'])
+            for category, targets in record['links'].items():
+                node['links'].setdefault(category, set()).update(targets)
+    return nodes
+
+
+def diff_staged(path, current):
+    """逐个主节点比较暂存结果与当前图谱
+
+    Args:
+        path (str): 暂存文件路径
+        current (dict): {(类别, 名称): {'properties': 属性, 'links': {关联类别: set(名称)}}}
+
+    Returns:
+        dict: {
+            'rows': [{'kind', 'name', 'status', 'links', 'added', 'removed', 'properties'}],
+            'removed': [{'kind', 'name'}],
+            'summary': {状态: 数量}
+        }
+        status 为 added（图谱中没有）、changed 或 unchanged；added / removed 为各关联类别
+        新增、减少的节点名称，properties 为取值发生变化的属性名
+    """
+    rows = []
+    staged = _staged_nodes(path)
+    for (kind, name), node in staged.items():
+        old = current.get((kind, name))
+        links = {category: sorted(targets) for category, targets in sorted(node['links'].items())}
+        row = {'kind': kind, 'name': name, 'links': links, 'added': {}, 'removed': {}, 'properties': []}
+        if old is None:
+            row['status'] = 'added'
+            rows.append(row)
+            continue
+        for category in sorted(set(node['links']) | set(old['links'])):
+            new_targets = node['links'].get(category, set())
+            old_targets = old['links'].get(category, set())
+            if new_targets - old_targets:
+                row['added'][category] = sorted(new_targets - old_targets)
+            if old_targets - new_targets:
+                row['removed'][category] = sorted(old_targets - new_targets)
+        row['properties'] = sorted(
+            key for key, value in node['properties'].items() if old['properties'].get(key) != value
+        )
+        row['status'] = 'changed' if row['added'] or row['removed'] or row['properties'] else 'unchanged'
+        rows.append(row)
+
+    removed = [{'kind': kind, 'name': name} for kind, name in current if (kind, name) not in staged]
+    summary = {'added': 0, 'changed': 0, 'unchanged': 0}
+    for row in rows:
+        summary[row['status']] += 1
+    summary['removed'] = len(removed)
+    return {'rows': rows, 'removed': removed, 'summary': summary}
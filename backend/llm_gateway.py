@@ -0,0 +1,204 @@
+"""
+大模型调用网关模块
+
+包装OpenAI兼容客户端，为每次调用提供：
+- 单次调用截止时间
+- 并发上限（信号量）
+- 带抖动的指数退避重试，可选对冲请求
+- 熔断器：上游持续故障时快速失败，由调用方走本地逻辑
+- 按调用类型统计的次数、错误与延迟
+"""
+
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, TimeoutError as FutureTimeoutError
+from openai import APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
+from backend.metrics import BACKEND_CALLS, BACKEND_CALL_SECONDS
+from backend.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# 可重试的上游错误：网络、超时、限流、5xx
+RETRYABLE_ERRORS = (APIConnectionError, APITimeoutError, RateLimitError, InternalServerError, FutureTimeoutError)
+
+# 延迟直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class LLMUnavailableError(Exception):
+    """大模型服务不可用（熔断、超时、并发已满或重试耗尽）"""
+    pass
+
+
+class CallMetrics:
+    """单个调用类型的统计数据"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.retries = 0
+        self.hedged = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds, error=False):
+        self.calls += 1
+        if error:
+            self.errors += 1
+        self.latency_sum += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rejected': self.rejected,
+            'retries': self.retries,
+            'hedged': self.hedged,
+            'latency_avg_ms': round(self.latency_sum / self.calls * 1000, 1) if self.calls else 0,
+            'latency_max_ms': round(self.latency_max * 1000, 1),
+            'latency_buckets': dict(zip(LATENCY_BUCKETS, self.buckets)),
+        }
+
+
+class LLMGateway:
+    """大模型调用网关"""
+
+    def __init__(self, client, timeout=30, max_concurrency=8, max_retries=2, backoff_base=0.5,
+                 backoff_max=4, breaker_threshold=5, breaker_cooldown=30, hedge_delay=0):
+        self.client = client
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_delay = hedge_delay
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown, name='大模型')
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency * 2, thread_name_prefix='llm-hedge')
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    def complete(self, call_type, deadline=None, hedge=False, **kwargs):
+        """
+        发起一次chat.completions调用
+
+        Args:
+            call_type (str): 调用类型，用于统计，如 intent、completion
+            deadline (float): 本次调用（含重试）的总时限（秒），默认使用网关超时
+            hedge (bool): 是否在 hedge_delay 后未返回时发起一个对冲请求，只用于幂等的短调用
+            **kwargs: 透传给 chat.completions.create 的参数
+
+        Returns:
+            上游返回的响应对象
+
+        Raises:
+            LLMUnavailableError: 熔断、并发已满、超时或重试耗尽
+        """
+        metrics = self._get_metrics(call_type)
+        start = time.monotonic()
+        deadline_at = start + (deadline or self.timeout)
+        # 先占并发槽位再问熔断器：本地排队超时只是并发已满，不能计入熔断，也不能占用半开状态的探测名额
+        if not self._semaphore.acquire(timeout=max(0, deadline_at - start)):
+            self._reject(metrics, call_type)
+            raise LLMUnavailableError("大模型并发请求已满")
+
+        try:
+            if not self.breaker.allow():
+                self._reject(metrics, call_type)
+                raise LLMUnavailableError("大模型服务熔断中")
+
+            attempt = 0
+            while True:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0 and attempt == 0:
+                    # 排队等槽位耗尽了时限，上游还未被调用，同样不计入熔断
+                    self._reject(metrics, call_type)
+                    self.breaker.release_probe()
+                    raise LLMUnavailableError("大模型并发请求已满")
+                try:
+                    if remaining <= 0:
+                        raise FutureTimeoutError()
+                    response = self._call(metrics, kwargs, remaining, hedge)
+                except RETRYABLE_ERRORS as e:
+                    attempt += 1
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                    if attempt > self.max_retries or time.monotonic() + delay >= deadline_at:
+                        self._finish(metrics, call_type, start, error=True)
+                        self.breaker.record_failure()
+                        raise LLMUnavailableError(f"大模型调用失败({call_type}): {type(e).__name__} {str(e)}") from e
+                    logger.warning("大模型调用失败(%s)，%.2f 秒后第 %s 次重试: %s", call_type, delay, attempt, e)
+                    with self._metrics_lock:
+                        metrics.retries += 1
+                    time.sleep(delay)
+                    continue
+                except Exception:
+                    # 请求本身有误（4xx等），说明上游可达，不计入熔断
+                    self._finish(metrics, call_type, start, error=True)
+                    self.breaker.record_success()
+                    raise
+
+                self._finish(metrics, call_type, start)
+                self.breaker.record_success()
+                return response
+        finally:
+            self._semaphore.release()
+
+    def in_flight(self):
+        """当前占用的并发槽位数"""
+        return self.max_concurrency - self._semaphore._value
+
+    def get_metrics(self):
+        """按调用类型返回统计数据"""
+        with self._metrics_lock:
+            return {
+                'breaker_state': self.breaker.state,
+                'calls': {call_type: m.to_dict() for call_type, m in self._metrics.items()}
+            }
+
+    def _call(self, metrics, kwargs, timeout, hedge):
+        client = self.client.with_options(timeout=timeout, max_retries=0)
+        if not hedge or not self.hedge_delay or timeout <= self.hedge_delay:
+            return client.chat.completions.create(**kwargs)
+
+        futures = [self._executor.submit(client.chat.completions.create, **kwargs)]
+        done, _ = wait(futures, timeout=self.hedge_delay)
+        if not done:
+            with self._metrics_lock:
+                metrics.hedged += 1
+            futures.append(self._executor.submit(client.chat.completions.create, **kwargs))
+
+        error = None
+        for future in as_completed(futures, timeout=timeout):
+            try:
+                return future.result()
+            except Exception as e:
+                error = e
+        raise error
+
+    def _reject(self, metrics, call_type):
+        with self._metrics_lock:
+            metrics.rejected += 1
+        BACKEND_CALLS.inc('llm', call_type, 'rejected')
+
+    def _get_metrics(self, call_type):
+        metrics = self._metrics.get(call_type)
+        if metrics is None:
+            with self._metrics_lock:
+                metrics = self._metrics.setdefault(call_type, CallMetrics())
+        return metrics
+
+    def _finish(self, metrics, call_type, start, error=False):
+        elapsed = time.monotonic() - start
+        with self._metrics_lock:
+            metrics.observe(elapsed, error=error)
+        BACKEND_CALLS.inc('llm', call_type, 'error' if error else 'success')
+        BACKEND_CALL_SECONDS.observe(elapsed, 'llm', call_type)
@@ -0,0 +1,117 @@
+"""
+日志处理模块
+
+把日志写盘移出请求线程，包括：
+- QueueFileHandler：请求线程只固化消息后把日志记录放入内存队列，由后台监听线程
+  格式化并写入按大小滚动的日志文件
+- SamplingFilter：同一条日志模板在时间窗口内超过突发上限后按比例采样，
+  WARNING 及以上级别不采样
+"""
+
+import copy
+import time
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class QueueFileHandler(QueueHandler):
+    """队列日志处理器
+
+    Args:
+        filename (str): 日志文件路径
+        maxBytes (int): 单个日志文件的最大字节数，超过后滚动
+        backupCount (int): 保留的历史日志文件数
+        encoding (str): 文件编码
+        queue_size (int): 队列容量，队列满时丢弃新记录而不是阻塞请求线程
+    """
+
+    def __init__(self, filename, maxBytes=10 * 1024 * 1024, backupCount=5, encoding='utf-8', queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.dropped = 0
+        self.targets = [RotatingFileHandler(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)]
+        self.listener = QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.stop)
+
+    def setFormatter(self, fmt):
+        """格式化在监听线程中由目标处理器完成"""
+        for target in self.targets:
+            target.setFormatter(fmt)
+
+    def prepare(self, record):
+        """在请求线程中固化消息和异常堆栈，格式化和写盘留给监听线程
+
+        参数可能是之后还会被修改的字典、列表，traceback对象离开except块后会失效，
+        都不能留到监听线程再处理。复制记录，不影响同一记录的其他处理器。
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """停止监听线程并写完队列中剩余的记录"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            for target in self.targets:
+                target.close()
+
+    def close(self):
+        self.stop()
+        super().close()
+
+
+class SamplingFilter(logging.Filter):
+    """按日志模板采样的过滤器
+
+    每条模板（record.msg，未拼接参数）在 window 秒内前 burst 条全部保留，之后每
+    rate 条保留一条。因此调用处必须使用 logger.info("...%s", value) 的惰性写法，
+    f-string 会让每条日志都成为不同的模板。
+
+    Args:
+        burst (int): 每个窗口内全部保留的条数
+        rate (int): 超过突发上限后的采样比例（每 rate 条保留 1 条）
+        window (float): 窗口长度（秒）
+        max_level (str): 只对该级别及以下的日志采样
+    """
+
+    def __init__(self, burst=20, rate=10, window=10.0, max_level='INFO'):
+        super().__init__()
+        self.burst = burst
+        self.rate = max(1, rate)
+        self.window = window
+        self.max_level = logging.getLevelName(max_level) if isinstance(max_level, str) else max_level
+        self._counts = {}
+        self._window_start = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        # 同一条记录经过多个处理器时只计数一次，各处理器的取舍保持一致
+        decision = getattr(record, '_sampled', None)
+        if decision is not None:
+            return decision
+        key = (record.name, record.msg)
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.window:
+                self._counts.clear()
+                self._window_start = now
+            count = self._counts.get(key, 0) + 1
+            self._counts[key] = count
+        record._sampled = count <= self.burst or (count - self.burst) % self.rate == 0
+        return record._sampled
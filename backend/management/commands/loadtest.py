@@ -0,0 +1,124 @@
+import sys
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from backend.perf.runner import SCENARIOS, LoadTestRunner, InProcessTransport, HTTPTransport, format_report
+from backend.perf.stand_ins import RoundTripCounter
+
+
+class Command(BaseCommand):
+    help = '并发压测聊天和知识图谱接口（默认使用本地假大模型及内存Redis/Neo4j）'
+
+    # 系统检查会提前加载URL配置，导致聊天模块在替换连接之前就创建了单例
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=10, help='并发工作线程数')
+        parser.add_argument('--rounds', type=int, default=5, help='每个工作线程执行的场景轮数')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"逗号分隔的场景，可选 {','.join(SCENARIOS)}")
+        parser.add_argument('--latency', type=float, default=0.3, help='假大模型首字延迟（秒）')
+        parser.add_argument('--token-rate', type=float, default=50, help='假大模型每秒吐出的token数')
+        parser.add_argument('--reply-tokens', type=int, default=120, help='假大模型普通回复的token数')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='假大模型返回503的概率')
+        parser.add_argument('--live', action='store_true', help='使用真实Redis和Neo4j（仍统计往返次数）')
+        parser.add_argument('--real-llm', action='store_true', help='使用配置的真实大模型而不是假服务')
+        parser.add_argument('--base-url', help='对已启动的服务做HTTP压测，例如 http://127.0.0.1:8000')
+        parser.add_argument('--token', help='HTTP压测使用的JWT access token')
+        parser.add_argument('--user-id', type=int, default=1, help='进程内压测使用的用户ID')
+        parser.add_argument('--seed', type=int, help='随机种子，便于复现')
+        parser.add_argument('--json', dest='json_path', help='把报告另存为JSON文件')
+
+    def handle(self, *args, **options):
+        scenarios = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"未知场景: {', '.join(sorted(unknown))}")
+
+        fake_llm = None
+        counter = None
+        if options['base_url']:
+            if not options['token']:
+                raise CommandError('HTTP压测需要通过 --token 提供JWT access token')
+            transport = HTTPTransport(options['base_url'], options['token'])
+            nodes = None
+        else:
+            counter = RoundTripCounter()
+            if not options['real_llm']:
+                from backend.perf.fake_llm import FakeLLMServer
+                fake_llm = FakeLLMServer(
+                    latency=options['latency'],
+                    token_rate=options['token_rate'],
+                    reply_tokens=options['reply_tokens'],
+                    error_rate=options['error_rate']
+                ).start()
+            nodes = self._install_stand_ins(counter, options['live'], fake_llm)
+            transport = InProcessTransport(self._issue_token(options['user_id']), counter)
+
+        try:
+            runner = LoadTestRunner(
+                transport,
+                concurrency=options['concurrency'],
+                requests_per_worker=options['rounds'],
+                scenarios=scenarios,
+                counter=counter,
+                nodes=nodes,
+                seed=options['seed']
+            )
+            report = runner.run()
+        finally:
+            if fake_llm is not None:
+                fake_llm.stop()
+
+        if fake_llm is not None:
+            report['llm'] = fake_llm.stats()
+        if counter is not None:
+            report['round_trips_total'] = dict(counter.totals)
+
+        self.stdout.write(format_report(report))
+        if fake_llm is not None:
+            self.stdout.write(f"假大模型: {report['llm']['requests']} 次请求，{report['llm']['errors']} 次注入错误")
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"报告已保存到 {options['json_path']}"))
+
+    def _install_stand_ins(self, counter, live, fake_llm):
+        """在聊天、知识图谱模块创建单例之前替换连接，返回可用于查询的节点名称"""
+        loaded = [name for name in ('chat.views', 'chat.services', 'knowledge.services') if name in sys.modules]
+        if loaded:
+            raise CommandError(f"模块已提前加载，无法替换连接: {', '.join(loaded)}")
+
+        from backend import connections
+        from backend.perf.stand_ins import InMemoryRedis, InMemoryGraphDriver, CountingRedis, CountingDriver
+
+        if live:
+            connections._redis_client = CountingRedis(connections.get_redis_client(), counter)
+            connections._redis_binary_client = CountingRedis(connections.get_redis_binary_client(), counter)
+            connections._neo4j_driver = CountingDriver(connections.get_neo4j_driver(), counter)
+            nodes = None
+        else:
+            connections._redis_client = InMemoryRedis(counter)
+            connections._redis_binary_client = connections._redis_client
+            driver = InMemoryGraphDriver(counter=counter)
+            connections._neo4j_driver = driver
+            nodes = [node['name'] for node in driver.graph.main_nodes()]
+            # Django缓存（知识图谱查询结果）改为进程内缓存
+            settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+        if fake_llm is not None:
+            settings.OPENAI_BASE_URL = fake_llm.url
+            settings.OPENAI_API_KEY = settings.OPENAI_API_KEY or 'loadtest'
+            connections._openai_client = None
+            connections._llm_gateway = None
+        return nodes
+
+    def _issue_token(self, user_id):
+        """签发access token并预先写入token缓存，压测期间不访问MySQL"""
+        from rest_framework_simplejwt.tokens import AccessToken
+        from users.authentication import CachedUser, TokenCache, token_cache
+
+        token = AccessToken()
+        token['user_id'] = user_id
+        raw_token = str(token)
+        token_cache.set(TokenCache.token_key(raw_token), CachedUser(id=user_id, account='loadtest'), token['exp'])
+        return raw_token
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from backend.perf.microbench import (
+    HISTORY_FILE, BenchmarkHistory, build_corpus, compare, default_benchmarks, format_rows
+)
+
+
+class Command(BaseCommand):
+    help = '运行关键词提取、症状汇总和诊断回复构建的微基准，并与历史结果比较'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filter', help='只运行名称包含该字符串的基准')
+        parser.add_argument('--seed', type=int, default=0, help='语料随机种子')
+        parser.add_argument('--corpus-size', type=int, default=50, help='每个长度档的合成消息条数')
+        parser.add_argument('--min-time', type=float, default=0.2, help='单轮最短耗时（秒）')
+        parser.add_argument('--repeat', type=int, default=5, help='重复轮数')
+        parser.add_argument('--history', default=str(HISTORY_FILE), help='历史记录JSON文件')
+        parser.add_argument('--baseline-runs', type=int, default=5, help='基线取最近几次运行的中位数')
+        parser.add_argument('--threshold', type=float, default=0.1, help='回退阈值（比例），默认10%%')
+        parser.add_argument('--no-save', action='store_true', help='不把本次结果写入历史记录')
+
+    def handle(self, *args, **options):
+        from backend.vocabulary import vocabulary
+
+        corpus = build_corpus(vocabulary, seed=options['seed'], per_bucket=options['corpus_size'])
+        benchmarks = default_benchmarks(corpus)
+        if options['filter']:
+            benchmarks = [b for b in benchmarks if options['filter'] in b.name]
+            if not benchmarks:
+                raise CommandError(f"没有名称包含 {options['filter']} 的基准")
+
+        results = {}
+        for benchmark in benchmarks:
+            self.stdout.write(f"运行 {benchmark.name} ...")
+            results[benchmark.name] = benchmark.measure(min_time=options['min_time'], repeat=options['repeat'])
+
+        history = BenchmarkHistory(options['history'])
+        rows, regressions = compare(results, history, options['threshold'], options['baseline_runs'])
+        self.stdout.write(format_rows(rows))
+
+        if not options['no_save']:
+            history.append(results)
+            history.save()
+            self.stdout.write(f"结果已追加到 {history.path}")
+
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(line))
+            raise CommandError(f"{len(regressions)} 项基准超出回退阈值 {options['threshold']:.0%}")
+        self.stdout.write(self.style.SUCCESS('微基准完成，未发现回退'))
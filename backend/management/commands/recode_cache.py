@@ -0,0 +1,83 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from backend.codec import codec, CacheSerializer
+from backend.connections import get_redis_binary_client
+
+# 直接存入Redis的会话数据（只会是JSON文本）
+RAW_PATTERNS = ('chat:history:*', 'chat:symptoms:*', 'chat:context:*')
+# 经Django缓存存入的数据（旧值为pickle）
+CACHE_PATTERNS = ('knowledge:graph:*', 'chat:session:*')
+
+
+class Command(BaseCommand):
+    help = '把Redis中仍为旧格式（JSON文本、pickle）的会话数据和图谱缓存转换为紧凑编码，保留原有过期时间'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='只统计需要转换的键和预计节省的空间')
+        parser.add_argument('--scan-count', type=int, default=500, help='每次SCAN的建议返回数量')
+
+    def handle(self, *args, **options):
+        client = get_redis_binary_client()
+        if client is None:
+            raise CommandError('Redis连接未初始化')
+
+        serializer = CacheSerializer()
+        targets = [(pattern, lambda value: codec.dumps(codec.loads(value))) for pattern in RAW_PATTERNS]
+        targets += [(str(cache.make_key(pattern)), lambda value: serializer.dumps(serializer.loads(value)))
+                    for pattern in CACHE_PATTERNS]
+
+        total = {'keys': 0, 'recoded': 0, 'failed': 0, 'before': 0, 'after': 0}
+        for pattern, recode in targets:
+            stats = self._recode(client, pattern, recode, options['dry_run'], options['scan_count'])
+            for name, value in stats.items():
+                total[name] += value
+            self.stdout.write(f"{pattern}: 共 {stats['keys']} 个键，转换 {stats['recoded']} 个，"
+                              f"失败 {stats['failed']} 个，{stats['before']} -> {stats['after']} 字节")
+
+        saved = total['before'] - total['after']
+        ratio = saved / total['before'] if total['before'] else 0
+        verb = '可转换' if options['dry_run'] else '已转换'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {total['recoded']} 个键，失败 {total['failed']} 个，节省 {saved} 字节（{ratio:.0%}）"
+        ))
+
+    def _recode(self, client, pattern, recode, dry_run, scan_count):
+        stats = {'keys': 0, 'recoded': 0, 'failed': 0, 'before': 0, 'after': 0}
+        for key in client.scan_iter(match=pattern, count=scan_count):
+            stats['keys'] += 1
+            value = client.get(key)
+            if value is None or codec.is_encoded(value):
+                continue
+            try:
+                encoded = recode(value)
+            except Exception as e:
+                stats['failed'] += 1
+                self.stderr.write(f"无法解码 {key!r}: {e}")
+                continue
+            if not dry_run and not self._replace(client, key, value, encoded):
+                # 转换期间被应用改写，新值已是紧凑编码
+                continue
+            stats['recoded'] += 1
+            stats['before'] += len(value)
+            stats['after'] += len(encoded)
+        return stats
+
+    def _replace(self, client, key, old, new):
+        """值未被改写时替换为新编码并保留剩余过期时间，返回是否替换"""
+        from redis.exceptions import WatchError
+
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                if pipe.get(key) != old:
+                    return False
+                ttl = pipe.pttl(key)
+                pipe.multi()
+                if ttl and ttl > 0:
+                    pipe.set(key, new, px=ttl)
+                else:
+                    pipe.set(key, new)
+                pipe.execute()
+                return True
+            except WatchError:
+                return False
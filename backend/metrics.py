@@ -0,0 +1,347 @@
+"""
+进程内指标模块
+
+以Prometheus文本格式导出运行指标，包括：
+- 计数器、仪表盘、直方图，以及抓取时才取值的回调仪表盘
+- track()：统计Redis、Neo4j、大模型等后端调用的次数、结果和耗时
+- InstrumentedRedis：包装Redis客户端，逐条命令计数计时
+- 全局指标注册表及 /metrics 视图
+
+不依赖 prometheus_client，每次观测只做一次加锁的计数累加。
+"""
+
+import hmac
+import time
+import bisect
+import logging
+import threading
+from contextlib import contextmanager
+from django.conf import settings
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+# 默认耗时分桶（秒），覆盖从毫秒级缓存命中到数十秒的大模型调用
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """计数器指标
+
+    Args:
+        name (str): 指标名称，按惯例以 _total 结尾
+        documentation (str): 指标说明
+        labelnames (tuple): 标签名
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            snapshot = dict(self._values)
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in sorted(snapshot.items())
+        ]
+
+
+class Gauge(Counter):
+    """仪表盘指标：可增可减的当前值"""
+
+    type = 'gauge'
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def set(self, value, *labelvalues):
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class CallbackGauge:
+    """抓取时才调用回调取值的仪表盘，适合连接池等已有状态
+
+    Args:
+        callback (callable): 无参函数，返回 {标签值元组: 数值}
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def collect(self):
+        try:
+            values = self.callback() or {}
+        except Exception as e:
+            logger.warning("采集指标 %s 失败: %s", self.name, e)
+            return []
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+            for labelvalues, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    """直方图指标
+
+    Args:
+        name (str): 指标名称
+        documentation (str): 指标说明
+        labelnames (tuple): 标签名
+        buckets (tuple): 分桶上界（秒），自动追加 +Inf
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        """记录一次观测值，labelvalues 按 labelnames 的顺序给出"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        """返回Prometheus文本格式的样本行"""
+        with self._lock:
+            snapshot = {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+        lines = []
+        for labelvalues, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, ('le', _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表：同名指标只创建一次"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def gauge_callback(self, name, documentation, labelnames, callback):
+        return self.register(CallbackGauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """导出全部指标的Prometheus文本"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+# 创建全局指标注册表实例
+registry = MetricsRegistry()
+
+# 聊天请求各阶段耗时
+CHAT_STAGE_SECONDS = registry.histogram(
+    'chat_stage_duration_seconds', '聊天请求各处理阶段耗时', ('stage',)
+)
+CHAT_REQUEST_SECONDS = registry.histogram(
+    'chat_request_duration_seconds', '聊天流式请求从进入视图到输出结束的总耗时', ('intent',)
+)
+
+# HTTP请求（流式响应按输出结束计时）
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'http_request_duration_seconds', 'HTTP请求耗时', ('method', 'endpoint', 'status')
+)
+SSE_ACTIVE_STREAMS = registry.gauge(
+    'sse_active_streams', '正在输出的SSE流数量', ('endpoint',)
+)
+
+# 后端调用：backend 取值 redis / neo4j / llm
+BACKEND_CALLS = registry.counter(
+    'backend_calls_total', '后端调用次数', ('backend', 'operation', 'outcome')
+)
+BACKEND_CALL_SECONDS = registry.histogram(
+    'backend_call_duration_seconds', '后端调用耗时', ('backend', 'operation'),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+# 缓存命中：result 取值 local_hit / hit / miss
+CACHE_REQUESTS = registry.counter(
+    'cache_requests_total', '缓存查询次数', ('cache', 'result')
+)
+
+
+@contextmanager
+def track(backend, operation):
+    """统计一次后端调用的结果和耗时，异常照常抛出"""
+    start = time.perf_counter()
+    outcome = 'success'
+    try:
+        yield
+    except Exception:
+        outcome = 'error'
+        raise
+    finally:
+        BACKEND_CALLS.inc(backend, operation, outcome)
+        BACKEND_CALL_SECONDS.observe(time.perf_counter() - start, backend, operation)
+
+
+def record_cache(cache, result):
+    """记录一次缓存查询结果"""
+    CACHE_REQUESTS.inc(cache, result)
+
+
+class InstrumentedRedis:
+    """包装Redis客户端，逐条命令统计次数和耗时，管道整体按一次 pipeline 调用统计"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def pipeline(self, *args, **kwargs):
+        return _InstrumentedPipeline(self._client.pipeline(*args, **kwargs))
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with track('redis', name):
+                return attr(*args, **kwargs)
+        return call
+
+
+class _InstrumentedPipeline:
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+
+    def execute(self, *args, **kwargs):
+        with track('redis', 'pipeline'):
+            return self._pipeline.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._pipeline, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._pipeline.__exit__(*exc)
+
+
+def _redis_pool_usage():
+    """Redis连接池的已创建、空闲和使用中连接数"""
+    from backend import connections
+    client = connections._redis_client
+    pool = getattr(client, 'connection_pool', None)
+    if pool is None or not hasattr(pool, '_available_connections'):
+        return {}
+    created = getattr(pool, '_created_connections', 0)
+    available = len(pool._available_connections)
+    return {
+        ('redis', 'created'): created,
+        ('redis', 'idle'): available,
+        ('redis', 'in_use'): created - available,
+        ('redis', 'max'): getattr(pool, 'max_connections', 0),
+    }
+
+
+def _llm_gateway_usage():
+    """大模型网关的并发占用和熔断状态"""
+    from backend import connections
+    gateway = connections._llm_gateway
+    if gateway is None:
+        return {}
+    return {
+        ('llm', 'in_use'): gateway.in_flight(),
+        ('llm', 'max'): gateway.max_concurrency,
+        ('llm', 'breaker_open'): 0 if gateway.breaker.state == gateway.breaker.CLOSED else 1,
+    }
+
+
+POOL_USAGE = registry.gauge_callback(
+    'backend_pool_connections', '后端连接池与并发槽位使用情况', ('backend', 'state'),
+    lambda: {**_redis_pool_usage(), **_llm_gateway_usage()}
+)
+
+
+def _metrics_allowed(request):
+    """来源IP在 METRICS_ALLOWED_IPS 中，且设置了 METRICS_TOKEN 时带有匹配的Bearer令牌"""
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ()):
+        return False
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return True
+    provided = request.META.get('HTTP_AUTHORIZATION', '')
+    return hmac.compare_digest(provided.encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    """Prometheus抓取接口，只对允许的来源开放"""
+    if not _metrics_allowed(request):
+        logger.warning("拒绝来自 %s 的指标抓取请求", request.META.get('REMOTE_ADDR'))
+        return HttpResponse(status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,54 @@
+"""
+中间件模块
+
+提供请求级别的指标采集：
+- 按接口统计请求耗时（流式响应在输出结束时计时）
+- 统计正在输出的SSE流数量
+"""
+
+import time
+import logging
+from backend.metrics import HTTP_REQUEST_SECONDS, SSE_ACTIVE_STREAMS
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsMiddleware:
+    """请求指标中间件"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        endpoint = self._endpoint(request)
+        labels = (request.method, endpoint, str(response.status_code))
+
+        if getattr(response, 'streaming', False):
+            is_sse = response.get('Content-Type', '').startswith('text/event-stream')
+            response.streaming_content = self._observe_stream(response.streaming_content, start, labels, is_sse)
+        else:
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, *labels)
+        return response
+
+    @staticmethod
+    def _endpoint(request):
+        """使用路由名称作为标签，避免路径参数造成标签爆炸"""
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unmatched'
+        return match.view_name or match.route or 'unnamed'
+
+    @staticmethod
+    def _observe_stream(content, start, labels, is_sse):
+        """包装流式内容：输出结束（含客户端断开）时计时并减少活跃流计数"""
+        endpoint = labels[1]
+        if is_sse:
+            SSE_ACTIVE_STREAMS.inc(endpoint)
+        try:
+            yield from content
+        finally:
+            if is_sse:
+                SSE_ACTIVE_STREAMS.dec(endpoint)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, *labels)
@@ -0,0 +1,8 @@
+"""
+性能测试工具包
+
+提供压测和基准测试用的本地替身与运行器，包括：
+- 兼容OpenAI接口的假大模型服务（可调延迟和吐字速度）
+- 内存版Redis和Neo4j替身，统计每个请求的往返次数
+- 并发压测运行器及报告
+"""
@@ -0,0 +1,176 @@
+"""
+假大模型服务
+
+在本地端口上提供兼容OpenAI的 /chat/completions 接口，用于压测时替代真实
+大模型，包括：
+- 可调的首字延迟、吐字速度和回复长度
+- 支持流式（SSE）和非流式响应
+- 按提示词区分意图识别、结构化分析和普通问答三类调用
+- 可按比例返回503，用于验证重试和熔断
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# 按消息内容粗略判断意图，使压测流量覆盖不同的处理分支
+INTENT_RULES = (
+    ('greeting', ('你好', '您好')),
+    ('thanks', ('谢谢', '感谢')),
+    ('farewell', ('再见', '拜拜')),
+    ('prevention', ('防治', '怎么治', '预防', '用什么药')),
+    ('knowledge', ('是什么', '为什么', '原因', '病原')),
+)
+
+REPLY_TEXT = "根据您描述的情况，建议结合田间症状进一步确认病害类型，并按照植保部门的建议及时用药防治。"
+
+
+def guess_intent(message):
+    for intent, words in INTENT_RULES:
+        if any(word in message for word in words):
+            return intent
+    return 'diagnosis'
+
+
+class FakeLLMServer:
+    """假大模型服务
+
+    Args:
+        host (str): 监听地址
+        port (int): 监听端口，0表示随机分配
+        latency (float): 首字延迟（秒）
+        token_rate (float): 每秒吐出的token数
+        reply_tokens (int): 普通问答回复的token数
+        error_rate (float): 返回503的概率
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.3, token_rate=50, reply_tokens=120, error_rate=0.0):
+        self.latency = latency
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-llm', daemon=True)
+        self._thread.start()
+        logger.info("假大模型服务已启动: %s", self.url)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {'requests': self.requests, 'errors': self.errors}
+
+    def reply_for(self, body):
+        """按请求内容生成回复文本，返回 (文本, token数)"""
+        messages = body.get('messages') or []
+        message = messages[-1].get('content', '') if messages else ''
+        intent = guess_intent(message)
+        if body.get('response_format'):
+            content = json.dumps({
+                'intent': intent, 'plant_part': [], 'weather': [], 'growth_stage': [], 'region': []
+            })
+            return content, len(content) // 4
+        max_tokens = body.get('max_tokens')
+        if max_tokens and max_tokens <= 20:
+            # 单独的意图识别调用只返回意图标识
+            return intent, 1
+        text = (REPLY_TEXT * (self.reply_tokens // len(REPLY_TEXT) + 1))[:self.reply_tokens]
+        return text, self.reply_tokens
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    body = {}
+                with server._lock:
+                    server.requests += 1
+                    failed = random.random() < server.error_rate
+                    if failed:
+                        server.errors += 1
+
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    return self._send_json(404, {'error': {'message': 'not found'}})
+
+                time.sleep(server.latency)
+                if failed:
+                    return self._send_json(503, {'error': {'message': 'fake upstream overloaded'}})
+
+                text, tokens = server.reply_for(body)
+                if body.get('stream'):
+                    return self._send_stream(body, text)
+                if server.token_rate:
+                    time.sleep(tokens / server.token_rate)
+                self._send_json(200, {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model') or 'fake',
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': text},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': tokens, 'total_tokens': tokens}
+                })
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, body, text):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                interval = 1 / server.token_rate if server.token_rate else 0
+                for ch in text:
+                    chunk = {
+                        'id': 'chatcmpl-fake',
+                        'object': 'chat.completion.chunk',
+                        'created': int(time.time()),
+                        'model': body.get('model') or 'fake',
+                        'choices': [{'index': 0, 'delta': {'content': ch}, 'finish_reason': None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    if interval:
+                        time.sleep(interval)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
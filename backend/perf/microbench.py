@@ -0,0 +1,296 @@
+"""
+纯Python热点路径的微基准
+
+每条消息都会经过的几个函数（关键词提取、症状汇总、诊断回复构建）在这里
+按 asv 的方式测量，包括：
+- 语料：从病虫害CSV中取真实描述文本，再按模板合成长短不一的农户提问
+- 吞吐：自动确定循环次数，多轮重复取中位数，得到每秒调用次数
+- 内存：用 tracemalloc 统计每次调用的峰值分配字节数
+- 历史：每次结果追加到JSON文件，与最近几次的中位数比较，超出阈值即判为回退
+"""
+
+import csv
+import json
+import time
+import random
+import timeit
+import logging
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+DISEASE_CSV = BASE_DIR / 'static' / 'File' / '小麦病害信息.csv'
+PEST_CSV = BASE_DIR / 'static' / 'File' / '小麦虫害信息.csv'
+HISTORY_FILE = BASE_DIR / '.benchmarks' / 'microbench.json'
+
+# 合成农户提问的模板，{…} 处填入词表中的关键词
+MESSAGE_TEMPLATES = (
+    '{region}的小麦{part}发黄',
+    '我家麦子{stage}{part}上有斑点，最近{weather}',
+    '{region}这边{weather}，{stage}的小麦{part}出现褐色病斑，叶尖干枯，是什么病',
+    '不是{part}的问题，是{part2}发黑，{stage}开始的，{weather}好几天了',
+    '老师您好，我在{region}种了二十亩小麦，现在是{stage}，前几天{weather}，'
+    '今天下地看到{part}上长了一层白色的霉，{part2}也有一些发黄，周围几块地也有类似情况，想问一下这是什么病，该用什么药',
+)
+
+# 填充语，用于把提问拉长到指定长度
+FILLERS = (
+    '地里浇过一次水，', '去年也出现过，', '邻居家的地也这样，', '用过一次杀菌剂，',
+    '施了两遍肥，', '品种是济麦22，', '播种比较晚，', '没有明显的虫子，',
+)
+
+# 按长度分档，每档生成若干条消息
+LENGTH_BUCKETS = {'short': 20, 'medium': 80, 'long': 300}
+
+
+def load_csv_texts():
+    """读取病虫害CSV中的描述文本和诊断结果所需字段"""
+    texts = []
+    diseases = []
+    for path, kind, name_field, description_field in (
+        (DISEASE_CSV, 'disease', '病害名称(别名)', '为害特征'),
+        (PEST_CSV, 'pest', '虫害名称(别名)', '为害特征'),
+    ):
+        if not path.exists():
+            logger.warning("CSV文件不存在，跳过: %s", path)
+            continue
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                texts.extend(v for k, v in row.items() if k and v and k != name_field)
+                diseases.append({
+                    'name': (row.get(name_field) or '').split('(')[0],
+                    'alias': '',
+                    'pathogen': row.get('病原') or '',
+                    'description': row.get(description_field) or '',
+                    'control_method': row.get('防治措施') or '',
+                    'kind': kind,
+                })
+    return texts, diseases
+
+
+def build_corpus(vocabulary, seed=0, per_bucket=50):
+    """构建基准语料
+
+    Args:
+        vocabulary: 词表注册中心
+        seed (int): 随机种子，保证同一代码版本的语料一致
+        per_bucket (int): 每个长度档生成的消息条数
+
+    Returns:
+        dict: messages（长度档 -> 消息列表）、csv_texts、diseases、symptoms
+    """
+    rng = random.Random(seed)
+    words = {
+        category: sorted(vocabulary.keywords(category))
+        for category in ('plant_part', 'weather', 'growth_stage', 'region')
+    }
+    csv_texts, diseases = load_csv_texts()
+
+    messages = {}
+    for bucket, length in LENGTH_BUCKETS.items():
+        bucket_messages = []
+        for _ in range(per_bucket):
+            template = rng.choice(MESSAGE_TEMPLATES)
+            text = template.format(
+                region=rng.choice(words['region']),
+                part=rng.choice(words['plant_part']),
+                part2=rng.choice(words['plant_part']),
+                stage=rng.choice(words['growth_stage']),
+                weather=rng.choice(words['weather']),
+            )
+            while len(text) < length:
+                text = rng.choice(FILLERS) + text
+            bucket_messages.append(text[-length:].lstrip('，') if bucket == 'short' else text)
+        messages[bucket] = bucket_messages
+
+    symptoms = []
+    for _ in range(per_bucket):
+        collected = {}
+        for category, options in words.items():
+            if rng.random() < 0.7:
+                picked = rng.sample(options, rng.randint(1, 2))
+                collected[category] = picked[0] if len(picked) == 1 else picked
+        symptoms.append(collected)
+
+    return {
+        'messages': messages,
+        'csv_texts': csv_texts,
+        'diseases': diseases,
+        'symptoms': symptoms,
+        'seed': seed,
+    }
+
+
+class Benchmark:
+    """单个基准：对一组输入逐个调用被测函数
+
+    Args:
+        name (str): 基准名称，作为历史记录的键
+        func (callable): 被测函数，接收一个输入
+        inputs (list): 输入列表，每轮依次调用一遍
+    """
+
+    def __init__(self, name, func, inputs):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+
+    def run_once(self):
+        func = self.func
+        for item in self.inputs:
+            func(item)
+
+    def measure(self, min_time=0.2, repeat=5):
+        """返回每秒调用次数（中位数）和每次调用的平均峰值分配字节数"""
+        timer = timeit.Timer(self.run_once)
+        # 与 asv 相同：先自动确定循环次数，使单轮耗时不少于 min_time
+        number, elapsed = timer.autorange()
+        if elapsed < min_time:
+            number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+        samples = timer.repeat(repeat=repeat, number=number)
+        calls = number * len(self.inputs)
+        per_call = [sample / calls for sample in samples]
+
+        tracemalloc.start()
+        try:
+            peaks = []
+            for item in self.inputs:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                self.func(item)
+                peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        finally:
+            tracemalloc.stop()
+
+        median = statistics.median(per_call)
+        return {
+            'ops_per_sec': round(1 / median, 1) if median else None,
+            'mean_us': round(median * 1e6, 3),
+            'stdev_us': round(statistics.pstdev(per_call) * 1e6, 3),
+            'peak_bytes': round(statistics.mean(peaks)) if peaks else 0,
+            'calls': calls * repeat,
+        }
+
+
+def default_benchmarks(corpus):
+    """被测函数：关键词提取、症状汇总和诊断回复构建"""
+    from chat.utils import keyword_manager
+    from chat.views import ChatAPI
+    from backend.graph_manager import GraphManager
+    from backend.vocabulary import vocabulary
+
+    # 只借用纯函数部分，不建立任何连接
+    chat_api = ChatAPI.__new__(ChatAPI)
+    graph_manager = GraphManager.__new__(GraphManager)
+    graph_manager.driver = None
+    graph_manager.vocabulary = vocabulary
+
+    benchmarks = []
+    for bucket, messages in corpus['messages'].items():
+        benchmarks.append(Benchmark(f'extract_symptoms[{bucket}]', keyword_manager.extract_symptoms, messages))
+    for category in ('plant_part', 'weather', 'growth_stage', 'region'):
+        benchmarks.append(Benchmark(
+            f'extract_keywords[{category}]',
+            lambda text, category=category: graph_manager.extract_keywords(text, category),
+            corpus['csv_texts']
+        ))
+    benchmarks.append(Benchmark('summarize_collected_symptoms', chat_api._summarize_collected_symptoms, corpus['symptoms']))
+
+    diseases = corpus['diseases']
+    rng = random.Random(corpus['seed'])
+    for label, count in (('none', 0), ('single', 1), ('multiple', 3)):
+        cases = [(rng.sample(diseases, min(count, len(diseases))), symptoms) for symptoms in corpus['symptoms']]
+        benchmarks.append(Benchmark(
+            f'build_diagnosis_response[{label}]',
+            lambda case: chat_api._build_diagnosis_response(*case),
+            cases
+        ))
+    return benchmarks
+
+
+class BenchmarkHistory:
+    """基准历史记录：JSON文件中按时间顺序保存每次运行的结果"""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = Path(path)
+        self.runs = []
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.runs = json.load(f)
+
+    def baseline(self, name, last=5):
+        """同一基准最近几次结果的中位数，没有历史时返回None"""
+        recent = [run['results'][name] for run in self.runs if name in run.get('results', {})][-last:]
+        if not recent:
+            return None
+        return {
+            key: statistics.median(r[key] for r in recent if r.get(key) is not None)
+            for key in ('ops_per_sec', 'peak_bytes')
+            if any(r.get(key) is not None for r in recent)
+        }
+
+    def append(self, results):
+        self.runs.append({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'machine': platform.node(),
+            'results': results,
+        })
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.runs, f, ensure_ascii=False, indent=2)
+
+
+def compare(results, history, threshold=0.1, last=5):
+    """与历史基线比较，返回 (对比行列表, 回退列表)
+
+    吞吐下降或峰值内存上升超过 threshold（比例）即判为回退。
+    """
+    rows = []
+    regressions = []
+    for name, result in results.items():
+        baseline = history.baseline(name, last)
+        row = dict(result, name=name, ops_change=None, mem_change=None)
+        if baseline:
+            if baseline.get('ops_per_sec') and result['ops_per_sec']:
+                row['ops_change'] = result['ops_per_sec'] / baseline['ops_per_sec'] - 1
+                if row['ops_change'] < -threshold:
+                    regressions.append(f"{name}: 吞吐下降 {-row['ops_change']:.1%}")
+            if baseline.get('peak_bytes') and result['peak_bytes']:
+                row['mem_change'] = result['peak_bytes'] / baseline['peak_bytes'] - 1
+                if row['mem_change'] > threshold:
+                    regressions.append(f"{name}: 峰值内存上升 {row['mem_change']:.1%}")
+        rows.append(row)
+    return rows, regressions
+
+
+def format_rows(rows):
+    """把对比结果格式化为文本表格"""
+    def change(value):
+        return '-' if value is None else f"{value:+.1%}"
+
+    lines = [f"{'基准':<36}{'ops/s':>12}{'变化':>9}{'μs/次':>10}{'峰值字节':>10}{'变化':>9}"]
+    for row in rows:
+        lines.append(
+            f"{row['name']:<36}{row['ops_per_sec']:>12}{change(row['ops_change']):>9}"
+            f"{row['mean_us']:>10}{row['peak_bytes']:>10}{change(row['mem_change']):>9}"
+        )
+    return '\n'.join(lines)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
@@ -0,0 +1,279 @@
+"""
+并发压测运行器
+
+按场景并发请求聊天和知识图谱接口，统计：
+- 每个接口的延迟分位数（p50/p95/p99）和错误数
+- 流式接口的首包时间（第一个SSE数据块到达的时间）
+- 每个工作线程每秒完成的流式会话数
+- 每个请求的Redis/Neo4j往返次数（仅进程内模式）
+
+支持两种传输方式：进程内（django.test.Client，可统计往返次数）和HTTP（对已
+启动的服务压测）。
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 覆盖诊断、知识问答、寒暄等不同处理分支的消息
+CHAT_MESSAGES = (
+    '小麦叶片上有黄色条纹状的孢子堆，最近一直下雨',
+    '河南拔节期小麦茎基部发褐，怎么回事',
+    '麦穗发白，扬花期遇到连阴雨',
+    '叶子上有很多小虫子，吸汁液，叶片发黄',
+    '小麦赤霉病用什么药防治',
+    '条锈病的病原是什么',
+    '你好',
+    '谢谢',
+)
+
+SCENARIOS = ('chat', 'session', 'knowledge')
+
+
+def percentile(values, pct):
+    """线性插值的百分位数，空列表返回None"""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+class InProcessTransport:
+    """进程内传输：直接经过Django的URL路由、中间件和视图"""
+
+    counts_round_trips = True
+
+    def __init__(self, token, counter=None):
+        from django.test import Client
+        self.token = token
+        self.counter = counter
+        self._local = threading.local()
+        self._client_class = Client
+
+    @property
+    def client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._client_class(HTTP_HOST='localhost')
+        return client
+
+    def request(self, method, path, params=None, body=None, stream=False):
+        """返回 (状态码, 响应体, 首包耗时)"""
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {self.token}'}
+        start = time.perf_counter()
+        if method == 'GET':
+            response = self.client.get(path, params or {}, **headers)
+        else:
+            response = self.client.post(path, json.dumps(body or {}), content_type='application/json', **headers)
+        ttfb = None
+        if getattr(response, 'streaming', False):
+            chunks = []
+            for chunk in response.streaming_content:
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+                chunks.append(chunk)
+            content = b''.join(chunks)
+        else:
+            content = response.content
+            ttfb = time.perf_counter() - start
+        return response.status_code, content, ttfb
+
+
+class HTTPTransport:
+    """HTTP传输：对已启动的服务压测，不统计往返次数"""
+
+    counts_round_trips = False
+
+    def __init__(self, base_url, token, timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.timeout = timeout
+
+    def request(self, method, path, params=None, body=None, stream=False):
+        url = f"{self.base_url}{path}"
+        if params:
+            url = f"{url}?{urllib.parse.urlencode(params)}"
+        data = json.dumps(body or {}).encode('utf-8') if method != 'GET' else None
+        req = urllib.request.Request(url, data=data, method=method, headers={
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json',
+        })
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                first = resp.read1(65536) if stream else resp.read()
+                ttfb = time.perf_counter() - start
+                rest = resp.read()
+                return resp.status, first + rest, ttfb
+        except urllib.error.HTTPError as e:
+            return e.code, e.read(), time.perf_counter() - start
+
+
+class LoadTestRunner:
+    """按场景并发执行请求并汇总结果
+
+    Args:
+        transport: InProcessTransport 或 HTTPTransport
+        concurrency (int): 并发工作线程数
+        requests_per_worker (int): 每个工作线程执行的场景轮数
+        scenarios (tuple): 要执行的场景，取值见 SCENARIOS
+        counter (RoundTripCounter): 往返计数器，仅进程内模式使用
+    """
+
+    def __init__(self, transport, concurrency=10, requests_per_worker=5, scenarios=SCENARIOS,
+                 counter=None, nodes=None, seed=None):
+        self.transport = transport
+        self.concurrency = concurrency
+        self.requests_per_worker = requests_per_worker
+        self.scenarios = tuple(scenarios)
+        self.counter = counter if transport.counts_round_trips else None
+        self.nodes = list(nodes or ['小麦条锈病'])
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._samples = defaultdict(list)
+        self._streams = 0
+
+    def run(self):
+        """执行压测，返回报告字典"""
+        logger.info("开始压测: 场景 %s，并发 %s，每线程 %s 轮", self.scenarios, self.concurrency, self.requests_per_worker)
+        seeds = [self.random.random() for _ in range(self.concurrency)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='loadtest') as pool:
+            list(pool.map(self._worker, seeds))
+        duration = time.perf_counter() - start
+        return self.report(duration)
+
+    def _worker(self, seed):
+        rng = random.Random(seed)
+        for i in range(self.requests_per_worker):
+            for scenario in self.scenarios:
+                try:
+                    getattr(self, f'_scenario_{scenario}')(rng, i)
+                except Exception as e:
+                    logger.error("压测场景 %s 执行失败: %s", scenario, e)
+                    self._record(scenario, 0, None, None, error=True)
+
+    # ==================== 场景 ====================
+
+    def _scenario_chat(self, rng, i):
+        session_id = f"loadtest-{threading.get_ident()}-{i}"
+        for message in rng.sample(CHAT_MESSAGES, 2):
+            ok = self._call('stream_chat', 'GET', '/api/chat/stream_chat/', params={
+                'token': self.transport.token, 'message': message, 'session_id': session_id
+            }, stream=True)
+            if ok:
+                with self._lock:
+                    self._streams += 1
+
+    def _scenario_session(self, rng, i):
+        body = self._call('create_session', 'POST', '/api/chat/create_session/', parse=True)
+        session_id = (body or {}).get('session_id') or f"loadtest-{threading.get_ident()}-{i}"
+        self._call('add_message', 'POST', '/api/chat/add_message/', body={
+            'session_id': session_id, 'role': 'user', 'content': rng.choice(CHAT_MESSAGES)
+        })
+        self._call('save_symptoms', 'POST', '/api/chat/save_symptoms/', body={
+            'session_id': session_id, 'symptoms': {'plant_part': ['叶片'], 'weather': ['多雨']}
+        })
+        self._call('get_symptoms', 'GET', '/api/chat/get_symptoms/', params={'session_id': session_id})
+        self._call('get_history', 'GET', '/api/chat/get_history/', params={'session_id': session_id})
+        self._call('get_session_list', 'GET', '/api/chat/get_session_list/', params={'page': 1, 'size': 10})
+
+    def _scenario_knowledge(self, rng, i):
+        node = rng.choice(self.nodes)
+        self._call('graph', 'GET', '/api/knowledge/graph/')
+        self._call('node_details', 'GET', '/api/knowledge/node_details/', params={'id': node})
+        self._call('related_nodes', 'GET', '/api/knowledge/related_nodes/', params={'id': node})
+        self._call('get_disease_subgraph', 'GET', '/api/knowledge/get_disease_subgraph/', params={'disease': node})
+
+    # ==================== 统计 ====================
+
+    def _call(self, name, method, path, params=None, body=None, stream=False, parse=False):
+        before = self.counter.thread_snapshot() if self.counter else None
+        start = time.perf_counter()
+        status, content, ttfb = self.transport.request(method, path, params=params, body=body, stream=stream)
+        elapsed = time.perf_counter() - start
+        trips = None
+        if self.counter:
+            trips = self.counter.thread_snapshot()
+            trips.subtract(before)
+        error = status >= 400 or (stream and b'Error:' in content)
+        self._record(name, elapsed, ttfb if stream else None, trips, error=error)
+        if parse and not error:
+            try:
+                return json.loads(content)
+            except ValueError:
+                return None
+        return not error
+
+    def _record(self, name, elapsed, ttfb, trips, error=False):
+        with self._lock:
+            self._samples[name].append((elapsed, ttfb, trips, error))
+
+    def report(self, duration):
+        endpoints = {}
+        total = 0
+        for name, samples in sorted(self._samples.items()):
+            latencies = [s[0] for s in samples if not s[3]]
+            ttfbs = [s[1] for s in samples if s[1] is not None and not s[3]]
+            trips = [s[2] for s in samples if s[2] is not None]
+            total += len(samples)
+            stats = {
+                'count': len(samples),
+                'errors': sum(1 for s in samples if s[3]),
+                'p50_ms': self._ms(percentile(latencies, 50)),
+                'p95_ms': self._ms(percentile(latencies, 95)),
+                'p99_ms': self._ms(percentile(latencies, 99)),
+            }
+            if ttfbs:
+                stats['ttfb_p50_ms'] = self._ms(percentile(ttfbs, 50))
+                stats['ttfb_p95_ms'] = self._ms(percentile(ttfbs, 95))
+            if trips:
+                stats['redis_per_request'] = round(sum(t['redis'] for t in trips) / len(trips), 2)
+                stats['neo4j_per_request'] = round(sum(t['neo4j'] for t in trips) / len(trips), 2)
+            endpoints[name] = stats
+        return {
+            'concurrency': self.concurrency,
+            'duration_s': round(duration, 3),
+            'requests': total,
+            'throughput_rps': round(total / duration, 2) if duration else None,
+            'streams': self._streams,
+            'streams_per_worker_per_s': round(self._streams / self.concurrency / duration, 3) if duration else None,
+            'endpoints': endpoints,
+        }
+
+    @staticmethod
+    def _ms(seconds):
+        return None if seconds is None else round(seconds * 1000, 1)
+
+
+def format_report(report):
+    """把报告格式化为便于阅读的文本表格"""
+    lines = [
+        f"并发 {report['concurrency']}，耗时 {report['duration_s']}s，请求 {report['requests']}，"
+        f"吞吐 {report['throughput_rps']} req/s",
+        f"流式会话 {report['streams']}，每线程 {report['streams_per_worker_per_s']} 个/秒",
+        '',
+        f"{'接口':<22}{'次数':>6}{'错误':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'首包p50':>10}{'首包p95':>10}"
+        f"{'Redis/次':>10}{'Neo4j/次':>10}",
+    ]
+    for name, s in report['endpoints'].items():
+        def cell(key, width):
+            value = s.get(key)
+            return f"{'-' if value is None else value:>{width}}"
+        lines.append(
+            f"{name:<22}{s['count']:>6}{s['errors']:>6}{cell('p50_ms', 9)}{cell('p95_ms', 9)}{cell('p99_ms', 9)}"
+            f"{cell('ttfb_p50_ms', 10)}{cell('ttfb_p95_ms', 10)}{cell('redis_per_request', 10)}{cell('neo4j_per_request', 10)}"
+        )
+    return '\n'.join(lines)
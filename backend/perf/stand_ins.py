@@ -0,0 +1,620 @@
+"""
+压测用的本地替身
+
+包括：
+- RoundTripCounter：按线程统计Redis/Neo4j往返次数，压测时可归到单个请求
+- InMemoryRedis：线程安全的内存版Redis（decode_responses=True 语义）
+- CountingRedis：包装真实Redis客户端，只计数不改变行为
+- InMemoryGraphDriver：由CSV构建的内存图谱，按查询特征回答本项目用到的Cypher
+- CountingDriver：包装真实Neo4j驱动，只计数不改变行为
+"""
+
+import re
+import time
+import fnmatch
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class RoundTripCounter:
+    """往返次数统计：全局累计 + 当前线程累计"""
+
+    def __init__(self):
+        self.totals = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def hit(self, backend, n=1):
+        with self._lock:
+            self.totals[backend] += n
+        counts = getattr(self._local, 'counts', None)
+        if counts is None:
+            counts = self._local.counts = Counter()
+        counts[backend] += n
+
+    def thread_snapshot(self):
+        """当前线程到目前为止的计数副本"""
+        return Counter(getattr(self._local, 'counts', None) or {})
+
+
+# ==================== Redis ====================
+
+class InMemoryRedis:
+    """内存版Redis，只实现本项目用到的命令；每次命令计一次往返，管道整体计一次"""
+
+    def __init__(self, counter=None):
+        self.counter = counter or RoundTripCounter()
+        self._data = {}
+        self._expires = {}
+        self._lock = threading.RLock()
+
+    # ---- 内部工具 ----
+    def _hit(self):
+        self.counter.hit('redis')
+
+    def _alive(self, key):
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+        return key in self._data
+
+    def _expire_in(self, key, seconds):
+        if seconds is None:
+            self._expires.pop(key, None)
+        else:
+            self._expires[key] = time.monotonic() + seconds
+
+    @staticmethod
+    def _str(value):
+        if isinstance(value, bytes):
+            return value.decode('utf-8')
+        return str(value)
+
+    def _container(self, key, factory):
+        if not self._alive(key):
+            self._data[key] = factory()
+        return self._data[key]
+
+    # ---- 通用 ----
+    def ping(self):
+        self._hit()
+        return True
+
+    def close(self):
+        pass
+
+    def pipeline(self, transaction=True):
+        return _InMemoryPipeline(self)
+
+    def delete(self, *names):
+        self._hit()
+        with self._lock:
+            deleted = 0
+            for name in names:
+                if self._alive(name):
+                    deleted += 1
+                self._data.pop(name, None)
+                self._expires.pop(name, None)
+            return deleted
+
+    def exists(self, *names):
+        self._hit()
+        with self._lock:
+            return sum(1 for name in names if self._alive(name))
+
+    def expire(self, name, time_seconds):
+        self._hit()
+        with self._lock:
+            if not self._alive(name):
+                return False
+            self._expire_in(name, int(time_seconds))
+            return True
+
+    def ttl(self, name):
+        self._hit()
+        with self._lock:
+            if not self._alive(name):
+                return -2
+            expires_at = self._expires.get(name)
+            return -1 if expires_at is None else max(0, int(expires_at - time.monotonic()))
+
+    def keys(self, pattern='*'):
+        self._hit()
+        with self._lock:
+            return [k for k in list(self._data) if self._alive(k) and fnmatch.fnmatchcase(k, pattern)]
+
+    def scan(self, cursor=0, match=None, count=None):
+        self._hit()
+        with self._lock:
+            keys = [k for k in list(self._data) if self._alive(k)]
+        if match:
+            keys = [k for k in keys if fnmatch.fnmatchcase(k, match)]
+        return 0, keys
+
+    def scan_iter(self, match=None, count=None):
+        return iter(self.scan(match=match)[1])
+
+    # ---- 字符串 ----
+    def get(self, name):
+        self._hit()
+        with self._lock:
+            return self._data.get(name) if self._alive(name) else None
+
+    def mget(self, keys, *args):
+        self._hit()
+        keys = list(keys) if isinstance(keys, (list, tuple)) else [keys]
+        keys.extend(args)
+        with self._lock:
+            return [self._data.get(k) if self._alive(k) else None for k in keys]
+
+    def set(self, name, value, ex=None, px=None, nx=False, xx=False, keepttl=False):
+        self._hit()
+        with self._lock:
+            exists = self._alive(name)
+            if (nx and exists) or (xx and not exists):
+                return None
+            # 二进制编码的值原样保存，与不解码响应的连接行为一致
+            self._data[name] = value if isinstance(value, bytes) else self._str(value)
+            if ex is not None:
+                self._expire_in(name, int(ex.total_seconds()) if hasattr(ex, 'total_seconds') else ex)
+            elif px is not None:
+                self._expire_in(name, px / 1000)
+            elif not keepttl:
+                self._expire_in(name, None)
+            return True
+
+    def setex(self, name, time_seconds, value):
+        return self.set(name, value, ex=time_seconds)
+
+    def incr(self, name, amount=1):
+        self._hit()
+        with self._lock:
+            value = int(self._data.get(name, 0) if self._alive(name) else 0) + amount
+            self._data[name] = str(value)
+            return value
+
+    incrby = incr
+
+    # ---- 集合 ----
+    def sadd(self, name, *values):
+        self._hit()
+        with self._lock:
+            members = self._container(name, set)
+            before = len(members)
+            members.update(self._str(v) for v in values)
+            return len(members) - before
+
+    def srem(self, name, *values):
+        self._hit()
+        with self._lock:
+            members = self._container(name, set)
+            before = len(members)
+            members.difference_update(self._str(v) for v in values)
+            return before - len(members)
+
+    def smembers(self, name):
+        self._hit()
+        with self._lock:
+            return set(self._data[name]) if self._alive(name) else set()
+
+    # ---- 哈希 ----
+    def hset(self, name, key=None, value=None, mapping=None):
+        self._hit()
+        with self._lock:
+            fields = self._container(name, dict)
+            items = dict(mapping or {})
+            if key is not None:
+                items[key] = value
+            added = sum(1 for k in items if k not in fields)
+            fields.update({k: self._str(v) for k, v in items.items()})
+            return added
+
+    def hget(self, name, key):
+        self._hit()
+        with self._lock:
+            return self._data[name].get(key) if self._alive(name) else None
+
+    def hgetall(self, name):
+        self._hit()
+        with self._lock:
+            return dict(self._data[name]) if self._alive(name) else {}
+
+    def hdel(self, name, *keys):
+        self._hit()
+        with self._lock:
+            fields = self._container(name, dict)
+            return sum(1 for k in keys if fields.pop(k, None) is not None)
+
+    # ---- 有序集合 ----
+    def zadd(self, name, mapping, nx=False, xx=False):
+        self._hit()
+        with self._lock:
+            scores = self._container(name, dict)
+            added = 0
+            for member, score in mapping.items():
+                member = self._str(member)
+                exists = member in scores
+                if (nx and exists) or (xx and not exists):
+                    continue
+                added += 0 if exists else 1
+                scores[member] = float(score)
+            return added
+
+    def zrem(self, name, *members):
+        self._hit()
+        with self._lock:
+            scores = self._container(name, dict)
+            return sum(1 for m in members if scores.pop(self._str(m), None) is not None)
+
+    def zcard(self, name):
+        self._hit()
+        with self._lock:
+            return len(self._data[name]) if self._alive(name) else 0
+
+    def zscore(self, name, value):
+        self._hit()
+        with self._lock:
+            return self._data[name].get(self._str(value)) if self._alive(name) else None
+
+    def zrange(self, name, start, end, desc=False, withscores=False):
+        self._hit()
+        with self._lock:
+            items = sorted(self._data[name].items(), key=lambda kv: (kv[1], kv[0]), reverse=desc) \
+                if self._alive(name) else []
+        end = len(items) if end == -1 else end + 1
+        items = items[start:end]
+        return items if withscores else [member for member, _ in items]
+
+    def zrevrange(self, name, start, end, withscores=False):
+        return self.zrange(name, start, end, desc=True, withscores=withscores)
+
+    # ---- 列表 ----
+    def rpush(self, name, *values):
+        self._hit()
+        with self._lock:
+            items = self._container(name, list)
+            items.extend(self._str(v) for v in values)
+            return len(items)
+
+    def lpush(self, name, *values):
+        self._hit()
+        with self._lock:
+            items = self._container(name, list)
+            for v in values:
+                items.insert(0, self._str(v))
+            return len(items)
+
+    def lrange(self, name, start, end):
+        self._hit()
+        with self._lock:
+            items = list(self._data[name]) if self._alive(name) else []
+        return items[start:] if end == -1 else items[start:end + 1]
+
+    def ltrim(self, name, start, end):
+        self._hit()
+        with self._lock:
+            if self._alive(name):
+                items = self._data[name]
+                self._data[name] = items[start:] if end == -1 else items[start:end + 1]
+            return True
+
+    def llen(self, name):
+        self._hit()
+        with self._lock:
+            return len(self._data[name]) if self._alive(name) else 0
+
+
+class _InMemoryPipeline:
+    """内存Redis的管道：命令排队，execute 时一次执行并只计一次往返"""
+
+    def __init__(self, redis_client):
+        self._redis = redis_client
+        self._calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._redis, name)
+
+        def queue(*args, **kwargs):
+            self._calls.append((method, args, kwargs))
+            return self
+        return queue
+
+    def execute(self):
+        calls, self._calls = self._calls, []
+        before = self._redis.counter.thread_snapshot()['redis']
+        with self._redis._lock:
+            results = [method(*args, **kwargs) for method, args, kwargs in calls]
+        # 管道内的命令已各自计数，这里回退为一次往返
+        executed = self._redis.counter.thread_snapshot()['redis'] - before
+        if executed > 1:
+            self._redis.counter.hit('redis', 1 - executed)
+        return results
+
+    def reset(self):
+        self._calls = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+
+class CountingRedis:
+    """包装真实Redis客户端，每次命令计一次往返，管道整体计一次"""
+
+    def __init__(self, client, counter):
+        self._client = client
+        self._counter = counter
+
+    def pipeline(self, *args, **kwargs):
+        return _CountingPipeline(self._client.pipeline(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._counter.hit('redis')
+            return attr(*args, **kwargs)
+        return call
+
+
+class _CountingPipeline:
+    def __init__(self, pipeline, counter):
+        self._pipeline = pipeline
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter.hit('redis')
+        return self._pipeline.execute(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._pipeline, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return self._pipeline.__exit__(*exc)
+
+
+# ==================== Neo4j ====================
+
+class FakeNode(dict):
+    """带标签的节点，行为与neo4j.graph.Node的只读部分一致"""
+
+    def __init__(self, label, properties):
+        super().__init__(properties)
+        self.labels = frozenset([label])
+
+
+class FakeRelationship:
+    def __init__(self, rel_type):
+        self.type = rel_type
+
+
+class FakeRecord(dict):
+    def data(self):
+        return dict(self)
+
+    def value(self, key=0):
+        return list(self.values())[key] if isinstance(key, int) else self[key]
+
+
+class FakeResult:
+    def __init__(self, records):
+        self._records = [FakeRecord(r) for r in records]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def single(self):
+        return self._records[0] if self._records else None
+
+    def data(self):
+        return [r.data() for r in self._records]
+
+    def consume(self):
+        return None
+
+
+class InMemoryGraph:
+    """从病虫害CSV构建的内存图谱，结构与 GraphManager.init_graph 写入的一致"""
+
+    def __init__(self):
+        from backend.graph_manager import GraphManager, GraphConfig
+        from backend.vocabulary import vocabulary
+
+        # 只借用提取逻辑，不建立任何连接
+        manager = GraphManager.__new__(GraphManager)
+        manager.driver = None
+        manager.vocabulary = vocabulary
+        diseases, _ = manager._load_records(
+            GraphConfig.DISEASE_CSV, manager._validate_csv_data, manager._extract_disease_row)
+        pests, _ = manager._load_records(
+            GraphConfig.PEST_CSV, manager._validate_pest_data, manager._extract_pest_row, required=False)
+
+        self.nodes = {}
+        self.edges = []
+        self.links = {}
+        for kind, records in (('disease', diseases), ('pest', pests)):
+            for record in records:
+                props = dict(record['properties'], type=kind, color=GraphConfig.NODE_COLORS[kind])
+                self.nodes[props['name']] = FakeNode(GraphConfig.NODE_LABELS[kind], props)
+                self.links[props['name']] = {c: set(v) for c, v in record['links'].items()}
+                for category, targets in record['links'].items():
+                    for target in targets:
+                        if target not in self.nodes:
+                            self.nodes[target] = FakeNode(GraphConfig.NODE_LABELS[category], {
+                                'name': target, 'type': category, 'color': GraphConfig.NODE_COLORS[category]
+                            })
+                        self.edges.append((props['name'], GraphConfig.RELATIONSHIPS[category], target))
+        logger.info("内存图谱构建完成: %s 个节点，%s 条关系", len(self.nodes), len(self.edges))
+
+    def main_nodes(self):
+        return [n for n in self.nodes.values() if n.labels & {'Disease', 'Pest'}]
+
+
+class InMemoryGraphDriver:
+    """内存图谱驱动：按查询特征回答本项目用到的Cypher，每次run计一次往返"""
+
+    def __init__(self, graph=None, counter=None):
+        self.graph = graph or InMemoryGraph()
+        self.counter = counter or RoundTripCounter()
+
+    def session(self, **kwargs):
+        return _FakeSession(self)
+
+    def verify_connectivity(self):
+        return None
+
+    def close(self):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, driver):
+        self._driver = driver
+        self._graph = driver.graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        pass
+
+    def run(self, query, parameters=None, **kwargs):
+        self._driver.counter.hit('neo4j')
+        params = dict(parameters or {}, **kwargs)
+        return FakeResult(self._dispatch(query, params))
+
+    def _dispatch(self, query, params):
+        graph = self._graph
+        if 'AS score' in query:
+            return self._score(params)
+        if 'count(n)' in query:
+            return [{'count': len(graph.nodes)}]
+        if 'RETURN d, r, n' in query:
+            return self._subgraph(params.get('disease_name'), None)
+        if 'RETURN n, r, d' in query:
+            label = re.search(r'MATCH \(n:(\w+)', query)
+            return self._subgraph(params.get('node_name'), label.group(1) if label else None, reverse=True)
+        if 'collect(distinct' in query:
+            node = graph.nodes.get(params.get('name'))
+            if node is None:
+                return []
+            relations = [{'rel': r, 'target': t} for s, r, t in graph.edges if s == node['name']]
+            return [{'n': node, 'relations': relations or [{'rel': None, 'target': None}]}]
+        if 'RETURN m, type(r)' in query:
+            name, rel_type = params.get('name'), params.get('relation_type')
+            return [{'m': graph.nodes[t], 'relation_type': r} for s, r, t in graph.edges
+                    if s == name and (rel_type is None or r == rel_type)]
+        if 'labels(n)[0]' in query:
+            return self._full_graph()
+        if '$name' in query:
+            node = graph.nodes.get(params.get('name'))
+            return [self._details(node)] if node is not None and node.labels & {'Disease', 'Pest'} else []
+        if 'd.alias' in query:
+            return [self._details(node) for node in graph.main_nodes()]
+        return []
+
+    @staticmethod
+    def _details(node):
+        return {
+            'name': node['name'],
+            'alias': node.get('alias'),
+            'pathogen': node.get('pathogen'),
+            'symptoms': node.get('symptoms') or node.get('damage'),
+            'treatment': node.get('treatment'),
+        }
+
+    def _score(self, params):
+        categories = [c for c in ('plant_part', 'weather', 'growth_stage', 'region') if params.get(c)]
+        scored = []
+        for node in self._graph.main_nodes():
+            links = self._graph.links.get(node['name'], {})
+            score = sum(1 for c in categories if links.get(c, set()) & set(params[c]))
+            if score:
+                scored.append((score, node))
+        if not scored:
+            return []
+        best = max(score for score, _ in scored)
+        rows = []
+        for score, node in scored:
+            if score == best:
+                kind = 'pest' if 'Pest' in node.labels else 'disease'
+                rows.append(dict(self._details(node), kind=kind, matched_symptoms=score))
+        rows.sort(key=lambda r: (r['kind'], r['name']))
+        return rows[:3]
+
+    def _subgraph(self, name, label, reverse=False):
+        rows = []
+        for s, r, t in self._graph.edges:
+            if not reverse and s == name:
+                rows.append({'d': self._graph.nodes[s], 'r': FakeRelationship(r), 'n': self._graph.nodes[t]})
+            elif reverse and t == name and (label is None or label in self._graph.nodes[t].labels):
+                rows.append({'n': self._graph.nodes[t], 'r': FakeRelationship(r), 'd': self._graph.nodes[s]})
+        return rows
+
+    def _full_graph(self):
+        rows = []
+        outgoing = {}
+        for s, r, t in self._graph.edges:
+            outgoing.setdefault(s, []).append((r, t))
+        for name, node in self._graph.nodes.items():
+            base = {
+                'name': name,
+                'label': next(iter(node.labels)),
+                'color': node.get('color'),
+                'alias': node.get('alias'),
+                'pathogen': node.get('pathogen'),
+                'symptoms': node.get('symptoms') or node.get('damage'),
+                'treatment': node.get('treatment'),
+                'host': node.get('host'),
+                'natural_enemies': node.get('natural_enemies'),
+            }
+            for r, t in outgoing.get(name) or [(None, None)]:
+                rows.append(dict(base, relationship=r, target=t))
+        return rows
+
+
+class CountingDriver:
+    """包装真实Neo4j驱动，每次run计一次往返"""
+
+    def __init__(self, driver, counter):
+        self._driver = driver
+        self._counter = counter
+
+    def session(self, **kwargs):
+        return _CountingSession(self._driver.session(**kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+class _CountingSession:
+    def __init__(self, session, counter):
+        self._session = session
+        self._counter = counter
+
+    def run(self, *args, **kwargs):
+        self._counter.hit('neo4j')
+        return self._session.run(*args, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._session.close()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
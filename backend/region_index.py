@@ -0,0 +1,222 @@
+"""
+地区层级索引模块
+
+把省份、农业分区、大区和“全国各地”组织成包含关系，启动时预先算好每个地区
+的全部上级，查询时只需一次字典查找，包括：
+- 从《中国九大农业分区》文档读取分区及其提到的省份
+- 内置省份 -> 大区 / 农业分区对照表
+- 从发病地区名词表收集地区简称（如“黄淮海”“长江流域”）
+"""
+
+import re
+import csv
+import logging
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+ZONE_DOC = BASE_DIR / 'static' / 'text' / '中国九大农业分区.md'
+REGION_TERMS_CSV = BASE_DIR / 'static' / 'File' / '发病地区名词.csv'
+
+# 顶层地区
+NATIONWIDE = '全国各地'
+
+# 省份 -> (所属大区, 所属农业分区, 其他上级)
+PROVINCES = {
+    '黑龙江': ('东北', ('东北平原区',), ('北方',)),
+    '吉林': ('东北', ('东北平原区',), ('北方',)),
+    '辽宁': ('东北', ('东北平原区',), ('北方',)),
+    '内蒙古': ('华北', ('北方干旱半干旱区',), ('北方',)),
+    '北京': ('华北', ('黄淮海平原区',), ('北方',)),
+    '天津': ('华北', ('黄淮海平原区',), ('北方',)),
+    '河北': ('华北', ('黄淮海平原区',), ('北方',)),
+    '山西': ('华北', ('黄土高原区',), ('北方',)),
+    '山东': ('华东', ('黄淮海平原区',), ('北方', '东部')),
+    '河南': ('华中', ('黄淮海平原区',), ('北方',)),
+    '江苏': ('华东', ('黄淮海平原区', '长江中下游区'), ('东部',)),
+    '安徽': ('华东', ('黄淮海平原区', '长江中下游区'), ('东部',)),
+    '上海': ('华东', ('长江中下游区',), ('南方', '东部')),
+    '浙江': ('华东', ('长江中下游区',), ('南方', '东部')),
+    '江西': ('华东', ('长江中下游区',), ('南方',)),
+    '福建': ('华东', ('华南区',), ('南方', '东部')),
+    '台湾': ('华东', (), ('南方', '东部')),
+    '湖北': ('华中', ('长江中下游区',), ('南方',)),
+    '湖南': ('华中', ('长江中下游区',), ('南方',)),
+    '广东': ('华南', ('华南区',), ('南方', '东部')),
+    '广西': ('华南', ('华南区',), ('南方',)),
+    '海南': ('华南', ('华南区',), ('南方',)),
+    '重庆': ('西南', ('四川盆地区',), ('南方', '西部')),
+    '四川': ('西南', ('四川盆地区',), ('南方', '西部')),
+    '贵州': ('西南', ('云贵高原区',), ('南方', '西部')),
+    '云南': ('西南', ('云贵高原区', '华南区'), ('南方', '西部')),
+    '西藏': ('西南', ('青藏高原区',), ('西部',)),
+    '陕西': ('西北', ('黄土高原区',), ('北方', '西部')),
+    '甘肃': ('西北', ('黄土高原区', '北方干旱半干旱区'), ('北方', '西部')),
+    '宁夏': ('西北', ('黄土高原区', '北方干旱半干旱区'), ('北方', '西部')),
+    '青海': ('西北', ('青藏高原区',), ('西部',)),
+    '新疆': ('西北', ('北方干旱半干旱区',), ('北方', '西部')),
+}
+
+# 农业分区 -> 上级地区
+ZONES = {
+    '东北平原区': ('东北', '北方'),
+    '北方干旱半干旱区': ('北方', '西部'),
+    '黄淮海平原区': ('华北', '北方'),
+    '黄土高原区': ('西北', '北方'),
+    '长江中下游区': ('华中', '华东', '南方'),
+    '四川盆地区': ('西南', '南方'),
+    '云贵高原区': ('西南', '南方'),
+    '华南区': ('华南', '南方'),
+    '青藏高原区': ('西部',),
+}
+
+# 大区 -> 上级地区
+MACRO_REGIONS = {
+    '东北': ('北方',),
+    '华北': ('北方',),
+    '西北': ('北方', '西部'),
+    '华东': ('东部',),
+    '华南': ('南方',),
+    '华中': (),
+    '西南': ('南方', '西部'),
+    '北方': (),
+    '南方': (),
+    '东部': (),
+    '西部': (),
+}
+
+# 文档中的分区写法、省份简写 -> 标准名称
+BUILTIN_ALIASES = {
+    '四川盆地及周边地区': '四川盆地区',
+    '长江中下游地区': '长江中下游区',
+    '龙江': '黑龙江',
+    '全国': NATIONWIDE,
+    '我国': NATIONWIDE,
+    '长江流域': '长江中下游区',
+    '淮北': '黄淮海平原区',
+    '成都': '四川',
+}
+
+
+class RegionIndex:
+    """地区包含关系索引
+
+    ancestors(name) 返回该地区自身及全部上级地区，结果在构建时一次算好；
+    简称和别名在查找前先映射为标准名称。农业分区可能跨多个大区（长江中下游区
+    同属华中、华东和南方），省份只包含所属分区本身，不经由分区继承其他大区。
+    """
+
+    def __init__(self, zone_doc=ZONE_DOC, terms_csv=REGION_TERMS_CSV):
+        self.parents = {}
+        self.zones = set(ZONES)
+        self.aliases = dict(BUILTIN_ALIASES)
+        self._ancestors = {}
+        self._build(zone_doc, terms_csv)
+
+    def canonical(self, name):
+        """把地区写法映射为标准名称，未知地区原样返回"""
+        name = (name or '').strip()
+        return self.aliases.get(name, name)
+
+    def ancestors(self, name):
+        """返回地区自身及全部上级地区（frozenset）"""
+        name = self.canonical(name)
+        return self._ancestors.get(name) or frozenset([name])
+
+    def expand(self, names):
+        """把一组地区展开为其自身及全部上级地区的并集，保持输入顺序在前"""
+        if isinstance(names, str):
+            names = [names]
+        expanded = []
+        seen = set()
+        for name in names or []:
+            for region in [self.canonical(name)] + sorted(self.ancestors(name)):
+                if region and region not in seen:
+                    seen.add(region)
+                    expanded.append(region)
+        return expanded
+
+    def _build(self, zone_doc, terms_csv):
+        for province, (macro, zones, extras) in PROVINCES.items():
+            self._add_parents(province, (macro,) + zones + extras)
+        for zone, parents in ZONES.items():
+            self._add_parents(zone, parents)
+        for macro, parents in MACRO_REGIONS.items():
+            self._add_parents(macro, parents + (NATIONWIDE,))
+
+        self._load_zone_doc(zone_doc)
+        self._load_terms(terms_csv)
+
+        for name in self.parents:
+            if name in PROVINCES:
+                self._ancestors[name] = frozenset(self._collect_province(name))
+            else:
+                self._ancestors[name] = frozenset(self._collect(name, set()))
+        self._ancestors[NATIONWIDE] = frozenset([NATIONWIDE])
+        logger.info("地区层级索引构建完成: %s 个地区，%s 个别名", len(self._ancestors), len(self.aliases))
+
+    def _add_parents(self, name, parents):
+        self.parents.setdefault(name, set()).update(p for p in parents if p and p != name)
+
+    def _collect_province(self, province):
+        """省份的上级：所属分区只取分区本身，其余上级（大区、南北方等）照常向上收集"""
+        seen = {province, NATIONWIDE}
+        for parent in self.parents.get(province, ()):
+            if parent in self.zones:
+                seen.add(parent)
+            else:
+                self._collect(parent, seen)
+        return seen
+
+    def _collect(self, name, seen):
+        """深度优先收集全部上级，seen 防止配置成环"""
+        if name in seen:
+            return seen
+        seen.add(name)
+        for parent in self.parents.get(name, ()):
+            self._collect(parent, seen)
+        return seen
+
+    def _load_zone_doc(self, path):
+        """读取农业分区文档：分区标题形如“1.东北平原区（...）：”，正文中提到的省份归入该分区"""
+        if not path.exists():
+            logger.warning("农业分区文档不存在，只使用内置分区: %s", path)
+            return
+
+        heading = re.compile(r'^\d+\.\s*([^（(：:]+)')
+        zone = None
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                match = heading.match(line)
+                if match:
+                    zone = self.canonical(match.group(1).strip())
+                    self.zones.add(zone)
+                    self.parents.setdefault(zone, set()).add(NATIONWIDE)
+                    continue
+                if zone and line:
+                    for name in list(PROVINCES) + [a for a, c in BUILTIN_ALIASES.items() if c in PROVINCES]:
+                        if name in line:
+                            self._add_parents(self.canonical(name), (zone,))
+
+    def _load_terms(self, path):
+        """从发病地区名词表收集简称：词是某个标准地区名称的唯一前缀时视为其别名"""
+        if not path.exists():
+            return
+
+        names = list(self.parents)
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                for term in (row.get('发病地区') or '').split(','):
+                    term = term.strip()
+                    if len(term) < 2 or term in self.parents or term in self.aliases:
+                        continue
+                    candidates = [name for name in names if name.startswith(term)]
+                    if len(candidates) == 1:
+                        self.aliases[term] = candidates[0]
+
+
+# 创建全局地区索引实例
+region_index = RegionIndex()
@@ -0,0 +1,147 @@
+"""
+服务注册中心模块
+
+各后端连接和服务单例统一在这里登记，首次使用时才创建，包括：
+- register()：登记一个后端的获取函数，以及预热时使用的连通性探测
+- lazy()：返回首次访问时才创建的服务单例（SimpleLazyObject）
+- warm_up()：并行预热已登记的后端，超时不等待，输出各后端耗时
+- report()：返回各后端首次创建与探测的耗时和状态
+
+导入模块、执行 migrate 等管理命令时不会连接任何后端，某个后端不可用也不会拖慢启动。
+"""
+
+import time
+import logging
+import threading
+from django.utils.functional import SimpleLazyObject
+
+logger = logging.getLogger(__name__)
+
+
+class _Service:
+    def __init__(self, name, factory, probe=None, cache=True, warm=True):
+        self.name = name
+        self.factory = factory
+        self.probe = probe
+        self.cache = cache
+        self.warm = warm
+        self.instance = None
+        self.created = False
+        self.seconds = None
+        self.status = 'pending'
+        self.error = None
+        self.lock = threading.Lock()
+
+
+class ServiceRegistry:
+    """延迟创建的服务注册中心"""
+
+    def __init__(self):
+        self._services = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, probe=None, cache=True, warm=True):
+        """登记服务
+
+        Args:
+            name (str): 服务名称
+            factory (callable): 无参函数，返回服务实例，失败时返回 None 或抛出异常
+            probe (callable): 预热时对实例做的连通性探测（如 ping），可选
+            cache (bool): 是否由注册中心缓存实例；获取函数自身已缓存时传 False，
+                这样替换 backend.connections 中的全局连接（如压测）仍然生效
+            warm (bool): 是否参与 warm_up()
+        """
+        with self._lock:
+            if name not in self._services:
+                self._services[name] = _Service(name, factory, probe, cache, warm)
+            return self._services[name]
+
+    def get(self, name):
+        """获取服务实例，首次调用时创建并记录耗时"""
+        service = self._services[name]
+        if service.created:
+            return service.instance if service.cache else service.factory()
+        with service.lock:
+            if service.created:
+                return service.instance if service.cache else service.factory()
+            start = time.perf_counter()
+            try:
+                instance = service.factory()
+            except Exception as e:
+                service.status, service.error = 'error', str(e)
+                logger.error("服务 %s 创建失败: %s", name, e)
+                raise
+            if instance is None:
+                # 获取函数已记录失败原因，下次调用时重试
+                service.status = 'unavailable'
+                return None
+            service.seconds = time.perf_counter() - start
+            service.status, service.error = 'ready', None
+            if service.cache:
+                service.instance = instance
+            service.created = True
+            logger.info("服务 %s 已创建，耗时 %.1fms", name, service.seconds * 1000)
+            return instance
+
+    def lazy(self, name, factory, **kwargs):
+        """登记服务并返回首次访问时才创建的代理对象"""
+        self.register(name, factory, **kwargs)
+        return SimpleLazyObject(lambda: self.get(name))
+
+    def _warm(self, service):
+        start = time.perf_counter()
+        try:
+            instance = self.get(service.name)
+            if instance is None:
+                return
+            if service.probe is not None:
+                service.probe(instance)
+            service.status = 'ready'
+        except Exception as e:
+            service.status, service.error = 'error', str(e)
+        finally:
+            service.seconds = time.perf_counter() - start
+
+    def warm_up(self, names=None, timeout=5.0):
+        """并行预热服务
+
+        每个服务在独立的守护线程中创建并探测，最多等待 timeout 秒；超时的服务
+        继续在后台完成，不阻塞启动。
+
+        Returns:
+            dict: {服务名称: {'status': ..., 'ms': ..., 'error': ...}}
+        """
+        services = [s for s in self._services.values() if (s.name in names if names else s.warm)]
+        start = time.perf_counter()
+        threads = []
+        for service in services:
+            thread = threading.Thread(target=self._warm, args=(service,), name=f"warm-up-{service.name}", daemon=True)
+            thread.start()
+            threads.append((service, thread))
+
+        deadline = start + timeout
+        for service, thread in threads:
+            thread.join(max(0.0, deadline - time.perf_counter()))
+            if thread.is_alive():
+                service.status = 'timeout'
+
+        result = self.report([s.name for s in services])
+        logger.info("后端预热完成，总耗时 %.1fms: %s", (time.perf_counter() - start) * 1000,
+                    ', '.join(f"{name}={item['status']}({item['ms']}ms)" for name, item in result.items()))
+        return result
+
+    def report(self, names=None):
+        """各服务的状态与首次创建耗时（毫秒）"""
+        return {
+            service.name: {
+                'status': service.status,
+                'ms': None if service.seconds is None else round(service.seconds * 1000, 1),
+                'error': service.error,
+            }
+            for service in self._services.values()
+            if names is None or service.name in names
+        }
+
+
+# 创建全局服务注册中心实例
+services = ServiceRegistry()
@@ -20,6 +20,38 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
 OPENAI_MODEL = os.getenv('OPENAI_MODEL')
 OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')
 
+# 大模型调用网关：默认/意图识别调用时限（秒）、并发上限、重试次数与退避基数（秒）、
+# 熔断阈值（连续失败次数）与冷却时间（秒）、对冲请求延迟（秒，0表示不对冲）
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', 30))
+LLM_INTENT_TIMEOUT = float(os.getenv('LLM_INTENT_TIMEOUT', 5))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 2))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', 0.5))
+LLM_BREAKER_THRESHOLD = int(os.getenv('LLM_BREAKER_THRESHOLD', 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv('LLM_BREAKER_COOLDOWN', 30))
+LLM_HEDGE_DELAY = float(os.getenv('LLM_HEDGE_DELAY', 1.5))
+
+# 是否用一次结构化输出调用同时完成意图识别与症状抽取
+CHAT_STRUCTURED_ANALYSIS = os.getenv('CHAT_STRUCTURED_ANALYSIS', 'True') == 'True'
+
+# 是否记录聊天请求各阶段耗时（Server-Timing 响应头、timing 事件及 /metrics 直方图）
+REQUEST_TIMING_ENABLED = os.getenv('REQUEST_TIMING_ENABLED', 'True') == 'True'
+
+# /metrics 抓取接口：允许访问的来源IP（逗号分隔），以及可选的抓取令牌（设置后须带 Authorization: Bearer <令牌>）
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# 启动时是否并行预热Neo4j、Redis、MySQL和大模型网关（默认首次使用时才连接），以及预热最长等待秒数
+BACKEND_WARMUP = os.getenv('BACKEND_WARMUP', 'False') == 'True'
+BACKEND_WARMUP_TIMEOUT = float(os.getenv('BACKEND_WARMUP_TIMEOUT', 5))
+
+# 就绪检查：单个依赖探测超时秒数、结果缓存秒数，以及不可用时摘除实例的关键依赖
+HEALTH_PROBE_TIMEOUT = float(os.getenv('HEALTH_PROBE_TIMEOUT', 2))
+HEALTH_CACHE_TTL = float(os.getenv('HEALTH_CACHE_TTL', 5))
+HEALTH_CRITICAL_DEPENDENCIES = tuple(
+    name.strip() for name in os.getenv('HEALTH_CRITICAL_DEPENDENCIES', 'neo4j,redis,mysql').split(',') if name.strip()
+)
+
 
 
 # 已安装的Django应用
@@ -45,6 +77,7 @@ AUTH_USER_MODEL = 'users.User'
 # 中间件配置
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # CORS中间件（必须放在最前面）
+    'backend.middleware.MetricsMiddleware',  # 请求耗时与SSE流指标
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -179,10 +212,35 @@ KNOWLEDGE_API_PERMISSION_CLASSES = [
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
 
+# 对话上下文窗口：最近轮次的token预算、早期轮次摘要的token上限及摘要缓存时间（秒）
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', 1500))
+CHAT_CONTEXT_SUMMARY_TOKENS = int(os.getenv('CHAT_CONTEXT_SUMMARY_TOKENS', 300))
+CHAT_CONTEXT_CACHE_TTL = int(os.getenv('CHAT_CONTEXT_CACHE_TTL', 7 * 24 * 3600))
+
+# 会话保留：会话无活动多少秒后过期（每次活动重新计时）、每个登录用户最多保留的会话数（0表示不限），
+# 整理任务（compact_sessions）把多少秒未活动的会话归档后删除及归档目录（含用户对话记录，
+# 需放在代码目录之外，未设置时整理任务要求指定 --archive-dir 或 --no-archive）
+CHAT_SESSION_TTL = int(os.getenv('CHAT_SESSION_TTL', 30 * 24 * 3600))
+CHAT_SESSION_MAX_PER_USER = int(os.getenv('CHAT_SESSION_MAX_PER_USER', 50))
+CHAT_SESSION_ARCHIVE_AFTER = int(os.getenv('CHAT_SESSION_ARCHIVE_AFTER', 14 * 24 * 3600))
+CHAT_SESSION_ARCHIVE_DIR = os.getenv('CHAT_SESSION_ARCHIVE_DIR', '')
+
+# 知识类问答回答缓存：Redis层过期时间（秒）、进程内LRU容量及进程内条目寿命（秒）
+CHAT_RESPONSE_CACHE_TTL = int(os.getenv('CHAT_RESPONSE_CACHE_TTL', 24 * 3600))
+CHAT_RESPONSE_CACHE_LOCAL_SIZE = int(os.getenv('CHAT_RESPONSE_CACHE_LOCAL_SIZE', 512))
+CHAT_RESPONSE_CACHE_LOCAL_TTL = int(os.getenv('CHAT_RESPONSE_CACHE_LOCAL_TTL', 300))
+
 # 允许的主机
 ALLOWED_HOSTS = ['localhost', '127.0.0.1']
 
-# 日志配置
+# 日志配置：文件日志经内存队列由后台线程写入按大小滚动的文件，请求线程不做磁盘IO；
+# 同一模板的INFO及以下日志在窗口内超过突发上限后按比例采样
+CHAT_LOG_LEVEL = os.getenv('CHAT_LOG_LEVEL', 'INFO')
+LOG_FILE_MAX_BYTES = int(os.getenv('LOG_FILE_MAX_BYTES', 10 * 1024 * 1024))
+LOG_FILE_BACKUP_COUNT = int(os.getenv('LOG_FILE_BACKUP_COUNT', 5))
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', 20))
+LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', 10))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -196,17 +254,28 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'sampling': {
+            '()': 'backend.log_handlers.SamplingFilter',
+            'burst': LOG_SAMPLE_BURST,
+            'rate': LOG_SAMPLE_RATE,
+        },
+    },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'backend.log_handlers.QueueFileHandler',
             'filename': os.path.join(BASE_DIR, 'backend', 'debug.log'),
+            'maxBytes': LOG_FILE_MAX_BYTES,
+            'backupCount': LOG_FILE_BACKUP_COUNT,
             'formatter': 'verbose',
+            'filters': ['sampling'],
             'encoding': 'utf-8',
         },
         'console': {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
+            'filters': ['sampling'],
         },
     },
     'root': {  # 只配置 root logger
@@ -220,7 +289,7 @@ LOGGING = {
             'propagate': True,
         },
         'chat': {
-            'level': 'DEBUG',
+            'level': CHAT_LOG_LEVEL,
             'propagate': True,
         },
     },
@@ -247,6 +316,8 @@ CACHES = {
         'LOCATION': f'redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}',
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # JSON原生类型的值用紧凑编码，其余仍用pickle，旧的pickle值仍可读取（见 backend/codec.py）
+            'SERIALIZER': 'backend.codec.CacheSerializer',
             'PASSWORD': REDIS_PASSWORD,
             'SOCKET_CONNECT_TIMEOUT': 5,
             'SOCKET_TIMEOUT': 5,
@@ -262,6 +333,12 @@ CACHES = {
     }
 }
 
+# 缓存编码：序列化方式 auto/orjson/msgpack/json，压缩方式 auto/zstd/lz4/zlib/none，
+# 序列化结果达到多少字节才压缩；auto 时按顺序选第一个已安装的实现
+CACHE_SERIALIZER = os.getenv('CACHE_SERIALIZER', 'auto')
+CACHE_COMPRESSION = os.getenv('CACHE_COMPRESSION', 'auto')
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', 1024))
+
 # URL配置
 ROOT_URLCONF = 'backend.urls'  # 指定主 URL 配置文件的位置
 
@@ -277,10 +354,34 @@ SIMPLE_JWT = {
     'USER_ID_CLAIM': 'user_id',
 }
 
+# JWT认证缓存：进程内LRU容量及条目最长寿命（秒），Redis层寿命等于token剩余有效期
+JWT_CACHE_LOCAL_SIZE = int(os.getenv('JWT_CACHE_LOCAL_SIZE', 1024))
+JWT_CACHE_LOCAL_TTL = int(os.getenv('JWT_CACHE_LOCAL_TTL', 60))
+
 # Neo4j配置
 NEO4J_URI = os.getenv('NEO4J_URI')
 NEO4J_USER = os.getenv('NEO4J_USER')
 NEO4J_PASSWORD = os.getenv('NEO4J_PASSWORD')
+# 建立连接的超时秒数，Neo4j不可达时尽快失败并改用本地快照
+NEO4J_CONNECTION_TIMEOUT = float(os.getenv('NEO4J_CONNECTION_TIMEOUT', 5))
+
+# 图谱本地快照：Neo4j不可用时用于诊断和图谱查询；连接失败后多少秒内直接读快照
+GRAPH_SNAPSHOT_PATH = os.getenv('GRAPH_SNAPSHOT_PATH', os.path.join(BASE_DIR, 'backend', 'graph_snapshot.sqlite3'))
+GRAPH_RETRY_INTERVAL = float(os.getenv('GRAPH_RETRY_INTERVAL', 30))
+
+# 图谱存储后端：neo4j（默认，不可用时读本地快照）或 embedded（只用本地快照，不需要Neo4j）
+GRAPH_STORE_BACKEND = os.getenv('GRAPH_STORE_BACKEND', 'neo4j')
+
+# 图谱导入流水线：关键词提取进程数（0表示使用全部CPU核心，1表示不启用进程池）、每个任务的行数及暂存文件
+# （为空时每次导入在系统临时目录中新建，写入成功后删除）
+GRAPH_INGEST_WORKERS = int(os.getenv('GRAPH_INGEST_WORKERS', 0))
+GRAPH_INGEST_CHUNK_SIZE = int(os.getenv('GRAPH_INGEST_CHUNK_SIZE', 200))
+GRAPH_INGEST_STAGING_PATH = os.getenv('GRAPH_INGEST_STAGING_PATH', '')
+
+# 图谱迁移（migrate_to_neo4j）：每批节点或关系数、并行写入线程数及检查点文件
+GRAPH_MIGRATION_BATCH_SIZE = int(os.getenv('GRAPH_MIGRATION_BATCH_SIZE', 1000))
+GRAPH_MIGRATION_WORKERS = int(os.getenv('GRAPH_MIGRATION_WORKERS', 4))
+GRAPH_MIGRATION_CHECKPOINT_PATH = os.getenv('GRAPH_MIGRATION_CHECKPOINT_PATH', os.path.join(BASE_DIR, 'backend', 'graph_migration.json'))
 
 # 添加默认主键类型设置
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,951 @@
+import datetime
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from openai import APIConnectionError
+
+from backend.circuit_breaker import CircuitBreaker
+from backend.codec import CacheSerializer, Codec
+from backend.graph_migration import GraphMigration, MigrationError, SnapshotSource
+from backend import graph_snapshot as snapshot_module
+from backend.graph_snapshot import GraphSnapshot, GraphUnavailableError, query_graph, write_snapshot
+from backend.graph_store import EmbeddedGraphStore
+from backend.graph_manager import GraphManager
+from backend.growth_stages import growth_stage_index
+from backend.ingestion import IngestionPipeline, iter_rows, read_staged, resolve_source
+from backend.health import HealthChecker, healthz_view
+from backend.log_handlers import QueueFileHandler, SamplingFilter
+from backend.llm_gateway import LLMGateway, LLMUnavailableError
+from backend.metrics import CHAT_REQUEST_SECONDS, MetricsRegistry, metrics_view
+from backend.perf.fake_llm import FakeLLMServer
+from backend.perf.microbench import LENGTH_BUCKETS, Benchmark, BenchmarkHistory, build_corpus, compare
+from backend.perf.runner import HTTPTransport, LoadTestRunner, percentile
+from backend.region_index import region_index
+from backend.registry import ServiceRegistry
+from backend.timing import NULL_TIMER, RequestTimer, new_timer
+from backend.vocabulary import MAPPING_FILE, TERM_FILES, VocabularyRegistry, vocabulary
+
+
+class NegationScopeTests(SimpleTestCase):
+    """关键词提取的否定范围"""
+
+    def extract(self, text):
+        return {
+            category: vocabulary.extract(text, category)
+            for category in ('plant_part', 'weather', 'growth_stage')
+        }
+
+    def test_negator_inside_common_words_is_ignored(self):
+        self.assertEqual(self.extract('不少叶片发黄')['plant_part'], ['叶片'])
+        self.assertEqual(self.extract('出现不规则病斑在叶片上')['plant_part'], ['叶片'])
+        self.assertEqual(self.extract('籽粒未成熟')['growth_stage'], ['成熟期'])
+
+    def test_prefix_negator_only_negates_adjacent_keyword(self):
+        self.assertEqual(self.extract('无雨干旱')['weather'], ['干旱'])
+        self.assertEqual(self.extract('不能抽穗')['growth_stage'], ['抽穗期'])
+        result = self.extract('最近不下雨很干旱叶片卷曲')
+        self.assertEqual(result['weather'], ['干旱'])
+        self.assertEqual(result['plant_part'], ['叶片'])
+
+    def test_negation_applies_to_next_keyword_only(self):
+        self.assertEqual(self.extract('没有下雨')['weather'], [])
+        self.assertEqual(self.extract('不是叶片，是根部')['plant_part'], ['根系'])
+        self.assertEqual(self.extract('不是叶片而是茎秆')['plant_part'], ['茎秆'])
+        self.assertEqual(self.extract('没有发现叶片发黄，高温')['weather'], ['高温'])
+        result = self.extract('不下雨叶片发黄')
+        self.assertEqual(result['weather'], [])
+        self.assertEqual(result['plant_part'], ['叶片'])
+
+    def test_negation_is_consumed_by_keyword_of_any_category(self):
+        result = self.extract('没有下雨叶片发黄')
+        self.assertEqual(result['weather'], [])
+        self.assertEqual(result['plant_part'], ['叶片'])
+        self.assertEqual(self.extract('不是高温天气叶片枯黄')['plant_part'], ['叶片'])
+
+    def test_ordinary_words_do_not_end_negation(self):
+        self.assertEqual(self.extract('没有总是下雨')['weather'], [])
+
+
+class VocabularyRegistryTests(SimpleTestCase):
+    """词表注册中心：内置词表、名词表补充的写法和映射表，文件变化后重新加载"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.term_dir = tmp.name
+        self.registry = VocabularyRegistry(term_dir=self.term_dir, check_interval=0)
+        self.writes = 0
+
+    def write(self, name, text):
+        path = os.path.join(self.term_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        # 同一秒内多次写入时也要让修改时间不同
+        self.writes += 1
+        os.utime(path, (1700000000 + self.writes,) * 2)
+
+    def test_builtin_synonyms_normalize_to_standard_keywords(self):
+        self.assertEqual(self.registry.extract('老叶和根部发黑', 'plant_part'), ['叶片', '根系'])
+        self.assertEqual(self.registry.extract('先高温后低温', 'weather'), ['高温'])
+        self.assertEqual(self.registry.extract('苗期到拔节期都有', 'growth_stage'), ['苗期'])
+
+    def test_term_file_variants_are_added(self):
+        self.write(TERM_FILES['weather'], '聚类标签,气象\n0,"降雨量,不降雨,土壤"\n')
+        self.assertIn('降雨量', self.registry.mapping('weather'))
+        self.assertNotIn('不降雨', self.registry.mapping('weather'))
+        self.assertNotIn('土壤', self.registry.mapping('weather'))
+        self.assertEqual(self.registry.extract('近期降雨量大', 'weather'), ['降雨'])
+
+    def test_mapping_file_change_is_reloaded(self):
+        self.assertEqual(self.registry.extract('麦苗发红', 'plant_part'), [])
+        self.write(MAPPING_FILE, '类别,名词,标准词\n发病部位,麦苗,幼苗|叶片\n')
+        self.assertEqual(self.registry.extract('麦苗发红', 'plant_part'), ['幼苗', '叶片'])
+        self.write(MAPPING_FILE, '类别,名词,标准词\n')
+        self.assertEqual(self.registry.extract('麦苗发红', 'plant_part'), [])
+
+
+class RegionIndexTests(SimpleTestCase):
+    """地区层级：省份不经由跨大区的农业分区继承其他大区"""
+
+    def test_province_in_shared_zone_keeps_its_own_macro_region(self):
+        hubei = region_index.ancestors('湖北')
+        self.assertTrue({'华中', '长江中下游区', '南方', '全国各地'} <= hubei)
+        self.assertFalse({'华东', '东部'} & hubei)
+
+    def test_province_in_two_zones_does_not_inherit_both_halves(self):
+        jiangsu = region_index.ancestors('江苏')
+        self.assertTrue({'华东', '黄淮海平原区', '长江中下游区', '东部'} <= jiangsu)
+        self.assertFalse({'北方', '南方'} & jiangsu)
+
+    def test_zone_parents_are_not_passed_to_provinces(self):
+        henan = region_index.ancestors('河南')
+        self.assertTrue({'华中', '黄淮海平原区', '北方'} <= henan)
+        self.assertNotIn('华北', henan)
+
+    def test_zone_and_alias_still_expand(self):
+        self.assertTrue({'华中', '华东', '南方'} <= region_index.ancestors('长江中下游区'))
+        self.assertEqual(region_index.expand(['成都'])[0], '四川')
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """指标注册表：Prometheus文本格式导出"""
+
+    def test_render_counters_and_cumulative_histograms(self):
+        registry = MetricsRegistry()
+        calls = registry.counter('backend_calls_total', '后端调用次数', ('backend', 'result'))
+        seconds = registry.histogram('backend_call_seconds', '后端调用耗时', ('backend',), buckets=(0.1, 1))
+        calls.inc('redis', 'success')
+        calls.inc('redis', 'success', amount=2)
+        seconds.observe(0.05, 'redis')
+        seconds.observe(0.5, 'redis')
+        self.assertIs(registry.counter('backend_calls_total', '后端调用次数', ('backend', 'result')), calls)
+
+        text = registry.render()
+        self.assertIn('# TYPE backend_calls_total counter', text)
+        self.assertIn('backend_calls_total{backend="redis",result="success"} 3', text)
+        self.assertIn('backend_call_seconds_bucket{backend="redis",le="0.1"} 1', text)
+        self.assertIn('backend_call_seconds_bucket{backend="redis",le="+Inf"} 2', text)
+        self.assertIn('backend_call_seconds_count{backend="redis"} 2', text)
+
+    def test_failing_callback_gauge_is_skipped(self):
+        registry = MetricsRegistry()
+        registry.gauge_callback('pool_connections', '连接池', ('state',), lambda: 1 / 0)
+        registry.gauge_callback('queue_size', '队列长度', ('queue',), lambda: {('log',): 4})
+        text = registry.render()
+        self.assertIn('queue_size{queue="log"} 4', text)
+        self.assertNotIn('pool_connections{', text)
+
+
+@override_settings(METRICS_ALLOWED_IPS=['10.0.0.5'], METRICS_TOKEN='')
+class MetricsAccessTests(SimpleTestCase):
+    """/metrics 只对允许的来源开放"""
+
+    def scrape(self, addr, **headers):
+        return metrics_view(RequestFactory().get('/metrics', REMOTE_ADDR=addr, **headers))
+
+    def test_allowed_ip_can_scrape(self):
+        self.assertEqual(self.scrape('10.0.0.5').status_code, 200)
+
+    def test_other_ip_is_rejected(self):
+        self.assertEqual(self.scrape('203.0.113.7').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token_is_required_when_configured(self):
+        self.assertEqual(self.scrape('10.0.0.5').status_code, 403)
+        self.assertEqual(self.scrape('10.0.0.5', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.scrape('10.0.0.5', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+
+class GrowthStageIndexTests(SimpleTestCase):
+    """生育期区间：宽泛说法与其覆盖的具体生育期互相匹配"""
+
+    def test_range_overlaps_its_stages_only(self):
+        self.assertTrue(growth_stage_index.overlaps('苗期', '分蘖期'))
+        self.assertTrue(growth_stage_index.overlaps('生育后期', '灌浆期'))
+        self.assertFalse(growth_stage_index.overlaps('苗期', '拔节期'))
+        self.assertFalse(growth_stage_index.overlaps('幼苗期', '越冬期'))
+
+    def test_ranges_overlap_each_other(self):
+        self.assertTrue(growth_stage_index.overlaps('抽穗扬花期', '生育后期'))
+        self.assertFalse(growth_stage_index.overlaps('冬前', '成株期'))
+        self.assertIn('全生育期', growth_stage_index.overlapping('收获期'))
+
+    def test_expand_keeps_input_first_and_sorts_by_start(self):
+        expanded = growth_stage_index.expand('开花期')
+        self.assertEqual(expanded[0], '开花期')
+        self.assertTrue({'扬花期', '抽穗扬花期', '生育后期', '成株期', '全生育期'} <= set(expanded))
+        self.assertNotIn('灌浆期', expanded)
+        self.assertEqual(growth_stage_index.earliest(['灌浆期', '苗期', '拔节期']), '苗期')
+
+    def test_unknown_stage_only_matches_itself(self):
+        self.assertEqual(growth_stage_index.mask('未知期'), 0)
+        self.assertTrue(growth_stage_index.overlaps('未知期', '未知期'))
+        self.assertFalse(growth_stage_index.overlaps('未知期', '全生育期'))
+        self.assertEqual(growth_stage_index.expand(['未知期']), ['未知期'])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """熔断器：连续失败后打开，冷却后只放行一个探测请求"""
+
+    def test_opens_after_threshold_and_probes_after_cooldown(self):
+        breaker = CircuitBreaker(failure_threshold=2, cooldown=0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+        breaker.cooldown = 60
+        self.assertFalse(breaker.allow())
+
+        breaker.cooldown = 0
+        breaker._opened_at -= 1
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        breaker.record_success()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, cooldown=60)
+        breaker.record_failure()
+        breaker._opened_at -= 60
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.release_probe()
+        self.assertTrue(breaker.allow())
+
+
+class LLMGatewayTests(SimpleTestCase):
+    """大模型网关：只有上游故障计入熔断"""
+
+    def gateway(self, create, **kwargs):
+        client = mock.Mock()
+        client.with_options.return_value.chat.completions.create.side_effect = create
+        options = dict(max_concurrency=1, max_retries=1, backoff_base=0, breaker_threshold=1, breaker_cooldown=60)
+        options.update(kwargs)
+        return LLMGateway(client, **options)
+
+    def test_saturation_does_not_trip_breaker(self):
+        gateway = self.gateway(lambda **kwargs: 'ok')
+        gateway._semaphore.acquire()
+        with self.assertRaisesMessage(LLMUnavailableError, '并发请求已满'):
+            gateway.complete('intent', deadline=0.01)
+        self.assertEqual(gateway.breaker.state, gateway.breaker.CLOSED)
+        self.assertEqual(gateway.get_metrics()['calls']['intent']['rejected'], 1)
+
+        gateway._semaphore.release()
+        self.assertEqual(gateway.complete('intent'), 'ok')
+
+    def test_saturation_does_not_consume_half_open_probe(self):
+        gateway = self.gateway(lambda **kwargs: 'ok')
+        gateway.breaker.record_failure()
+        gateway.breaker._opened_at -= 60
+        gateway._semaphore.acquire()
+        with self.assertRaises(LLMUnavailableError):
+            gateway.complete('intent', deadline=0.01)
+        gateway._semaphore.release()
+        self.assertEqual(gateway.complete('intent'), 'ok')
+        self.assertEqual(gateway.breaker.state, gateway.breaker.CLOSED)
+
+    def test_upstream_errors_are_retried_then_trip_breaker(self):
+        create = mock.Mock(side_effect=APIConnectionError(request=mock.Mock()))
+        gateway = self.gateway(create)
+        with self.assertRaises(LLMUnavailableError):
+            gateway.complete('completion')
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(gateway.breaker.state, gateway.breaker.OPEN)
+        with self.assertRaisesMessage(LLMUnavailableError, '熔断'):
+            gateway.complete('completion')
+        self.assertEqual(create.call_count, 2)
+
+    def test_bad_request_is_not_counted_as_failure(self):
+        gateway = self.gateway(mock.Mock(side_effect=ValueError('bad request')))
+        with self.assertRaises(ValueError):
+            gateway.complete('completion')
+        self.assertEqual(gateway.breaker.state, gateway.breaker.CLOSED)
+
+
+class CodecTests(SimpleTestCase):
+    """缓存编码：新旧格式都能原样读回"""
+
+    payload = {'name': '小麦条锈病', 'regions': ['河南', '山东'], 'match_ratio': 0.75, 'kind': None, 'pest': False}
+
+    def test_round_trip_with_and_without_compression(self):
+        for compression in ('none', 'zlib'):
+            codec = Codec(serializer='json', compression=compression, compress_min_bytes=0)
+            data = codec.dumps(self.payload)
+            self.assertTrue(codec.is_encoded(data))
+            self.assertEqual(codec.loads(data), self.payload)
+
+    def test_compression_is_skipped_below_threshold(self):
+        codec = Codec(serializer='json', compression='zlib', compress_min_bytes=1 << 20)
+        self.assertEqual(codec.dumps(self.payload)[2:3], b'n')
+
+    def test_legacy_json_text_is_still_readable(self):
+        codec = Codec(serializer='json', compression='none')
+        legacy = '{"name": "小麦条锈病"}'
+        self.assertEqual(codec.loads(legacy), {'name': '小麦条锈病'})
+        self.assertEqual(codec.loads(legacy.encode('utf-8')), {'name': '小麦条锈病'})
+        self.assertFalse(codec.is_encoded(legacy.encode('utf-8')))
+
+    def test_pickle_is_only_read_when_allowed(self):
+        codec = Codec(serializer='json', compression='none')
+        data = codec.dumps({'a': 1}, serializer='pickle')
+        with self.assertRaises(ValueError):
+            codec.loads(data)
+        self.assertEqual(codec.loads(data, allow_pickle=True), {'a': 1})
+
+    def test_missing_optional_dependency_falls_back(self):
+        with mock.patch.dict('sys.modules', {'zstandard': None}):
+            self.assertEqual(Codec(serializer='json', compression='zstd').compression, 'zlib')
+
+
+class CacheSerializerTests(SimpleTestCase):
+    """django_redis 序列化器：读回的类型与写入时一致"""
+
+    def round_trip(self, value):
+        serializer = CacheSerializer()
+        return serializer.loads(serializer.dumps(value))
+
+    def test_plain_values_use_compact_encoding(self):
+        data = CacheSerializer().dumps({'count': 3, 'names': ['叶片']})
+        self.assertNotEqual(data[1:2], b'p')
+        self.assertEqual(self.round_trip({'count': 3, 'names': ['叶片']}), {'count': 3, 'names': ['叶片']})
+
+    def test_other_values_keep_their_types(self):
+        values = [
+            (1, 2),
+            {1: 'a'},
+            {'at': datetime.datetime(2024, 5, 1, 8, 30)},
+            {'ids': {1, 2}},
+        ]
+        for value in values:
+            result = self.round_trip(value)
+            self.assertEqual(result, value)
+            self.assertIs(type(result), type(value))
+
+    def test_legacy_pickle_values_are_readable(self):
+        self.assertEqual(CacheSerializer().loads(pickle.dumps((1, 'a'))), (1, 'a'))
+
+
+class RecordingTarget:
+    """迁移目标替身：按 (标签, name) 合并节点，可在第 fail_at 个节点批次写入时失败"""
+
+    def __init__(self, name='memory', fail_at=None):
+        self.name = name
+        self.fail_at = fail_at
+        self.nodes = {}
+        self.edges = set()
+        self.node_batches = 0
+
+    def clear(self):
+        self.nodes.clear()
+        self.edges.clear()
+
+    def ensure_indexes(self, labels):
+        pass
+
+    def write_nodes(self, rows):
+        self.node_batches += 1
+        if self.node_batches == self.fail_at:
+            raise ConnectionError('目标库断开')
+        for row in rows:
+            self.nodes[(row['label'], row['props']['name'])] = row['props']
+
+    def write_edges(self, rows):
+        for row in rows:
+            self.edges.add((row['source'], row['type'], row['target']))
+
+
+class GraphMigrationTests(SimpleTestCase):
+    """图谱迁移：分批写入，中断后从检查点继续"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = os.path.join(tmp.name, 'migration.json')
+        snapshot = os.path.join(tmp.name, 'graph.sqlite3')
+        nodes = [(i, 'Disease', {'name': f'病害{i}'}) for i in range(10)]
+        nodes.append((10, 'Region', {'name': '河南'}))
+        nodes.append((11, 'Region', {}))
+        edges = [(i, 'OCCURS_IN', 10) for i in range(10)]
+        write_snapshot(snapshot, nodes, edges)
+        self.source = SnapshotSource(snapshot)
+
+    def migrate(self, target, resume=False):
+        return GraphMigration(self.source, target, self.checkpoint, batch_size=3, workers=1).run(resume=resume)
+
+    def test_full_migration_skips_invalid_rows(self):
+        target = RecordingTarget()
+        result = self.migrate(target)
+        self.assertEqual(result['phase'], 'done')
+        self.assertEqual(result['done'], {'nodes': 11, 'edges': 10})
+        self.assertEqual(result['skipped']['nodes'], 1)
+        self.assertIn(('病害3', 'OCCURS_IN', '河南'), target.edges)
+
+    def test_resume_continues_after_last_completed_batch(self):
+        with self.assertRaises(ConnectionError):
+            self.migrate(RecordingTarget(fail_at=3))
+        with open(self.checkpoint, encoding='utf-8') as f:
+            state = json.load(f)
+        self.assertEqual((state['phase'], state['done']['nodes'], state['cursor']['nodes']), ('nodes', 6, 6))
+
+        target = RecordingTarget()
+        result = self.migrate(target, resume=True)
+        self.assertEqual(result['done'], {'nodes': 11, 'edges': 10})
+        self.assertEqual(target.node_batches, 2)
+        self.assertNotIn(('Disease', '病害0'), target.nodes)
+        self.assertIn(('Region', '河南'), target.nodes)
+
+        self.assertEqual(self.migrate(RecordingTarget(), resume=True)['seconds'], 0.0)
+
+    def test_checkpoint_of_other_migration_is_rejected(self):
+        self.migrate(RecordingTarget())
+        with self.assertRaises(MigrationError):
+            self.migrate(RecordingTarget(name='other'), resume=True)
+        with self.assertRaises(MigrationError):
+            GraphMigration(self.source, RecordingTarget(name=self.source.name), self.checkpoint)
+
+
+class LoadTestHarnessTests(SimpleTestCase):
+    """压测工具：假大模型服务、HTTP传输和报告汇总"""
+
+    def test_percentile_interpolates(self):
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 100), 5)
+
+    def test_fake_llm_answers_by_call_type(self):
+        server = FakeLLMServer(latency=0, token_rate=0).start()
+        self.addCleanup(server.stop)
+        transport = HTTPTransport(server.url, token='test', timeout=5)
+
+        status, content, _ = transport.request('POST', '/chat/completions', body={
+            'messages': [{'role': 'user', 'content': '条锈病的病原是什么'}], 'response_format': {'type': 'json_object'}
+        })
+        self.assertEqual(status, 200)
+        analysis = json.loads(json.loads(content)['choices'][0]['message']['content'])
+        self.assertEqual(analysis['intent'], 'knowledge')
+
+        status, content, _ = transport.request('POST', '/chat/completions', body={
+            'messages': [{'role': 'user', 'content': '你好'}], 'max_tokens': 10
+        })
+        self.assertEqual(json.loads(content)['choices'][0]['message']['content'], 'greeting')
+        self.assertEqual(transport.request('POST', '/embeddings')[0], 404)
+        self.assertEqual(server.stats(), {'requests': 3, 'errors': 0})
+
+    def test_runner_reports_latency_and_errors_per_endpoint(self):
+        class ScriptedTransport:
+            counts_round_trips = False
+            token = 'test'
+
+            def request(self, method, path, params=None, body=None, stream=False):
+                return (500 if 'related_nodes' in path else 200), b'{}', 0.001
+
+        report = LoadTestRunner(ScriptedTransport(), concurrency=2, requests_per_worker=3,
+                                scenarios=('knowledge',), seed=1).run()
+        self.assertEqual(report['requests'], 24)
+        self.assertEqual(report['endpoints']['graph']['errors'], 0)
+        self.assertEqual(report['endpoints']['related_nodes']['errors'], 6)
+        self.assertIsNone(report['endpoints']['related_nodes']['p50_ms'])
+        self.assertIsNotNone(report['endpoints']['node_details']['p95_ms'])
+
+
+class MicrobenchTests(SimpleTestCase):
+    """微基准：语料可复现，与历史基线比较时识别回退"""
+
+    def test_corpus_is_reproducible_and_bucketed_by_length(self):
+        corpus = build_corpus(vocabulary, seed=3, per_bucket=5)
+        self.assertEqual(corpus['messages'], build_corpus(vocabulary, seed=3, per_bucket=5)['messages'])
+        self.assertTrue(all(len(text) <= LENGTH_BUCKETS['short'] for text in corpus['messages']['short']))
+        self.assertTrue(all(len(text) >= LENGTH_BUCKETS['long'] for text in corpus['messages']['long']))
+
+    def test_measure_reports_throughput_and_memory(self):
+        result = Benchmark('join', ''.join, [['叶片'] * 10]).measure(min_time=0.001, repeat=2)
+        self.assertGreater(result['ops_per_sec'], 0)
+        self.assertGreater(result['peak_bytes'], 0)
+
+    def test_compare_flags_regressions_against_median_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            history = BenchmarkHistory(os.path.join(tmp, 'microbench.json'))
+            for ops in (100, 1000, 110):
+                history.append({'extract': {'ops_per_sec': ops, 'peak_bytes': 500}})
+            history.save()
+            history = BenchmarkHistory(os.path.join(tmp, 'microbench.json'))
+
+        self.assertEqual(history.baseline('extract'), {'ops_per_sec': 110, 'peak_bytes': 500})
+        self.assertIsNone(history.baseline('missing'))
+        rows, regressions = compare({'extract': {'ops_per_sec': 80, 'peak_bytes': 700}}, history)
+        self.assertEqual(len(regressions), 2)
+        self.assertAlmostEqual(rows[0]['ops_change'], 80 / 110 - 1)
+        _, regressions = compare({'extract': {'ops_per_sec': 105, 'peak_bytes': 520}}, history)
+        self.assertEqual(regressions, [])
+
+
+class RequestTimerTests(SimpleTestCase):
+    """请求阶段计时：同名阶段累加，结束时只计入一次直方图"""
+
+    def test_spans_accumulate_and_render(self):
+        timer = RequestTimer()
+        with mock.patch('backend.timing.time.perf_counter', side_effect=[0.0, 0.010, 0.020, 0.025]):
+            with timer.span('extract'):
+                pass
+            with timer.span('extract'):
+                pass
+        timer.add('stream_delay', 0.5)
+        self.assertEqual(timer.header(), 'extract;dur=15.0, stream_delay;dur=500.0')
+        event = timer.sse_event()
+        self.assertTrue(event.startswith('event: timing\n'))
+        self.assertEqual(json.loads(event.split('data: ', 1)[1])['extract'], 15.0)
+
+    def test_finish_observes_once_per_request(self):
+        timer = RequestTimer()
+        timer.tag('timer-test')
+        timer.finish()
+        timer.finish()
+        self.assertIn('chat_request_duration_seconds_count{intent="timer-test"} 1', CHAT_REQUEST_SECONDS.collect())
+
+    def test_disabled_timing_uses_null_timer(self):
+        with override_settings(REQUEST_TIMING_ENABLED=False):
+            self.assertIs(new_timer(), NULL_TIMER)
+        with override_settings(REQUEST_TIMING_ENABLED=True):
+            self.assertIsInstance(new_timer(), RequestTimer)
+        self.assertEqual(NULL_TIMER.sse_event(), '')
+
+
+class LogHandlerTests(SimpleTestCase):
+    """日志处理：请求线程固化消息后入队，按模板采样"""
+
+    @staticmethod
+    def record(msg, *args, level=logging.INFO):
+        return logging.LogRecord('chat.views', level, __file__, 1, msg, args, None)
+
+    def test_sampling_keeps_burst_then_every_nth(self):
+        sampler = SamplingFilter(burst=2, rate=3, window=60)
+        kept = [sampler.filter(self.record('命中回答缓存: %s', i)) for i in range(8)]
+        self.assertEqual(kept, [True, True, False, False, True, False, False, True])
+        self.assertTrue(sampler.filter(self.record('另一条模板: %s', 1)))
+        self.assertTrue(all(sampler.filter(self.record('写入失败: %s', i, level=logging.WARNING)) for i in range(5)))
+
+    def test_same_record_is_counted_once_across_handlers(self):
+        sampler = SamplingFilter(burst=1, rate=100, window=60)
+        record = self.record('命中回答缓存: %s', 1)
+        self.assertTrue(sampler.filter(record))
+        self.assertTrue(sampler.filter(record))
+        self.assertFalse(sampler.filter(self.record('命中回答缓存: %s', 2)))
+
+    def test_queue_handler_freezes_arguments_and_writes_in_background(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'chat.log')
+            handler = QueueFileHandler(path)
+            handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+            symptoms = {'plant_part': ['叶片']}
+            handler.handle(self.record('症状: %s', symptoms))
+            symptoms['plant_part'].append('根系')
+            handler.close()
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(f.read(), "INFO 症状: {'plant_part': ['叶片']}\n")
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            handler = QueueFileHandler(os.path.join(tmp, 'chat.log'), queue_size=1)
+            handler.listener.stop()
+            handler.listener = None
+            handler.handle(self.record('第一条'))
+            handler.handle(self.record('第二条'))
+            self.assertEqual(handler.dropped, 1)
+            handler.targets[0].close()
+
+
+class ServiceRegistryTests(SimpleTestCase):
+    """服务注册中心：首次使用时才创建，预热不等待慢后端"""
+
+    def test_lazy_service_is_created_once_on_first_use(self):
+        registry = ServiceRegistry()
+        factory = mock.Mock(return_value=['叶片'])
+        proxy = registry.lazy('vocab', factory)
+        factory.assert_not_called()
+        self.assertEqual(len(proxy), 1)
+        self.assertEqual(proxy[0], '叶片')
+        factory.assert_called_once_with()
+        self.assertEqual(registry.report()['vocab']['status'], 'ready')
+
+    def test_unavailable_backend_is_retried(self):
+        registry = ServiceRegistry()
+        factory = mock.Mock(side_effect=[None, 'client'])
+        registry.register('redis', factory)
+        self.assertIsNone(registry.get('redis'))
+        self.assertEqual(registry.report()['redis']['status'], 'unavailable')
+        self.assertEqual(registry.get('redis'), 'client')
+
+    def test_uncached_service_calls_factory_each_time(self):
+        registry = ServiceRegistry()
+        clients = iter(['first', 'second'])
+        registry.register('neo4j', lambda: next(clients), cache=False)
+        self.assertEqual((registry.get('neo4j'), registry.get('neo4j')), ('first', 'second'))
+
+    def test_warm_up_probes_in_parallel_and_does_not_wait_for_slow_backends(self):
+        registry = ServiceRegistry()
+        release = threading.Event()
+        self.addCleanup(release.set)
+        registry.register('redis', lambda: 'client', probe=mock.Mock())
+        registry.register('neo4j', lambda: release.wait(5) and 'driver')
+        registry.register('mysql', lambda: 'conn', probe=mock.Mock(side_effect=ConnectionError('refused')))
+        registry.register('llm', lambda: 'gateway', warm=False)
+
+        result = registry.warm_up(timeout=0.2)
+        self.assertEqual(set(result), {'redis', 'neo4j', 'mysql'})
+        self.assertEqual(result['redis']['status'], 'ready')
+        self.assertEqual(result['neo4j']['status'], 'timeout')
+        self.assertEqual((result['mysql']['status'], result['mysql']['error']), ('error', 'refused'))
+
+    def test_only_server_processes_warm_up(self):
+        from backend.apps import BackendConfig
+
+        cases = [
+            (['manage.py', 'migrate'], {}, False),
+            (['manage.py', 'runserver'], {}, False),
+            (['manage.py', 'runserver'], {'RUN_MAIN': 'true'}, True),
+            (['manage.py', 'runserver', '--noreload'], {}, True),
+            (['gunicorn', 'backend.wsgi'], {}, True),
+        ]
+        for argv, env, expected in cases:
+            with mock.patch('sys.argv', argv), mock.patch.dict('os.environ', env, clear=True):
+                self.assertEqual(BackendConfig._is_server_process(), expected, argv)
+
+
+class HealthCheckerTests(SimpleTestCase):
+    """就绪检查：并发探测，关键依赖不可用时摘除实例，有备用依赖时只报告降级"""
+
+    @staticmethod
+    def down():
+        raise ConnectionError('refused')
+
+    def test_all_up_is_ready_and_cached(self):
+        probe = mock.Mock(return_value='PONG')
+        checker = HealthChecker({'redis': probe}, critical=('redis',), cache_ttl=60)
+        report = checker.check()
+        self.assertEqual((report['status'], report['ready']), ('ready', True))
+        self.assertEqual(report['dependencies']['redis']['detail'], 'PONG')
+        checker.check()
+        self.assertEqual(probe.call_count, 1)
+        checker.check(refresh=True)
+        self.assertEqual(probe.call_count, 2)
+
+    def test_critical_failure_is_unavailable_but_optional_is_not(self):
+        checker = HealthChecker({'redis': self.down, 'llm': self.down}, critical=('redis',))
+        report = checker.check()
+        self.assertEqual(report['status'], 'unavailable')
+        self.assertEqual(report['dependencies']['redis']['error'], 'refused')
+
+        checker = HealthChecker({'redis': lambda: None, 'llm': self.down}, critical=('redis',))
+        self.assertTrue(checker.check()['ready'])
+
+    def test_fallback_reports_degraded(self):
+        checker = HealthChecker({'neo4j': self.down, 'graph': lambda: '120 nodes'},
+                                critical=('neo4j',), fallbacks={'neo4j': 'graph'})
+        report = checker.check()
+        self.assertEqual((report['status'], report['ready']), ('degraded', True))
+        self.assertEqual(report['dependencies']['neo4j']['fallback'], 'graph')
+
+    def test_hung_probe_times_out_and_is_not_restarted(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        probe = mock.Mock(side_effect=lambda: release.wait(5))
+        checker = HealthChecker({'mysql': probe}, critical=('mysql',), timeout=0.05, cache_ttl=0)
+        self.assertEqual(checker.check()['dependencies']['mysql']['status'], 'timeout')
+        self.assertEqual(checker.check()['dependencies']['mysql']['error'], '上一次探测仍未返回')
+        self.assertEqual(probe.call_count, 1)
+
+    def test_liveness_does_not_probe(self):
+        with mock.patch('backend.health.get_health_checker') as get_checker:
+            self.assertEqual(healthz_view(RequestFactory().get('/healthz')).status_code, 200)
+        get_checker.assert_not_called()
+
+
+class GraphSnapshotFallbackTests(SimpleTestCase):
+    """Neo4j不可用时改用本地快照，查询语句本身的错误照常抛出"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'graph.sqlite3')
+        write_snapshot(self.path, [
+            ('d1', 'Disease', {'name': '小麦条锈病', 'control_method': '喷施三唑酮'}),
+            ('p1', 'PlantPart', {'name': '叶片'}),
+        ], [('d1', 'AFFECTS', 'p1')])
+        self.snapshot = GraphSnapshot(self.path)
+        breaker = snapshot_module.graph_breaker
+        patchers = [
+            mock.patch.object(snapshot_module, 'graph_snapshot', self.snapshot),
+            mock.patch.multiple(breaker, state=breaker.CLOSED, _failures=0, _probe_started=None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def from_snapshot(snapshot):
+        disease = snapshot.find('小麦条锈病', 'Disease')
+        return [node['name'] for _, node, _ in snapshot.neighbors(disease)]
+
+    def test_snapshot_queries(self):
+        disease = self.snapshot.find('小麦条锈病')
+        self.assertEqual(disease['props']['control_method'], '喷施三唑酮')
+        self.assertEqual([n['name'] for n in self.snapshot.main_nodes()], ['小麦条锈病'])
+        leaf = self.snapshot.find('叶片', 'PlantPart')
+        self.assertEqual(self.snapshot.neighbors(leaf, direction='in', rel_type='AFFECTS')[0][1]['name'], '小麦条锈病')
+        self.assertIsNone(self.snapshot.find('叶片', 'Disease'))
+
+    def test_connection_error_falls_back_and_opens_breaker(self):
+        query = mock.Mock(side_effect=ConnectionRefusedError('neo4j down'))
+        self.assertEqual(query_graph(mock.Mock(), 'symptoms', query, self.from_snapshot), ['叶片'])
+        self.assertEqual(snapshot_module.graph_breaker.state, 'open')
+        # 冷却期内不再尝试连接Neo4j
+        self.assertEqual(query_graph(mock.Mock(), 'symptoms', query, self.from_snapshot), ['叶片'])
+        self.assertEqual(query.call_count, 1)
+
+    def test_query_error_is_raised(self):
+        with self.assertRaises(ValueError):
+            query_graph(mock.Mock(), 'symptoms', mock.Mock(side_effect=ValueError('bad cypher')), self.from_snapshot)
+        self.assertEqual(snapshot_module.graph_breaker.state, 'closed')
+
+    def test_missing_snapshot_is_unavailable(self):
+        os.remove(self.path)
+        with self.assertRaises(GraphUnavailableError):
+            query_graph(None, 'symptoms', mock.Mock(), self.from_snapshot)
+
+
+class EmbeddedGraphStoreTests(SimpleTestCase):
+    """进程内图谱存储：症状匹配与图谱查询"""
+
+    nodes = [
+        ('d1', 'Disease', {'name': '小麦条锈病', 'symptoms': '黄色条状孢子堆', 'treatment': '喷施三唑酮'}),
+        ('d2', 'Disease', {'name': '小麦白粉病', 'symptoms': '白色霉层', 'treatment': '喷施粉锈宁'}),
+        ('p1', 'Pest', {'name': '麦蚜', 'damage': '吸食汁液'}),
+        ('leaf', 'PlantPart', {'name': '叶片'}),
+        ('stem', 'PlantPart', {'name': '茎秆'}),
+        ('rain', 'Weather', {'name': '多雨'}),
+        ('henan', 'Region', {'name': '河南'}),
+    ]
+    edges = [
+        ('d1', 'AFFECTS_PART', 'leaf'), ('d1', 'OCCURS_IN_WEATHER', 'rain'), ('d1', 'OCCURS_IN_REGION', 'henan'),
+        ('d2', 'AFFECTS_PART', 'leaf'), ('d2', 'AFFECTS_PART', 'stem'), ('d2', 'OCCURS_IN_REGION', 'henan'),
+        ('p1', 'AFFECTS_PART', 'leaf'),
+    ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'graph.sqlite3')
+        write_snapshot(self.path, self.nodes, self.edges)
+        self.store = EmbeddedGraphStore(GraphSnapshot(self.path))
+
+    def match(self, **params):
+        return [(row['name'], row['score']) for row in self.store.match_diseases(params, list(params))]
+
+    def test_match_returns_best_tier_only(self):
+        self.assertEqual(self.match(plant_part=['叶片'], weather=['多雨']), [('小麦条锈病', 2)])
+        self.assertEqual(self.match(weather=['大风']), [])
+
+    def test_ties_prefer_more_matched_values_then_name(self):
+        self.assertEqual(self.match(plant_part=['叶片', '茎秆'], region=['河南'])[0], ('小麦白粉病', 2))
+        rows = self.store.match_diseases({'plant_part': ['叶片']}, ['plant_part'], limit=5)
+        self.assertEqual({row['kind'] for row in rows}, {'disease', 'pest'})
+        self.assertEqual(len(rows), 3)
+
+    def test_details_and_related_nodes(self):
+        self.assertEqual(self.store.disease_details('麦蚜')['description'], '吸食汁液')
+        self.assertIsNone(self.store.disease_details('叶片'))
+        related = self.store.related_nodes('小麦条锈病', 'OCCURS_IN_REGION')
+        self.assertEqual([node['name'] for node in related], ['河南'])
+        self.assertEqual(self.store.node_details('多雨')['relations'], [{'rel': None, 'target': None}])
+
+    def test_subgraphs_link_diseases_and_symptoms(self):
+        subgraph = self.store.node_subgraph('叶片', 'plantpart')
+        self.assertEqual({link['source'] for link in subgraph['links']}, {'叶片'})
+        self.assertEqual(len(subgraph['links']), 3)
+        self.assertEqual(len(self.store.disease_subgraph('小麦条锈病')['links']), 3)
+        self.assertEqual(len(self.store.full_graph()['links']), len(self.edges))
+
+    def test_index_is_rebuilt_after_snapshot_changes(self):
+        self.assertEqual(self.match(weather=['多雨']), [('小麦条锈病', 1)])
+        write_snapshot(self.path, self.nodes, self.edges + [('d2', 'OCCURS_IN_WEATHER', 'rain')])
+        os.utime(self.path, (os.path.getmtime(self.path) + 1,) * 2)
+        self.assertEqual(len(self.match(weather=['多雨'])), 2)
+
+
+class RowExtractor:
+    """只提供校验和提取方法的图谱管理器替身"""
+
+    def _validate_csv_data(self, row):
+        return bool(row.get('名称'))
+
+    _validate_pest_data = _validate_csv_data
+
+    def _extract_disease_row(self, row):
+        if row['部位'] == '!':
+            raise ValueError('bad part')
+        return {'properties': {'name': row['名称']}, 'links': {'plant_part': row['部位'].split('、')}}
+
+    _extract_pest_row = _extract_disease_row
+
+
+class IngestionPipelineTests(SimpleTestCase):
+    """导入流水线：流式读取CSV/XLSX，按原始行序暂存提取结果"""
+
+    rows = [('小麦条锈病', '叶片'), ('', '茎秆'), ('小麦白粉病', '叶片、茎秆'), ('小麦赤霉病', '!'), ('小麦纹枯病', '茎秆')]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.csv_path = self.write_csv('disease.csv', self.rows)
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8-sig') as f:
+            f.write('名称,部位\n')
+            f.writelines(f'{name},"{part}"\n' for name, part in rows)
+        return path
+
+    def pipeline(self, **kwargs):
+        kwargs.setdefault('staging_path', os.path.join(self.dir, 'staging', 'graph.jsonl'))
+        return IngestionPipeline(RowExtractor(), workers=1, chunk_size=2, **kwargs)
+
+    def test_csv_and_xlsx_yield_the_same_rows(self):
+        from openpyxl import Workbook
+
+        workbook = Workbook()
+        workbook.active.append(['名称', '部位', None])
+        for row in self.rows:
+            workbook.active.append(list(row) + [None])
+        workbook.active.append([None, None, None])
+        workbook.save(os.path.join(self.dir, 'pest.xlsx'))
+
+        xlsx_path = resolve_source(os.path.join(self.dir, 'pest.csv'))
+        self.assertEqual(xlsx_path.suffix, '.xlsx')
+        self.assertEqual(list(iter_rows(xlsx_path)), list(iter_rows(self.csv_path)))
+        self.assertEqual(next(iter_rows(self.csv_path)), {'名称': '小麦条锈病', '部位': '叶片'})
+        self.assertIsNone(resolve_source(os.path.join(self.dir, 'missing.csv')))
+
+    def test_stage_keeps_row_order_and_counts_failures(self):
+        pest_path = self.write_csv('pest.csv', [('麦蚜', '叶片')])
+        staged = self.pipeline().stage([
+            ('disease', self.csv_path, True),
+            ('pest', pest_path, False),
+            ('pest', os.path.join(self.dir, 'missing.csv'), False),
+        ])
+
+        self.assertEqual(staged['counts'], {'disease': 3, 'pest': 1})
+        self.assertEqual(staged['errors'], {'disease': 2, 'pest': 0})
+        batches = [(kind, [r['properties']['name'] for r in batch]) for kind, batch in read_staged(staged['path'], 2)]
+        self.assertEqual(batches, [
+            ('disease', ['小麦条锈病', '小麦白粉病']), ('disease', ['小麦纹枯病']), ('pest', ['麦蚜']),
+        ])
+        self.assertFalse(os.path.exists(f"{staged['path']}.tmp"))
+
+    def test_stage_records_phase_timings(self):
+        timer = RequestTimer()
+        self.pipeline().stage([('disease', self.csv_path, True)], timer=timer)
+        self.assertEqual(set(timer.stages), {'parse', 'extract', 'stage'})
+
+    def test_missing_required_source_raises(self):
+        with self.assertRaises(FileNotFoundError):
+            self.pipeline().stage([('disease', os.path.join(self.dir, 'missing.csv'), True)])
+
+    def test_interrupted_stage_removes_partial_files(self):
+        staging_path = os.path.join(self.dir, 'staging', 'graph.jsonl')
+        with mock.patch.object(RowExtractor, '_extract_disease_row', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                self.pipeline(staging_path=staging_path).stage([('disease', self.csv_path, True)])
+        self.assertEqual(os.listdir(os.path.dirname(staging_path)), [])
+
+
+@override_settings(GRAPH_STORE_BACKEND='embedded')
+class GraphDryRunTests(SimpleTestCase):
+    """导入预演：与当前图谱逐个主节点比较，不写入图谱"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.csv_path = os.path.join(self.dir, 'disease.csv')
+        with open(self.csv_path, 'w', encoding='utf-8') as f:
+            f.write('名称,部位\n小麦条锈病,叶片、茎秆\n小麦白粉病,叶片\n小麦白粉病,穗部\n')
+        self.snapshot_path = os.path.join(self.dir, 'graph.sqlite3')
+        write_snapshot(self.snapshot_path, [
+            ('d1', 'Disease', {'name': '小麦条锈病'}),
+            ('d2', 'Disease', {'name': '小麦全蚀病'}),
+            ('leaf', 'PlantPart', {'name': '叶片'}),
+            ('root', 'PlantPart', {'name': '根部'}),
+        ], [('d1', 'AFFECTS_PART', 'leaf'), ('d1', 'AFFECTS_PART', 'root'), ('d2', 'AFFECTS_PART', 'root')])
+        breaker = snapshot_module.graph_breaker
+        patchers = [
+            mock.patch.object(snapshot_module, 'graph_snapshot', GraphSnapshot(self.snapshot_path)),
+            mock.patch.multiple(breaker, state=breaker.CLOSED, _failures=0, _probe_started=None),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.manager = GraphManager()
+        self.staging_path = os.path.join(self.dir, 'graph.jsonl')
+
+        def stage(disease_file, pest_file, workers, timer):
+            pipeline = IngestionPipeline(RowExtractor(), workers=1, staging_path=self.staging_path)
+            return pipeline.stage([('disease', disease_file, True)], timer=timer)
+
+        self.manager._stage = stage
+
+    def test_current_records_read_from_snapshot(self):
+        current = self.manager.current_records()
+        self.assertEqual(set(current), {('disease', '小麦条锈病'), ('disease', '小麦全蚀病')})
+        self.assertEqual(current[('disease', '小麦条锈病')]['links'], {'plant_part': {'叶片', '根部'}})
+
+    def test_dry_run_reports_link_changes_and_removed_nodes(self):
+        timer = RequestTimer()
+        report = self.manager.dry_run(disease_file=self.csv_path, timer=timer)
+
+        rows = {row['name']: row for row in report['rows']}
+        self.assertEqual(rows['小麦条锈病']['status'], 'changed')
+        self.assertEqual(rows['小麦条锈病']['added'], {'plant_part': ['茎秆']})
+        self.assertEqual(rows['小麦条锈病']['removed'], {'plant_part': ['根部']})
+        self.assertEqual(rows['小麦白粉病']['status'], 'added')
+        self.assertEqual(rows['小麦白粉病']['links'], {'plant_part': sorted(['穗部', '叶片'])})
+        self.assertEqual(report['removed'], [{'kind': 'disease', 'name': '小麦全蚀病'}])
+        self.assertEqual(report['summary'], {'added': 1, 'changed': 1, 'unchanged': 0, 'removed': 1})
+        self.assertEqual(report['counts'], {'disease': 3})
+        self.assertTrue({'load_current', 'diff'} <= set(timer.stages))
+        self.assertFalse(os.path.exists(self.staging_path))
+
+    def test_dry_run_leaves_snapshot_untouched(self):
+        mtime = os.path.getmtime(self.snapshot_path)
+        report = self.manager.dry_run(disease_file=self.csv_path)
+        self.assertEqual(os.path.getmtime(self.snapshot_path), mtime)
+        self.assertEqual(len(self.manager.current_records()), 2)
+        self.assertEqual(report['summary']['changed'], 1)
@@ -0,0 +1,116 @@
+"""
+请求阶段计时模块
+
+记录一次请求中各处理阶段的耗时，包括：
+- span(name)：上下文管理器，同名阶段多次进入时耗时累加
+- header()：生成 Server-Timing 响应头
+- sse_event()：生成流式响应末尾的 timing 事件
+- finish()：结束计时并把各阶段耗时计入直方图
+
+关闭计时（REQUEST_TIMING_ENABLED=False）时使用 NULL_TIMER，所有方法均为空操作。
+"""
+
+import json
+import time
+import logging
+from contextlib import contextmanager
+from django.conf import settings
+from backend.metrics import CHAT_STAGE_SECONDS, CHAT_REQUEST_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class RequestTimer:
+    """单个请求的阶段计时器，只在处理该请求的线程中使用，无需加锁"""
+
+    enabled = True
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.label = 'unknown'
+        self._finished = False
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name, seconds):
+        """直接累加一段耗时（例如循环内多次sleep的合计）"""
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def tag(self, label):
+        """设置总耗时直方图的标签（如识别出的意图）"""
+        self.label = label
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        """Server-Timing 响应头，单位毫秒"""
+        return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+    def sse_event(self):
+        """以SSE命名事件输出各阶段耗时（毫秒），前端按默认 message 事件监听时会忽略它"""
+        payload = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        payload['total'] = round(self.elapsed() * 1000, 1)
+        return f"event: timing\ndata: {json.dumps(payload)}\n\n"
+
+    def finish(self):
+        """结束计时并计入直方图，重复调用只生效一次"""
+        if self._finished:
+            return
+        self._finished = True
+        for name, seconds in self.stages.items():
+            CHAT_STAGE_SECONDS.observe(seconds, name)
+        total = self.elapsed()
+        CHAT_REQUEST_SECONDS.observe(total, self.label)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("请求阶段耗时(%s): %s, total;dur=%.1f", self.label, self.header(), total * 1000)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class NullTimer:
+    """关闭计时时使用的空计时器"""
+
+    enabled = False
+    _span = _NullSpan()
+
+    def span(self, name):
+        return self._span
+
+    def add(self, name, seconds):
+        pass
+
+    def tag(self, label):
+        pass
+
+    def header(self):
+        return ''
+
+    def sse_event(self):
+        return ''
+
+    def finish(self):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+def new_timer():
+    """按配置返回新的请求计时器或空计时器"""
+    if getattr(settings, 'REQUEST_TIMING_ENABLED', True):
+        return RequestTimer()
+    return NULL_TIMER
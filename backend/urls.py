@@ -12,6 +12,8 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from chat.views import ChatAPI
+from backend.metrics import metrics_view
+from backend.health import healthz_view, readyz_view
 
 # 创建路由器并注册视图
 router = DefaultRouter()
@@ -21,6 +23,13 @@ urlpatterns = [
     # Django管理后台路由
     path('admin/', admin.site.urls),
     
+    # Prometheus指标抓取
+    path('metrics', metrics_view, name='metrics'),
+    
+    # 存活与就绪检查（负载均衡探测）
+    path('healthz', healthz_view, name='healthz'),
+    path('readyz', readyz_view, name='readyz'),
+    
     # API路由
     path('api/', include([
         path('', include(router.urls)),  # chat相关路由
@@ -0,0 +1,459 @@
+"""
+关键词词表注册模块
+
+图谱导入和聊天症状提取共用的一份词表，包括：
+- 内置标准关键词和同义词映射
+- 从 static/File 下的名词表补充同义写法，可选的关键词映射表扩充词表
+- 全部类别编译为一棵前缀树的匹配器（最左最长匹配）
+- 匹配的同时标记被否定的关键词（“不是叶片，是根部”只提取根系）
+- 数据文件变化后自动重新加载
+"""
+
+import re
+import csv
+import time
+import logging
+import threading
+from pathlib import Path
+
+from backend.region_index import region_index
+from backend.growth_stages import growth_stage_index
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TERM_DIR = BASE_DIR / 'static' / 'File'
+
+# 症状类别 -> 名词表文件
+TERM_FILES = {
+    'plant_part': '病害发生部位名词.csv',
+    'weather': '气象名词.csv',
+    'growth_stage': '病害发生生育期名词.csv',
+    'region': '发病地区名词.csv',
+}
+
+# 可选的关键词映射表，列为：类别,名词,标准词（多个标准词用 | 分隔）
+MAPPING_FILE = '关键词映射.csv'
+
+CATEGORY_LABELS = {
+    '发病部位': 'plant_part',
+    '气象': 'weather',
+    '生育期': 'growth_stage',
+    '发病地区': 'region',
+}
+
+# 否定词：否定同一分句中紧随其后的第一个关键词（“不是叶片，是根部”只提取根系）
+NEGATION_WORDS = ('不是', '并非', '并不是', '没有', '不在', '不见', '未见', '未发现', '没发现')
+# 单字否定词：只否定紧挨着的关键词（“不下雨”），“无雨干旱”“不能抽穗”中的关键词不受影响
+PREFIX_NEGATION_WORDS = ('不', '没', '无', '未')
+# 以单字否定词开头但不表示否定的常用词，其中的否定字按普通字处理
+NEGATION_EXEMPT_WORDS = (
+    '不少', '不规则', '不断', '不同', '不久', '不等', '不一', '不止', '不仅', '不但',
+    '不停', '不均', '不稳定', '无规则', '无数', '无论', '未成熟', '没多久'
+)
+# 转折词：结束当前的否定范围，其后的关键词视为肯定
+CONTRAST_WORDS = ('而是', '但是', '可是', '却')
+# 分句边界：否定范围不跨分句
+CLAUSE_BREAKS = frozenset('，,。.；;！!？?\n')
+
+BASE_KEYWORDS = {
+    'plant_part': {
+        "叶片", "茎秆", "根系", "麦穗", "叶鞘", "籽粒", "幼苗", "基部", "穗部",
+        "节间", "叶尖", "叶缘", "叶面", "叶背", "茎基", "茎部", "穗轴", "颖壳",
+        "护颖", "芒", "根冠", "根毛", "分蘖", "主茎", "种子", "胚芽", "胚根",
+        "叶基", "茎节", "穗颈", "颖片", "子房", "花药", "花丝", "胚乳", "胚部"
+    },
+    'weather': {
+        # 温度相关
+        "高温", "低温", "寒潮", "倒春寒", "热浪", "冷凉", "温暖",
+        # 降水相关
+        "干旱", "潮湿", "阴雨", "连阴雨", "梅雨", "暴雨", "降雨", "多雨",
+        # 湿度相关
+        "干燥", "湿润", "高湿", "低湿",
+        # 其他气象条件
+        "大风", "霜冻", "积雪", "冰雹", "沙尘", "阴天", "晴天",
+        # 复合条件
+        "高温高湿", "低温多雨", "干旱高温"
+    },
+    'growth_stage': {
+        "全生育期", "生长全期", "全生长期", "苗期", "幼苗期", "出苗期",
+        "3-4叶期", "4-6叶期", "越冬期", "冬前", "返青期", "拔节期",
+        "分蘖期", "茎节期", "起身期", "抽穗期", "孕穗期", "开花期",
+        "扬花期", "灌浆期", "乳熟期", "成熟期", "收获期", "播种期",
+        "发芽期", "生育中期", "生育后期", "抽穗扬花期", "成株期"
+    },
+    'region': {
+        "黑龙江", "吉林", "辽宁", "河北", "山西", "山东", "河南", "江苏", "浙江",
+        "安徽", "江西", "福建", "广东", "广西", "海南", "湖北", "湖南", "四川",
+        "贵州", "云南", "陕西", "甘肃", "青海", "台湾", "北京", "天津", "上海",
+        "重庆", "内蒙古", "新疆", "西藏", "宁夏", "东北", "华北", "华东", "华南",
+        "华中", "西北", "西南", "东北平原区", "云贵高原区", "北方干旱半干旱区",
+        "华南区", "四川盆地区", "长江中下游区", "青藏高原区", "黄土高原区",
+        "黄淮海平原区", "全国各地", "南方", "北方", "西部", "东部"
+    },
+}
+
+# 同义词映射：写法 -> 标准关键词，值为列表时表示复合条件
+BASE_MAPPINGS = {
+    'plant_part': {
+        "叶": "叶片",
+        "茎": "茎秆",
+        "根": "根系",
+        "根部": "根系",
+        "穗": "麦穗",
+        "颖": "颖壳",
+        "芽": "胚芽",
+        "胚": "胚部",
+        "花": "花药",
+        "心叶": "叶片",
+        "老叶": "叶片",
+        "基部叶片": "叶片",
+        "上部叶片": "叶片",
+        "新叶": "叶片",
+        "旗叶": "叶片",
+        "叶尖": "叶片",
+        "叶基": "叶片",
+        "叶鞘": "叶鞘",
+        "茎基": "茎秆",
+        "茎部": "茎秆",
+        "秆": "茎秆",
+        "节间": "茎秆",
+        "茎节": "茎秆",
+        "基部": "茎秆",
+        "根冠": "根系",
+        "根毛": "根系",
+        "幼根": "根系",
+        "种子根": "根系",
+        "穗部": "麦穗",
+        "穗轴": "麦穗",
+        "小穗": "麦穗",
+        "穗颈": "麦穗",
+        "颖壳": "颖壳",
+        "护颖": "颖壳",
+        "颖片": "颖壳",
+        "胚芽鞘": "胚芽",
+        "幼芽": "胚芽",
+        "子房": "胚部",
+        "胚根": "胚部",
+        "胚乳": "胚部",
+        "花丝": "花药",
+        "花器": "花药",
+    },
+    'weather': {
+        "温度高": "高温",
+        "气温高": "高温",
+        "温度低": "低温",
+        "气温低": "低温",
+        "降水": "降雨",
+        "下雨": "降雨",
+        "雨天": "阴雨",
+        "干燥": "干旱",
+        "湿润": "潮湿",
+        # 降水组合
+        "缺水": "干旱",
+        # 复合条件
+        "高温干旱": ["高温", "干旱"],
+        "低温阴雨": ["低温", "阴雨"],
+    },
+    'growth_stage': {
+        "开花": "开花期",
+        "抽穗": "抽穗期",
+        "返青": "返青期",
+        "成熟": "成熟期",
+        "播种": "播种期",
+        "发芽": "发芽期",
+        "越冬": "越冬期",
+        "拔节": "拔节期",
+        "分蘖": "分蘖期",
+        "灌浆": "灌浆期",
+        "收获": "收获期",
+        "出苗": "出苗期",
+        "幼苗": "幼苗期",
+        "孕穗": "孕穗期",
+        "扬花": "扬花期",
+        "生育中": "生育中期",
+        "生育后": "生育后期",
+        "全生育": "全生育期",
+        "生长全": "全生育期",
+        # 时间相关
+        "初期": "苗期",
+        "前期": "苗期",
+        "中期": "生育中期",
+        "后期": "生育后期",
+        "末期": "成熟期",
+        # 复合表达
+        "抽穗开花": "抽穗期",
+        "抽穗扬花": "抽穗期",
+        "灌浆成熟": "灌浆期",
+        # 同义表达
+        "发苗": "出苗期",
+        "小苗": "幼苗期",
+        "成熟时": "成熟期",
+    },
+    'region': {},
+}
+
+# 名词表中的词只有与已知关键词相差不超过这么多字时才作为同义写法
+MAX_EXTRA_CHARS = 2
+
+_CJK_TERM = re.compile(r'^[\u4e00-\u9fff]+$')
+_END = ''
+
+# 匹配项类型
+KEYWORD = 'keyword'
+NEGATION = 'negation'
+PREFIX_NEGATION = 'prefix_negation'
+CONTRAST = 'contrast'
+EXEMPT = 'exempt'
+
+
+class KeywordMatcher:
+    """前缀树关键词匹配器
+
+    一次扫描文本，每个位置取最长的匹配词，匹配后从词尾继续，复杂度与文本长度
+    成正比（乘以最长词长）。全部类别的关键词、否定词和转折词编译在同一棵树里，
+    扫描的同时记录尚未生效的否定，由其后的第一个关键词（不论类别）消耗，
+    不需要对每个关键词再回看上下文。
+    """
+
+    def __init__(self, forms, negation_words=NEGATION_WORDS, contrast_words=CONTRAST_WORDS):
+        """forms: 写法 -> {类别: 标准关键词元组}"""
+        self._root = {}
+        for word in negation_words:
+            self._insert(word, (NEGATION, ()))
+        for word in PREFIX_NEGATION_WORDS:
+            self._insert(word, (PREFIX_NEGATION, ()))
+        for word in NEGATION_EXEMPT_WORDS:
+            self._insert(word, (EXEMPT, ()))
+        for word in contrast_words:
+            self._insert(word, (CONTRAST, ()))
+        # 关键词最后插入，与提示词同形时以关键词为准
+        for form, targets in forms.items():
+            self._insert(form, (KEYWORD, targets))
+
+    def _insert(self, form, entry):
+        node = self._root
+        for ch in form:
+            node = node.setdefault(ch, {})
+        node[_END] = entry
+
+    def scan(self, text):
+        """返回 [(起点, 终点, 写法, {类别: 标准关键词元组}, 是否被否定)]"""
+        matches = []
+        # 尚未生效的否定：(否定类型, 否定词终点)，由其后第一个关键词消耗
+        pending = None
+        i = 0
+        n = len(text)
+        while i < n:
+            if text[i] in CLAUSE_BREAKS:
+                pending = None
+                i += 1
+                continue
+            node = self._root
+            j = i
+            last = None
+            while j < n:
+                node = node.get(text[j])
+                if node is None:
+                    break
+                j += 1
+                if _END in node:
+                    last = (j, node[_END])
+            if not last:
+                i += 1
+                continue
+            end, (kind, targets) = last
+            if kind == EXEMPT:
+                # 只跳过开头的否定字，其余部分仍可匹配关键词（“未成熟”中的“成熟”）
+                end = i + 1
+            elif kind in (NEGATION, PREFIX_NEGATION):
+                pending = (kind, end)
+            elif kind == CONTRAST:
+                pending = None
+            else:
+                negated = pending is not None and (pending[0] == NEGATION or pending[1] == i)
+                matches.append((i, end, text[i:end], targets, negated))
+                pending = None
+            i = end
+        return matches
+
+
+class Vocabulary:
+    """一次加载的完整词表快照，构建后只读"""
+
+    def __init__(self, keywords, mappings):
+        self.keywords = {c: frozenset(words) for c, words in keywords.items()}
+        self.mappings = mappings
+        # 全部类别共用一个匹配器：否定词只作用于其后的第一个关键词，无论它属于哪个类别
+        forms = {}
+        for category, words in self.keywords.items():
+            mapping = mappings.get(category, {})
+            # 单字映射（“叶”“花”等）太宽泛，只用于整词归一，不参与文本匹配
+            for form, value in mapping.items():
+                if len(form) >= 2:
+                    forms.setdefault(form, {})[category] = _as_tuple(value)
+            for word in words:
+                forms.setdefault(word, {})[category] = _as_tuple(mapping.get(word, word))
+        self.matcher = KeywordMatcher(forms)
+
+
+class VocabularyRegistry:
+    """全局词表注册中心
+
+    词表在首次使用时加载，之后每隔 check_interval 秒检查一次数据文件的修改时间，
+    有变化时重建并整体替换快照，读取方无需加锁。
+    """
+
+    def __init__(self, term_dir=TERM_DIR, check_interval=5):
+        self.term_dir = Path(term_dir)
+        self.check_interval = check_interval
+        self._vocabulary = None
+        self._mtimes = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def keywords(self, category):
+        """某类别的标准关键词集合"""
+        return self._current().keywords[category]
+
+    def mapping(self, category):
+        """某类别的同义词映射（写法 -> 标准关键词或列表）"""
+        return self._current().mappings[category]
+
+    def extract(self, text, category):
+        """
+        从文本中提取某类别的标准关键词
+
+        Args:
+            text (str): 待分析文本
+            category (str): 症状类别
+
+        Returns:
+            list: 按首次出现位置排序的标准关键词，被否定的关键词不计入
+        """
+        if not text:
+            return []
+        vocabulary = self._current()
+        positions = {}
+        for start, end, form, categories, negated in vocabulary.matcher.scan(text):
+            if negated or category not in categories:
+                continue
+            for target in categories[category]:
+                positions.setdefault(target, start)
+        return self._apply_special_rules(category, positions)
+
+    def reload(self):
+        """立即重新加载词表"""
+        with self._lock:
+            self._load()
+
+    def _current(self):
+        now = time.time()
+        if self._vocabulary is not None and now - self._checked_at < self.check_interval:
+            return self._vocabulary
+        with self._lock:
+            if self._vocabulary is None or now - self._checked_at >= self.check_interval:
+                self._checked_at = now
+                if self._vocabulary is None or self._file_mtimes() != self._mtimes:
+                    self._load()
+        return self._vocabulary
+
+    def _file_mtimes(self):
+        mtimes = {}
+        for name in list(TERM_FILES.values()) + [MAPPING_FILE]:
+            path = self.term_dir / name
+            mtimes[name] = path.stat().st_mtime if path.exists() else None
+        return mtimes
+
+    def _load(self):
+        mtimes = self._file_mtimes()
+        keywords = {c: set(words) for c, words in BASE_KEYWORDS.items()}
+        mappings = {c: {} for c in BASE_KEYWORDS}
+        for category, mapping in BASE_MAPPINGS.items():
+            mappings[category].update(mapping)
+        mappings['region'].update(region_index.aliases)
+
+        try:
+            self._load_mapping_file(keywords, mappings)
+        except Exception as e:
+            logger.error("加载关键词映射表失败: %s", e)
+
+        derived = 0
+        for category, name in TERM_FILES.items():
+            try:
+                derived += self._load_terms(self.term_dir / name, category, keywords[category], mappings[category])
+            except Exception as e:
+                logger.error("加载名词表失败 %s: %s", name, e)
+
+        self._vocabulary = Vocabulary(keywords, mappings)
+        self._mtimes = mtimes
+        logger.info(
+            "关键词词表加载完成: %s 个标准词，%s 个同义写法（名词表补充 %s 个）",
+            sum(len(v) for v in keywords.values()), sum(len(v) for v in mappings.values()), derived
+        )
+
+    def _load_mapping_file(self, keywords, mappings):
+        """读取可选的关键词映射表，标准词不在词表中时一并加入"""
+        path = self.term_dir / MAPPING_FILE
+        if not path.exists():
+            return
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                category = CATEGORY_LABELS.get(row.get('类别', '').strip(), row.get('类别', '').strip())
+                form = (row.get('名词') or '').strip()
+                targets = [t.strip() for t in (row.get('标准词') or '').split('|') if t.strip()]
+                if category not in keywords or not form or not targets:
+                    continue
+                keywords[category].update(targets)
+                mappings[category][form] = targets[0] if len(targets) == 1 else targets
+
+    def _load_terms(self, path, category, keywords, mapping):
+        """从聚类名词表中挑出已知关键词的变体写法（如“降雨量”），返回新增数量
+
+        名词表是分词后的聚类结果，夹杂大量虚词和数字，只接受包含且仅包含一个
+        已知关键词、多出的字不超过 MAX_EXTRA_CHARS 且不以否定词开头的词。
+        """
+        if not path.exists():
+            return 0
+        known = sorted((w for w in set(keywords) | set(mapping) if len(w) >= 2), key=len, reverse=True)
+        column = next(label for label, c in CATEGORY_LABELS.items() if c == category)
+        added = 0
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f):
+                for term in (row.get(column) or '').split(','):
+                    term = term.strip()
+                    if (len(term) < 2 or term in keywords or term in mapping
+                            or not _CJK_TERM.match(term) or term.startswith(NEGATION_WORDS + PREFIX_NEGATION_WORDS)):
+                        continue
+                    contained = {_as_tuple(mapping.get(w, w)) for w in known if w in term}
+                    base = next((w for w in known if w in term), None)
+                    if len(contained) == 1 and len(term) - len(base) <= MAX_EXTRA_CHARS:
+                        targets = contained.pop()
+                        mapping[term] = targets[0] if len(targets) == 1 else list(targets)
+                        added += 1
+        return added
+
+    def _apply_special_rules(self, category, positions):
+        """应用特殊规则，返回按出现位置排序的关键词"""
+        # 1. 高温与低温互斥，保留先提到的
+        if category == 'weather' and '高温' in positions and '低温' in positions:
+            positions.pop('低温' if positions['高温'] < positions['低温'] else '高温')
+
+        # 2. 多个关键生育期只保留最先提到的
+        if category == 'growth_stage':
+            found = [k for k in positions if k in growth_stage_index.milestones]
+            if len(found) > 1:
+                first = min(found, key=lambda k: (positions[k], growth_stage_index.sort_key(k)))
+                for stage in found:
+                    if stage != first:
+                        positions.pop(stage)
+
+        return sorted(positions, key=positions.get)
+
+
+def _as_tuple(value):
+    return tuple(value) if isinstance(value, (list, tuple)) else (value,)
+
+
+# 创建全局词表实例
+vocabulary = VocabularyRegistry()
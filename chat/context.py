@@ -0,0 +1,148 @@
+"""
+对话上下文窗口管理模块
+
+控制每次发送给大模型的上下文规模，包括：
+- 本地估算token数
+- 按token预算保留最近的对话轮次
+- 将更早的轮次增量压缩为滚动摘要，按会话缓存在Redis中（backend.codec 编码）
+"""
+
+import re
+import logging
+from django.conf import settings
+from backend.codec import codec
+from backend.connections import get_redis_binary_client
+
+logger = logging.getLogger(__name__)
+
+# 中日韩统一表意文字及全角标点，大致按每字一个token计算
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+# 每条消息的角色、分隔符等固定开销
+_MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text):
+    """本地估算文本的token数：中文按字计，其余字符按每4个字符一个token计"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + 3) // 4
+
+
+def count_message_tokens(message):
+    """估算单条消息的token数"""
+    return estimate_tokens(message.get('content', '')) + _MESSAGE_OVERHEAD
+
+
+class ContextWindowManager:
+    """上下文窗口管理器
+
+    最近的对话原样保留，直到用完 token_budget；被挤出窗口的早期对话按时间戳
+    增量地追加到摘要中，摘要本身不超过 summary_budget，超出时丢弃最早的条目。
+    """
+
+    def __init__(self, token_budget=None, summary_budget=None):
+        self.key_prefix = "chat:context:"
+        self.token_budget = token_budget or getattr(settings, 'CHAT_CONTEXT_TOKEN_BUDGET', 1500)
+        self.summary_budget = summary_budget or getattr(settings, 'CHAT_CONTEXT_SUMMARY_TOKENS', 300)
+        self.cache_timeout = getattr(settings, 'CHAT_CONTEXT_CACHE_TTL', 7 * 24 * 3600)
+        self.line_length = 60
+
+    @property
+    def redis_client(self):
+        """摘要所在的Redis连接，首次使用时才创建（导入本模块不会连接Redis）"""
+        return get_redis_binary_client()
+
+    def build_context(self, session_id, user_id, history):
+        """
+        根据历史记录构建受预算约束的上下文消息
+
+        Args:
+            session_id (str): 会话ID
+            user_id: 用户ID，未登录为None
+            history (list): 完整历史记录
+
+        Returns:
+            list: 可直接拼入请求的消息列表（可能以一条摘要system消息开头）
+        """
+        if not history:
+            return []
+
+        window = []
+        used = 0
+        for message in reversed(history):
+            tokens = count_message_tokens(message)
+            if used + tokens > self.token_budget:
+                if not window:
+                    # 单条消息就超出预算时截断保留，保证最近一轮始终可见
+                    window.append(self._truncate(message, self.token_budget))
+                break
+            window.append(message)
+            used += tokens
+        window.reverse()
+
+        older = history[:len(history) - len(window)]
+        summary_lines = self._update_summary(session_id, user_id, older) if older else []
+
+        messages = []
+        if summary_lines:
+            messages.append({
+                "role": "system",
+                "content": "以下是本次对话较早内容的摘要：\n" + "\n".join(summary_lines)
+            })
+        messages.extend({'role': m['role'], 'content': m['content']} for m in window)
+        return messages
+
+    def _update_summary(self, session_id, user_id, older):
+        """把尚未摘要过的早期消息追加到滚动摘要中，返回摘要条目"""
+        key = self._key(session_id, user_id)
+        state = {'until': 0, 'lines': []}
+        try:
+            data = self.redis_client.get(key)
+            if data:
+                state = codec.loads(data)
+        except Exception as e:
+            logger.warning("读取上下文摘要失败: %s", e)
+
+        pending = [m for m in older if m.get('timestamp', 0) > state['until']]
+        if not pending:
+            return state['lines']
+
+        lines = state['lines'] + [self._summarize_message(m) for m in pending]
+        total = sum(estimate_tokens(line) for line in lines)
+        while lines and total > self.summary_budget:
+            total -= estimate_tokens(lines.pop(0))
+
+        state = {'until': pending[-1].get('timestamp', 0), 'lines': lines}
+        try:
+            self.redis_client.set(key, codec.dumps(state), ex=self.cache_timeout)
+        except Exception as e:
+            logger.warning("保存上下文摘要失败: %s", e)
+        return lines
+
+    def _summarize_message(self, message):
+        """把单条消息压缩成一行摘要"""
+        content = ' '.join((message.get('content') or '').split())
+        label = '用户' if message.get('role') == 'user' else '助手'
+        # 诊断回复只保留结论（确定的诊断或部分症状相符时的可能结果）
+        match = re.search(r'(?:诊断结果为|可能是)[^。\n]*', content) if message.get('role') != 'user' else None
+        if match:
+            content = match.group(0)
+        if len(content) > self.line_length:
+            content = content[:self.line_length] + '…'
+        return f"{label}：{content}"
+
+    def _truncate(self, message, budget):
+        """按预算截断单条消息的内容"""
+        content = message.get('content', '')
+        while content and count_message_tokens({'content': content}) > budget:
+            content = content[:int(len(content) * 0.8)]
+        return {'role': message['role'], 'content': content}
+
+    def _key(self, session_id, user_id):
+        return f"{self.key_prefix}{user_id}:{session_id}"
+
+
+# 创建全局上下文管理器实例
+context_manager = ContextWindowManager()
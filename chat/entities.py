@@ -0,0 +1,112 @@
+"""
+病害实体识别模块
+
+从知识图谱加载病害（含虫害）名称、别名及详情，编译为词典匹配器，包括：
+- 识别用户消息中提到的病害（名称、简称、别名）
+- 提供病害详情的内存副本，供直接作答使用
+"""
+
+import re
+import time
+import logging
+import threading
+from backend.graph_store import get_graph_store
+
+logger = logging.getLogger(__name__)
+
+
+class DiseaseEntityLinker:
+    """病害实体识别器
+
+    病害按 refresh_interval 定期从图谱重新加载，名称、去掉“小麦”前缀的简称
+    以及别名都会被识别，统一映射为图谱中的标准名称。
+    """
+
+    # 别名字段中的分隔符
+    alias_separators = re.compile(r'[、,，;；/]')
+
+    def __init__(self, refresh_interval=600):
+        self.refresh_interval = refresh_interval
+        self._pattern = None
+        self._surface_forms = {}
+        self._details = {}
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def link(self, text):
+        """
+        识别文本中出现的病害
+
+        Args:
+            text (str): 用户消息
+
+        Returns:
+            list: 按名称排序的标准病害名称列表
+        """
+        if not text:
+            return []
+        self._ensure_loaded()
+        if self._pattern is None:
+            return []
+        return sorted({self._surface_forms[m.group(0)] for m in self._pattern.finditer(text)})
+
+    def details(self, name):
+        """
+        获取病害详情的内存副本
+
+        Args:
+            name (str): 标准病害名称
+
+        Returns:
+            dict: 与 Neo4jService.get_disease_details 相同结构的详情，不存在时返回None
+        """
+        self._ensure_loaded()
+        return self._details.get(name)
+
+    def _ensure_loaded(self):
+        if time.time() - self._loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if time.time() - self._loaded_at < self.refresh_interval:
+                return
+            try:
+                self._build(self._load())
+            except Exception as e:
+                logger.error("加载病害实体失败: %s", e)
+            # 加载失败时同样等待一个周期再重试，避免每条消息都访问图谱
+            self._loaded_at = time.time()
+
+    def _load(self):
+        return get_graph_store().main_nodes()
+
+    def _build(self, diseases):
+        surface_forms = {}
+        for disease in diseases:
+            name = disease['name']
+            surface_forms[name] = name
+            for form in [self._short_name(name)] + self._split_alias(disease['alias']):
+                if len(form) >= 2:
+                    surface_forms.setdefault(form, name)
+        self._details = {disease['name']: disease for disease in diseases}
+        self._surface_forms = surface_forms
+        # 长词优先，避免“锈病”抢先匹配“条锈病”
+        terms = sorted(surface_forms, key=len, reverse=True)
+        self._pattern = re.compile('|'.join(map(re.escape, terms))) if terms else None
+        logger.info("病害实体词典加载完成: %s 个病害，%s 个名称", len(diseases), len(terms))
+
+    @staticmethod
+    def _short_name(name):
+        return name[2:] if name.startswith('小麦') else ''
+
+    def _split_alias(self, alias):
+        forms = []
+        for part in self.alias_separators.split(alias or ''):
+            part = part.strip().rstrip('等').strip()
+            if part:
+                forms.append(part)
+                forms.append(self._short_name(part))
+        return forms
+
+
+# 创建全局实体识别器实例
+entity_linker = DiseaseEntityLinker()
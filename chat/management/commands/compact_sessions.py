@@ -0,0 +1,64 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from backend.connections import get_redis_binary_client
+from chat.retention import SessionRetention
+
+class Command(BaseCommand):
+    help = '整理会话数据：清理已过期的索引项，归档并删除长期未活动的会话，为旧数据补上过期时间，并输出各键族的内存占用'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-days', type=float, default=None,
+                            help=f'归档并删除超过该天数未活动的会话，默认 {settings.CHAT_SESSION_ARCHIVE_AFTER / 86400:g} 天')
+        parser.add_argument('--no-archive', action='store_true', help='长期未活动的会话直接删除，不写归档文件')
+        parser.add_argument('--archive-dir', default=settings.CHAT_SESSION_ARCHIVE_DIR,
+                            help='归档目录，默认取 CHAT_SESSION_ARCHIVE_DIR；归档含用户对话记录，不要放在代码目录中')
+        parser.add_argument('--dry-run', action='store_true', help='只统计，不修改数据')
+        parser.add_argument('--report-only', action='store_true', help='只输出内存占用报告')
+        parser.add_argument('--sample', type=int, default=200, help='内存报告中每个键族抽样的键数')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='大于0时作为后台任务运行，每隔该秒数整理一次')
+
+    def handle(self, *args, **options):
+        client = get_redis_binary_client()
+        if client is None:
+            raise CommandError('Redis连接未初始化')
+        retention = SessionRetention(client)
+        idle_days = options['idle_days']
+        idle_seconds = settings.CHAT_SESSION_ARCHIVE_AFTER if idle_days is None else idle_days * 86400
+        archive_dir = None if options['no_archive'] else options['archive_dir']
+        if not archive_dir and not options['no_archive'] and not options['report_only']:
+            raise CommandError('未配置归档目录：请设置 CHAT_SESSION_ARCHIVE_DIR 或指定 --archive-dir，'
+                               '不需要归档时使用 --no-archive')
+
+        while True:
+            if not options['report_only']:
+                stats = retention.compact(idle_seconds=idle_seconds, archive_dir=archive_dir,
+                                          dry_run=options['dry_run'])
+                self.stdout.write(self.style.SUCCESS(
+                    f"会话整理{'预演' if options['dry_run'] else '完成'}: 索引中 {stats['indexed']} 个会话，"
+                    f"清理过期索引 {stats['pruned']} 个，归档删除 {stats['archived']} 个，"
+                    f"超出上限淘汰 {stats['evicted']} 个，补设过期时间 {stats['ttl_fixed']} 个"
+                ))
+            self._print_report(retention.memory_report(sample=options['sample']))
+            if options['interval'] <= 0:
+                break
+            time.sleep(options['interval'])
+
+    def _print_report(self, report):
+        self.stdout.write(f"{'键族':<20}{'键数':>10}{'平均字节':>12}{'估算占用':>14}{'无过期时间':>12}")
+        for row in report:
+            self.stdout.write(
+                f"{row['family']:<20}{row['keys']:>10}{row['avg_bytes']:>12}"
+                f"{self._size(row['estimated_bytes']):>14}{row['no_ttl']:>12}"
+            )
+        total = sum(row['estimated_bytes'] for row in report)
+        self.stdout.write(f"合计估算占用: {self._size(total)}")
+
+    @staticmethod
+    def _size(num):
+        for unit in ('B', 'KB', 'MB'):
+            if num < 1024:
+                return f"{num:.0f}{unit}" if unit == 'B' else f"{num:.1f}{unit}"
+            num /= 1024
+        return f"{num:.1f}GB"
@@ -0,0 +1,148 @@
+"""
+回答缓存模块
+
+缓存常见知识类问题的大模型回答，包括：
+- 问题文本归一化
+- 以归一化问题 + 识别出的病害实体作为缓存键；依赖对话上下文的问题不缓存
+- 进程内LRU + Redis两级缓存，带过期时间
+- 管理员清空缓存
+"""
+
+import time
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from backend.connections import get_redis_client
+from backend.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """大模型回答缓存"""
+
+    # 只缓存与上下文无关的知识类问答
+    cacheable_intents = ('prevention', 'knowledge')
+
+    # 不影响问题含义的客套语和语气词
+    leading_fillers = ('请问一下', '请问', '你好', '您好', '我想知道', '我想问', '想问一下', '想问')
+    trailing_fillers = ('呢', '吗', '啊', '呀', '吧')
+
+    # 指代上文的词：含有这些词的问题，回答取决于之前的对话
+    context_markers = (
+        '它', '他们', '这个', '那个', '这种', '那种', '这些', '那些', '该病', '此病', '这病',
+        '上面', '上述', '刚才'
+    )
+
+    def __init__(self):
+        self.key_prefix = "chat:answer:"
+        self.timeout = getattr(settings, 'CHAT_RESPONSE_CACHE_TTL', 24 * 3600)
+        self.max_size = getattr(settings, 'CHAT_RESPONSE_CACHE_LOCAL_SIZE', 512)
+        # 进程内条目寿命较短，其他进程执行清空后最多滞后这么久
+        self.local_ttl = min(self.timeout, getattr(settings, 'CHAT_RESPONSE_CACHE_LOCAL_TTL', 300))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def redis_client(self):
+        """回答缓存所在的Redis连接，首次使用时才创建（导入本模块不会连接Redis）"""
+        return get_redis_client()
+
+    def normalize(self, question):
+        """归一化问题文本：全半角统一、去空白标点、去客套语和句末语气词"""
+        text = unicodedata.normalize('NFKC', question or '').lower()
+        text = ''.join(
+            ch for ch in text
+            if not ch.isspace() and unicodedata.category(ch)[0] not in ('P', 'S')
+        )
+        for filler in self.leading_fillers:
+            if text.startswith(filler):
+                text = text[len(filler):]
+                break
+        while text and text.endswith(self.trailing_fillers):
+            text = text[:-1]
+        return text
+
+    def make_key(self, question, entities):
+        """由归一化问题和实体集合生成缓存键
+
+        没有识别出病害实体（如“怎么防治”）或含有指代词（如“它怎么防治”）的问题
+        依赖会话中之前的对话，不同会话不能共用回答，返回None表示不缓存。
+        """
+        if not entities:
+            return None
+        text = self.normalize(question)
+        if any(marker in text for marker in self.context_markers):
+            return None
+        raw = f"{text}|{','.join(sorted(set(entities)))}"
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """获取缓存的回答，未命中返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires_at, answer = entry
+                if expires_at > now:
+                    self._local.move_to_end(key)
+                    record_cache('response', 'local_hit')
+                    return answer
+                del self._local[key]
+
+        try:
+            answer = self.redis_client.get(f"{self.key_prefix}{key}")
+        except Exception as e:
+            logger.warning("读取回答缓存失败: %s", e)
+            return None
+        record_cache('response', 'hit' if answer else 'miss')
+        if answer:
+            self._set_local(key, answer)
+        return answer
+
+    def set(self, key, answer):
+        """缓存回答"""
+        if not answer:
+            return
+        self._set_local(key, answer)
+        try:
+            self.redis_client.set(f"{self.key_prefix}{key}", answer, ex=self.timeout)
+        except Exception as e:
+            logger.warning("写入回答缓存失败: %s", e)
+
+    def purge(self):
+        """清空全部回答缓存，返回删除的Redis键数量
+
+        其他进程的进程内缓存不会被立即清除，最迟在 local_ttl 后失效。
+        """
+        with self._lock:
+            self._local.clear()
+
+        redis_client = self.redis_client
+        if redis_client is None:
+            logger.warning("Redis不可用，只清空了进程内回答缓存")
+            return 0
+        deleted = 0
+        cursor = 0
+        while True:
+            cursor, keys = redis_client.scan(cursor=cursor, match=f"{self.key_prefix}*", count=500)
+            if keys:
+                deleted += redis_client.delete(*keys)
+            if cursor == 0:
+                break
+        logger.info("已清空回答缓存: %s 条", deleted)
+        return deleted
+
+    def _set_local(self, key, answer):
+        with self._lock:
+            self._local[key] = (time.time() + self.local_ttl, answer)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+
+# 创建全局回答缓存实例
+response_cache = ResponseCache()
@@ -0,0 +1,283 @@
+"""
+会话保留策略模块
+
+控制会话数据在Redis中的占用，包括：
+- 滑动过期：会话每次有活动时刷新历史记录、症状信息及会话索引的过期时间
+- 每用户会话上限：按用户维护最近活动时间的有序集合索引，超出上限时淘汰最久未活动的会话
+- compact()：清理索引中已过期的会话，把长期未活动的会话归档到本地文件后删除，
+  为旧版本写入的无过期时间的键补上过期时间和索引（由 compact_sessions 命令定期执行）
+- memory_report()：按键族统计键数量和内存占用
+
+会话列表直接读取用户索引；整理任务运行之前，每个用户首次列出会话时扫描一次自己的
+旧会话补建索引，此后不再SCAN。
+"""
+
+import os
+import gzip
+import json
+import time
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from backend.codec import codec
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PREFIX = "chat:history:"
+SYMPTOMS_PREFIX = "chat:symptoms:"
+CONTEXT_PREFIX = "chat:context:"
+SESSION_PREFIX = "chat:session:"
+INDEX_PREFIX = "chat:sessions:"
+
+# 整理任务为旧版本写入的会话补建索引后设置该标记，此后会话列表不再回退到SCAN
+INDEXED_MARKER = "chat:retention:indexed"
+# 单个用户的旧会话已补建索引的标记（整理任务尚未运行时使用）
+USER_INDEXED_PREFIX = "chat:retention:indexed:"
+
+# 内存报告的键族：名称 -> 键前缀（Django缓存的键另带前缀和版本号，见 memory_report）
+KEY_FAMILIES = {
+    'chat:history': HISTORY_PREFIX,
+    'chat:symptoms': SYMPTOMS_PREFIX,
+    'chat:context': CONTEXT_PREFIX,
+    'chat:sessions': INDEX_PREFIX,
+    'chat:retention': 'chat:retention:',
+    'auth:token': 'auth:token:',
+    'auth:user_tokens': 'auth:user_tokens:',
+}
+CACHE_KEY_FAMILIES = {
+    'chat:session': SESSION_PREFIX,
+    'knowledge:graph': 'knowledge:graph:',
+}
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+
+
+class SessionRetention:
+    """会话保留策略
+
+    Args:
+        redis_client: 会话数据所在的Redis连接
+        ttl (int): 会话无写入多少秒后过期
+        max_sessions (int): 每个登录用户最多保留的会话数，0表示不限；未登录会话只受过期时间约束
+    """
+
+    def __init__(self, redis_client, ttl=None, max_sessions=None):
+        self.redis_client = redis_client
+        self.ttl = ttl or settings.CHAT_SESSION_TTL
+        self.max_sessions = settings.CHAT_SESSION_MAX_PER_USER if max_sessions is None else max_sessions
+
+    @staticmethod
+    def index_key(user_id):
+        return f"{INDEX_PREFIX}{user_id}"
+
+    @staticmethod
+    def data_keys(user_id, session_id):
+        """会话在Redis中直接保存的键（历史记录、症状信息、上下文摘要）"""
+        return [f"{prefix}{user_id}:{session_id}" for prefix in (HISTORY_PREFIX, SYMPTOMS_PREFIX, CONTEXT_PREFIX)]
+
+    @staticmethod
+    def session_key(user_id, session_id):
+        """会话元数据在Django缓存中的键"""
+        return f"{SESSION_PREFIX}{user_id}:{session_id}"
+
+    def touch(self, user_id, session_id, values=None, now=None):
+        """记录一次会话活动：写入数据并刷新过期时间，新会话超出上限时淘汰最久未活动的会话
+
+        Args:
+            values (dict): 随本次活动一起写入的 {键: 已编码的值}，与刷新在同一个管道中执行
+        """
+        now = time.time() if now is None else now
+        values = values or {}
+        index_key = self.index_key(user_id)
+        pipe = self.redis_client.pipeline()
+        for key, value in values.items():
+            pipe.set(key, value, ex=self.ttl)
+        pipe.zadd(index_key, {session_id: now})
+        pipe.expire(index_key, self.ttl)
+        # 上下文摘要可以重新生成，保留其自身的过期时间（CHAT_CONTEXT_CACHE_TTL）
+        for prefix in (HISTORY_PREFIX, SYMPTOMS_PREFIX):
+            key = f"{prefix}{user_id}:{session_id}"
+            if key not in values:
+                pipe.expire(key, self.ttl)
+        added = pipe.execute()[len(values)]
+        if added and user_id is not None and self.max_sessions:
+            self._enforce_cap(user_id)
+
+    def _enforce_cap(self, user_id):
+        index_key = self.index_key(user_id)
+        count = self.redis_client.zcard(index_key)
+        if count <= self.max_sessions:
+            return
+        oldest = [_text(member) for member in self.redis_client.zrange(index_key, 0, count - self.max_sessions - 1)]
+        self.delete_sessions(user_id, oldest)
+        logger.info("用户 %s 的会话数超过上限 %s，淘汰最久未活动的 %s 个会话", user_id, self.max_sessions, len(oldest))
+
+    def delete_sessions(self, user_id, session_ids):
+        """删除会话的全部数据及其索引项"""
+        if not session_ids:
+            return
+        keys = [key for session_id in session_ids for key in self.data_keys(user_id, session_id)]
+        pipe = self.redis_client.pipeline()
+        pipe.delete(*keys)
+        pipe.zrem(self.index_key(user_id), *session_ids)
+        pipe.execute()
+        cache.delete_many([self.session_key(user_id, session_id) for session_id in session_ids])
+
+    def session_ids(self, user_id):
+        """用户的全部会话ID
+
+        整理任务尚未为旧版本写入的会话补建索引时，无论索引中是否已有新会话，
+        每个用户首次列出会话时都扫描一次自己的历史记录键，补建索引并补上过期时间。
+        """
+        marker = f"{USER_INDEXED_PREFIX}{user_id}"
+        if not self.redis_client.exists(INDEXED_MARKER, marker):
+            for key in self.redis_client.scan_iter(match=f"{HISTORY_PREFIX}{user_id}:*", count=100):
+                key = _text(key)
+                if self.redis_client.ttl(key) == -1:
+                    self._index_legacy(str(user_id), key[len(f"{HISTORY_PREFIX}{user_id}:"):])
+            self.redis_client.set(marker, str(time.time()), ex=self.ttl)
+        return [_text(member) for member in self.redis_client.zrange(self.index_key(user_id), 0, -1)]
+
+    def _index_legacy(self, user_part, session_id):
+        """为旧版本写入的无过期时间的会话补建索引并补上过期时间；已在索引中的会话保留其活动时间"""
+        index_key = self.index_key(user_part)
+        # 会话ID是创建时的毫秒时间戳，补建索引时用作最近活动时间
+        self.redis_client.zadd(index_key, {session_id: self._created_at(session_id)}, nx=True)
+        for data_key in self.data_keys(user_part, session_id) + [index_key]:
+            self.redis_client.expire(data_key, self.ttl)
+
+    @staticmethod
+    def _created_at(session_id):
+        try:
+            return int(session_id) / 1000
+        except ValueError:
+            return time.time()
+
+    def _archive(self, archive, user_id, session_id, last_active):
+        history_key, symptoms_key, _ = self.data_keys(user_id, session_id)
+        history, symptoms = self.redis_client.mget([history_key, symptoms_key])
+        record = {
+            'user_id': user_id,
+            'session_id': session_id,
+            'last_active': last_active,
+            'history': codec.loads(history) if history else [],
+            'symptoms': codec.loads(symptoms) if symptoms else {},
+        }
+        archive.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+
+    def compact(self, idle_seconds=None, archive_dir=None, dry_run=False):
+        """整理会话数据
+
+        Args:
+            idle_seconds (float): 超过该秒数未活动的会话归档后删除，None表示不归档
+            archive_dir (str): 归档目录，会话按天追加到 sessions-YYYYMMDD.jsonl.gz；为空时只删除不归档
+            dry_run (bool): 只统计，不修改数据
+
+        Returns:
+            dict: 各项处理的会话数
+        """
+        stats = {'indexed': 0, 'pruned': 0, 'archived': 0, 'ttl_fixed': 0, 'evicted': 0}
+        now = time.time()
+        archive = None
+        if idle_seconds is not None and archive_dir and not dry_run:
+            os.makedirs(archive_dir, exist_ok=True)
+            archive = gzip.open(os.path.join(archive_dir, time.strftime('sessions-%Y%m%d.jsonl.gz')), 'ab')
+
+        try:
+            # 旧版本写入的无过期时间的键：补上过期时间并加入索引
+            for key in self.redis_client.scan_iter(match=f"{HISTORY_PREFIX}*", count=500):
+                key = _text(key)
+                if self.redis_client.ttl(key) != -1:
+                    continue
+                user_part, session_id = key[len(HISTORY_PREFIX):].split(':', 1)
+                stats['ttl_fixed'] += 1
+                if not dry_run:
+                    self._index_legacy(user_part, session_id)
+            if not dry_run:
+                self.redis_client.set(INDEXED_MARKER, str(now))
+
+            for index_key in self.redis_client.scan_iter(match=f"{INDEX_PREFIX}*", count=500):
+                index_key = _text(index_key)
+                user_part = index_key[len(INDEX_PREFIX):]
+                user_id = None if user_part == 'None' else user_part
+                entries = [(_text(member), score) for member, score in
+                           self.redis_client.zrange(index_key, 0, -1, withscores=True)]
+                stats['indexed'] += len(entries)
+
+                # 数据已过期的索引项
+                pipe = self.redis_client.pipeline()
+                for session_id, _ in entries:
+                    pipe.exists(f"{HISTORY_PREFIX}{user_part}:{session_id}")
+                alive = pipe.execute() if entries else []
+                expired = [sid for (sid, _), exists in zip(entries, alive) if not exists]
+                idle = [] if idle_seconds is None else [
+                    (sid, score) for (sid, score), exists in zip(entries, alive)
+                    if exists and score < now - idle_seconds
+                ]
+                stats['pruned'] += len(expired)
+                stats['archived'] += len(idle)
+
+                remaining = len(entries) - len(expired) - len(idle)
+                over_cap = []
+                if user_id is not None and self.max_sessions and remaining > self.max_sessions:
+                    idle_ids = {sid for sid, _ in idle}
+                    survivors = [sid for (sid, _), exists in zip(entries, alive) if exists and sid not in idle_ids]
+                    over_cap = survivors[:remaining - self.max_sessions]
+                    stats['evicted'] += len(over_cap)
+                if dry_run:
+                    continue
+
+                if expired:
+                    self.redis_client.zrem(index_key, *expired)
+                for session_id, score in idle:
+                    if archive is not None:
+                        self._archive(archive, user_id, session_id, score)
+                self.delete_sessions(user_part, [sid for sid, _ in idle] + over_cap)
+        finally:
+            if archive is not None:
+                archive.close()
+
+        logger.info("会话整理完成: %s", stats)
+        return stats
+
+    def memory_report(self, sample=200):
+        """按键族统计键数量和内存占用（每个键族最多抽样 sample 个键执行 MEMORY USAGE 后按数量估算）
+
+        Returns:
+            list: [{'family', 'keys', 'sampled', 'avg_bytes', 'estimated_bytes', 'no_ttl'}]，按估算占用降序
+        """
+        families = dict(KEY_FAMILIES)
+        families.update({name: str(cache.make_key(prefix)) for name, prefix in CACHE_KEY_FAMILIES.items()})
+        # 前缀最长的优先匹配，避免 chat:session 与 chat:sessions 混淆
+        ordered = sorted(families.items(), key=lambda item: len(item[1]), reverse=True)
+        stats = {name: {'keys': 0, 'sampled': 0, 'bytes': 0, 'no_ttl': 0} for name in list(families) + ['other']}
+
+        for key in self.redis_client.scan_iter(count=1000):
+            key = _text(key)
+            family = next((name for name, prefix in ordered if key.startswith(prefix)), 'other')
+            item = stats[family]
+            item['keys'] += 1
+            if item['sampled'] < sample:
+                item['sampled'] += 1
+                item['bytes'] += self.redis_client.memory_usage(key) or 0
+                if self.redis_client.ttl(key) == -1:
+                    item['no_ttl'] += 1
+
+        report = []
+        for name, item in stats.items():
+            if not item['keys']:
+                continue
+            avg = item['bytes'] / item['sampled'] if item['sampled'] else 0
+            report.append({
+                'family': name,
+                'keys': item['keys'],
+                'sampled': item['sampled'],
+                'avg_bytes': round(avg),
+                'estimated_bytes': round(avg * item['keys']),
+                # 抽样键中没有过期时间的比例按数量估算
+                'no_ttl': round(item['no_ttl'] / item['sampled'] * item['keys']) if item['sampled'] else 0,
+            })
+        report.sort(key=lambda row: row['estimated_bytes'], reverse=True)
+        return report
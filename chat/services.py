@@ -1,27 +1,33 @@
 """
 聊天应用的服务模块
 
-提供与Neo4j知识图谱交互的服务
+提供与Neo4j知识图谱交互的服务，以及意图识别、图谱直答服务
 """
 
 import os
 import json
 import logging
-from backend.connections import get_neo4j_driver, get_openai_client, get_redis_client, get_mysql_conn
+from django.conf import settings
+from backend.connections import get_openai_client, get_llm_gateway
+from backend.graph_store import get_graph_store, SYMPTOM_RELATIONS
+from backend.llm_gateway import LLMUnavailableError
+from backend.region_index import region_index
+from backend.growth_stages import growth_stage_index
 from .utils import keyword_manager
+from .entities import entity_linker
 
 logger = logging.getLogger(__name__)
 
 class Neo4jService:
-    """Neo4j服务类，用于与Neo4j数据库交互"""
+    """知识图谱查询服务，查询由全局图谱存储完成（Neo4j或进程内存储，见 GRAPH_STORE_BACKEND）"""
     
     def __init__(self):
-        """初始化Neo4j服务（不再自行管理连接，统一用全局工厂）"""
-        self.driver = get_neo4j_driver()
+        """初始化图谱查询服务（不再自行管理连接，统一用全局图谱存储）"""
+        self.store = get_graph_store()
     
     def is_connected(self):
-        """检查是否成功连接到Neo4j"""
-        return self.driver is not None
+        """检查图谱存储当前是否可用"""
+        return self.store.is_connected()
     
     def extract_symptoms(self, message):
         """
@@ -35,129 +41,81 @@ class Neo4jService:
         """
         return keyword_manager.extract_symptoms(message)
     
+    # 症状类别 -> (关系类型, 节点标签)
+    symptom_relations = SYMPTOM_RELATIONS
+    
     def query_disease(self, symptoms):
         """
-        根据症状查询可能的病害
+        根据症状查询可能的病害和虫害
+        
+        病害与虫害统一按命中的症状类别数打分，只返回得分最高的一档（最多3个），
+        任一类别的任一取值命中即计分，不再要求所有条件同时满足。
         
         Args:
-            symptoms (dict): 包含症状信息的字典
+            symptoms (dict): 包含症状信息的字典，取值可以是字符串或列表
                 - plant_part: 发病部位
                 - weather: 发病气象条件
                 - growth_stage: 发病生育期
                 - region: 发病地区
         
         Returns:
-            list: 可能的病害列表，每个病害包含名称、描述和防治方法
+            list: 可能的病虫害列表，每项包含名称、描述、防治方法、类别（disease/pest），
+                以及命中的类别数 match_count 和命中比例 match_ratio（1表示提供的症状类别全部命中）
         """
-        if not self.is_connected():
-            logger.warning("Neo4j connection is not available")
+        params = {
+            category: self._as_list(symptoms.get(category))
+            for category in self.symptom_relations
+        }
+        # 省份同时匹配其所属分区、大区及“全国各地”
+        params['region'] = region_index.expand(params['region'])
+        # 生育期按区间匹配，“拔节期”也能命中标注为“生育中期”“全生育期”的病害
+        params['growth_stage'] = growth_stage_index.expand(params['growth_stage'])
+        categories = [category for category, values in params.items() if values]
+        if not categories:
             return []
-            
+        
         try:
-            with self.driver.session() as session:
-                # 构建查询条件
-                match_clauses = []
-                where_clauses = []
-                params = {
-                    'plant_part': symptoms.get('plant_part'),
-                    'weather': symptoms.get('weather'),
-                    'growth_stage': symptoms.get('growth_stage'),
-                    'region': symptoms.get('region')
-                }
-                
-                logger.info(f"查询参数: {params}")
-                
-                # 构建Cypher查询
-                query = """
-                MATCH (d:Disease)
-                """
-                
-                # 添加条件匹配
-                if params['plant_part']:
-                    query += "MATCH (d)-[:AFFECTS_PART]->(p:PlantPart {name: $plant_part}) "
-                if params['weather']:
-                    query += "MATCH (d)-[:OCCURS_IN_WEATHER]->(w:Weather {name: $weather}) "
-                if params['growth_stage']:
-                    query += "MATCH (d)-[:OCCURS_IN_STAGE]->(s:GrowthStage {name: $growth_stage}) "
-                if params['region']:
-                    query += "MATCH (d)-[:OCCURS_IN_REGION]->(r:Region {name: $region}) "
-                
-                # 返回结果
-                query += """
-                RETURN d.name as name, 
-                       d.alias as alias,
-                       d.pathogen as pathogen,
-                       d.symptoms as symptoms,
-                       d.treatment as treatment,
-                       count(*) as matched_symptoms,
-                       1.0 as match_ratio
-                LIMIT 3
-                """
-                
-                logger.info(f"执行查询: {query}")
-                logger.info(f"查询参数: {params}")
-                
-                result = session.run(query, params)
-                logger.info(f"查询结果: {result}")
-                diseases = []
-                
-                for record in result:
-                    diseases.append({
-                        'name': record['name'],
-                        'alias': record.get('alias', ''),
-                        'pathogen': record.get('pathogen', ''),
-                        'description': record.get('symptoms', ''),
-                        'control_method': record.get('treatment', ''),
-                        'match_count': record['matched_symptoms']
-                    })
-                
-                logger.info(f"Found {len(diseases)} matching diseases")
-                return diseases
-                
+            rows = self.store.match_diseases(params, categories)
         except Exception as e:
-            logger.error(f"Error querying Neo4j: {str(e)}")
+            logger.error("Error querying graph store: %s", e)
             return []
+        
+        diseases = [{
+            'name': row['name'],
+            'alias': row['alias'] or '',
+            'pathogen': row['pathogen'] or '',
+            'description': row['symptoms'] or '',
+            'control_method': row['treatment'] or '',
+            'kind': row['kind'],
+            'match_count': row['score'],
+            'match_ratio': round(row['score'] / len(categories), 2)
+        } for row in rows]
+        logger.info("Found %s matching diseases", len(diseases))
+        return diseases
+    
+    @staticmethod
+    def _as_list(value):
+        """把症状取值统一为字符串列表"""
+        if not value:
+            return []
+        if isinstance(value, str):
+            return [value]
+        return [v for v in value if v]
     
     def get_disease_details(self, disease_name):
         """
-        获取特定病害的详细信息
+        获取特定病害（或虫害）的详细信息
         
         Args:
-            disease_name (str): 病害名称
+            disease_name (str): 病害或虫害名称
         
         Returns:
             dict: 病害详细信息
         """
-        if not self.is_connected():
-            logger.warning("Neo4j connection is not available")
-            return None
-            
         try:
-            with self.driver.session() as session:
-                query = """
-                MATCH (d:Disease {name: $name})
-                RETURN d.name as name, 
-                       d.alias as alias,
-                       d.pathogen as pathogen,
-                       d.symptoms as symptoms,
-                       d.treatment as treatment
-                """
-                
-                result = session.run(query, {'name': disease_name})
-                record = result.single()
-                
-                if record:
-                    return {
-                        'name': record['name'],
-                        'alias': record.get('alias', ''),
-                        'pathogen': record.get('pathogen', ''),
-                        'description': record.get('symptoms', ''),  # 使用symptoms作为description
-                        'control_method': record.get('treatment', '')
-                    }
-                return None
-                
+            return self.store.disease_details(disease_name)
         except Exception as e:
-            logger.error(f"Error getting disease details: {str(e)}")
+            logger.error("Error getting disease details: %s", e)
             return None
 
 class IntentService:
@@ -166,6 +124,7 @@ class IntentService:
     def __init__(self):
         """初始化意图识别服务"""
         self.client = get_openai_client()
+        self.gateway = get_llm_gateway()
         
         # 预定义的意图类型
         self.intent_types = {
@@ -192,6 +151,100 @@ class IntentService:
         请只返回意图类型的英文标识，不要包含其他内容。
         
         用户输入："""
+        
+        # 结构化分析的提示词：一次调用同时返回意图和症状
+        self.analysis_prompt = """请分析以下小麦种植户的输入，返回JSON对象：
+        - intent：意图类型，取值 diagnosis（病害诊断，出现小麦的部位、气象条件、生育期、种植区时也返回diagnosis）、
+          prevention（防治建议）、knowledge（病害知识查询）、greeting（问候）、farewell（告别）、thanks（感谢）、unknown（无法识别）
+        - plant_part：用户描述的发病部位，如 叶片、茎秆、根系、麦穗
+        - weather：发病时的气象条件，如 高温、低温、阴雨、干旱
+        - growth_stage：发病的生育期，如 苗期、拔节期、抽穗期、灌浆期
+        - region：种植区，省份或农业分区，如 河南、黄淮海平原区
+        各症状字段为字符串数组，用户否定或未提到的内容不要填写，返回空数组。"""
+        
+        self.analysis_schema = {
+            'type': 'object',
+            'properties': {
+                'intent': {'type': 'string', 'enum': list(self.intent_types)},
+                'plant_part': {'type': 'array', 'items': {'type': 'string'}},
+                'weather': {'type': 'array', 'items': {'type': 'string'}},
+                'growth_stage': {'type': 'array', 'items': {'type': 'string'}},
+                'region': {'type': 'array', 'items': {'type': 'string'}}
+            },
+            'required': ['intent', 'plant_part', 'weather', 'growth_stage', 'region'],
+            'additionalProperties': False
+        }
+        self.response_format = {
+            'type': 'json_schema',
+            'json_schema': {'name': 'message_analysis', 'strict': True, 'schema': self.analysis_schema}
+        }
+    
+    def analyze_message(self, message):
+        """
+        一次调用同时识别意图并抽取症状
+
+        大模型按JSON Schema返回意图和四类症状，症状再经关键词词表校验归一，
+        本地关键词抽取到的结果优先。模型判为unknown但抽取到症状时按诊断处理，
+        从而避免再发起一次兜底问答调用。
+
+        Args:
+            message (str): 用户输入的消息
+
+        Returns:
+            tuple: (意图类型, 症状字典)
+        """
+        symptoms = keyword_manager.extract_symptoms(message)
+        if not message:
+            return 'unknown', symptoms
+        if self.gateway is None:
+            return self._local_intent(message), symptoms
+
+        from openai import BadRequestError
+
+        # 最多请求两次：模型端点不支持JSON Schema时改用JSON模式立即重试一次
+        for _ in range(2):
+            try:
+                response = self.gateway.complete(
+                    'analysis',
+                    deadline=settings.LLM_INTENT_TIMEOUT,
+                    hedge=True,
+                    model=os.getenv('OPENAI_MODEL'),
+                    messages=[
+                        {"role": "system", "content": self.analysis_prompt},
+                        {"role": "user", "content": message}
+                    ],
+                    temperature=0,
+                    max_tokens=200,
+                    response_format=self.response_format
+                )
+                data = json.loads(response.choices[0].message.content)
+                logger.debug("结构化分析原始返回: %s", data)
+                break
+            except LLMUnavailableError as e:
+                logger.warning("结构化分析降级为本地规则: %s", e)
+                return self._local_intent(message), symptoms
+            except BadRequestError as e:
+                if self.response_format['type'] != 'json_schema':
+                    logger.error("结构化分析失败: %s", e)
+                    return self.recognize_intent(message), symptoms
+                # 切换是进程级的：本服务为全局单例，之后的请求都直接使用JSON模式，字段仍由下方逐项校验
+                logger.warning("模型不支持JSON Schema输出，改用JSON模式: %s", e)
+                self.response_format = {'type': 'json_object'}
+            except Exception as e:
+                # 返回了非法JSON等情况，退回单独的意图识别
+                logger.error("结构化分析失败: %s", e)
+                return self.recognize_intent(message), symptoms
+
+        if not isinstance(data, dict):
+            return self.recognize_intent(message), symptoms
+
+        intent = data.get('intent') if data.get('intent') in self.intent_types else 'unknown'
+        for category, value in keyword_manager.normalize_symptoms(data).items():
+            if not symptoms.get(category):
+                symptoms[category] = value
+        if intent == 'unknown' and symptoms:
+            intent = 'diagnosis'
+        return intent, symptoms
     
     def recognize_intent(self, message):
         """
@@ -206,9 +259,15 @@ class IntentService:
         if not message:
             return 'unknown'
             
+        if self.gateway is None:
+            return self._local_intent(message)
+            
         try:
-            # 使用OpenAI进行意图识别
-            response = self.client.chat.completions.create(
+            # 使用OpenAI进行意图识别，短时限并允许对冲请求
+            response = self.gateway.complete(
+                'intent',
+                deadline=settings.LLM_INTENT_TIMEOUT,
+                hedge=True,
                 model=os.getenv('OPENAI_MODEL'),
                 messages=[
                     {"role": "system", "content": self.intent_prompt},
@@ -220,17 +279,24 @@ class IntentService:
             
             # 获取意图类型
             intent = response.choices[0].message.content.strip().lower()
-            logger.debug(f"意图识别原始返回: {response.choices[0].message.content}, 提取intent: {intent}")
+            logger.debug("意图识别原始返回: %s, 提取intent: %s", response.choices[0].message.content, intent)
             
             # 验证意图类型是否有效
             if intent in self.intent_types:
                 return intent
             return 'unknown'
             
+        except LLMUnavailableError as e:
+            logger.warning("意图识别降级为本地规则: %s", e)
+            return self._local_intent(message)
         except Exception as e:
-            logger.error(f"意图识别失败: {str(e)}")
+            logger.error("意图识别失败: %s", e)
             return 'unknown'
     
+    def _local_intent(self, message):
+        """大模型不可用时的本地意图判断：能提取到症状即按诊断处理"""
+        return 'diagnosis' if keyword_manager.extract_symptoms(message) else 'unknown'
+    
     def get_intent_description(self, intent):
         """
         获取意图的中文描述
@@ -241,4 +307,64 @@ class IntentService:
         Returns:
             str: 意图的中文描述
         """
-        return self.intent_types.get(intent, '未知意图') 
\ No newline at end of file
+        return self.intent_types.get(intent, '未知意图')
+
+
+class GraphAnswerService:
+    """图谱直答服务：防治/知识类问题提到图谱中的病害时，直接用病害属性作答，不调用大模型"""
+
+    # 问题关注的方面 -> 触发词
+    aspect_keywords = {
+        'pathogen': ('病原', '病因', '原因', '引起', '病菌', '怎么得', '为什么会'),
+        'description': ('症状', '特征', '表现', '什么样', '识别', '为害', '危害'),
+        'control_method': ('防治', '治疗', '怎么治', '防控', '用药', '什么药', '预防', '控制', '怎么办'),
+    }
+
+    aspect_labels = {
+        'pathogen': '病原',
+        'description': '为害特征',
+        'control_method': '防治措施',
+    }
+
+    def __init__(self, neo4j_service=None):
+        self.neo4j_service = neo4j_service
+
+    def answer(self, intent, message, max_diseases=2):
+        """
+        尝试直接根据图谱回答问题
+
+        Args:
+            intent (str): 意图类型，prevention 或 knowledge
+            message (str): 用户消息
+            max_diseases (int): 最多回答的病害数
+
+        Returns:
+            str: 回答文本；未识别到病害、知识类问题不涉及病原/特征/防治（如发生地区），
+                或缺少相应属性时返回None，交由大模型回答
+        """
+        names = entity_linker.link(message)
+        if not names:
+            return None
+
+        aspects = [aspect for aspect, words in self.aspect_keywords.items() if any(w in message for w in words)]
+        if not aspects:
+            if intent != 'prevention':
+                return None
+            aspects = ['control_method']
+
+        sections = []
+        for name in names[:max_diseases]:
+            details = entity_linker.details(name)
+            if details is None and self.neo4j_service is not None:
+                details = self.neo4j_service.get_disease_details(name)
+            if not details:
+                continue
+            lines = [f"{name}（别名：{details['alias']}）" if details.get('alias') else name]
+            lines.extend(
+                f"{self.aspect_labels[aspect]}：{details[aspect]}"
+                for aspect in aspects if details.get(aspect)
+            )
+            if len(lines) > 1:
+                sections.append("\n".join(lines))
+
+        return "\n\n".join(sections) if sections else None
@@ -5,13 +5,17 @@
 - 会话创建和获取
 - 会话历史记录管理
 - 症状信息管理
+
+历史记录和症状信息用 backend.codec 编码后存入Redis，旧的JSON文本仍可读取。
+会话数据的过期时间、每用户会话上限及定期整理见 chat.retention。
 """
 
 import time
-import json
 import logging
 from django.core.cache import cache
-from backend.connections import get_redis_client
+from backend.codec import codec
+from backend.connections import get_redis_binary_client
+from .retention import SessionRetention
 
 logger = logging.getLogger(__name__)
 
@@ -20,10 +24,12 @@ class SessionManager:
     
     def __init__(self):
         """初始化会话管理器"""
-        self.redis_client = get_redis_client()
+        self.redis_client = get_redis_binary_client()
         self.key_prefix = "chat:session:"
         self.history_prefix = "chat:history:"
         self.symptoms_prefix = "chat:symptoms:"
+        self.context_prefix = "chat:context:"
+        self.retention = SessionRetention(self.redis_client)
     
     def create_session(self, user_id):
         """创建新会话"""
@@ -44,11 +50,12 @@ class SessionManager:
             
             # 保存会话数据
             self._save_session(session_id, user_id, session_data)
-            logger.info(f"创建新会话成功 - 用户ID: {user_id}, 会话ID: {session_id}")
+            self.retention.touch(user_id, session_id)
+            logger.info("创建新会话成功 - 用户ID: %s, 会话ID: %s", user_id, session_id)
             
             return session_id
         except Exception as e:
-            logger.error(f"创建会话失败: {str(e)}")
+            logger.error("创建会话失败: %s", e)
             raise
     
     def get_session(self, session_id, user_id):
@@ -58,16 +65,17 @@ class SessionManager:
             session_data = cache.get(session_key)
             
             if session_data is None:
-                logger.warning(f"会话不存在: {session_id}")
+                logger.warning("会话不存在: %s", session_id)
                 return None
             
             # 更新最后活动时间
             session_data['last_active'] = time.time()
             self._save_session(session_id, user_id, session_data)
+            self.retention.touch(user_id, session_id, now=session_data['last_active'])
             
             return session_data
         except Exception as e:
-            logger.error(f"获取会话失败: {str(e)}")
+            logger.error("获取会话失败: %s", e)
             return None
     
     def save_history(self, session_id, request, history):
@@ -75,10 +83,10 @@ class SessionManager:
         user_id = get_user_id(request)
         try:
             history_key = f"{self.history_prefix}{user_id}:{session_id}"
-            self.redis_client.set(history_key, json.dumps(history))
-            logger.debug(f"保存历史记录成功 - 会话ID: {session_id}")
+            self.retention.touch(user_id, session_id, {history_key: codec.dumps(history)})
+            logger.debug("保存历史记录成功 - 会话ID: %s", session_id)
         except Exception as e:
-            logger.error(f"保存历史记录失败: {str(e)}")
+            logger.error("保存历史记录失败: %s", e)
     
     def get_history(self, session_id, request):
         """获取会话历史记录"""
@@ -86,10 +94,10 @@ class SessionManager:
         history_key = f"{self.history_prefix}{user_id}:{session_id}"
         try:
             data = self.redis_client.get(history_key)
-            logger.info(f"get_history: user_id={user_id}, session_id={session_id}, key={history_key}, data_len={len(data) if data else 0}")
-            return json.loads(data) if data else []
+            logger.debug("get_history: user_id=%s, session_id=%s, key=%s, data_len=%s", user_id, session_id, history_key, len(data) if data else 0)
+            return codec.loads(data) if data else []
         except Exception as e:
-            logger.error(f"获取历史记录失败: {str(e)}")
+            logger.error("获取历史记录失败: %s", e)
             return []
     
     def save_symptoms(self, session_id, request, symptoms):
@@ -97,10 +105,10 @@ class SessionManager:
         user_id = get_user_id(request)
         try:
             symptoms_key = f"{self.symptoms_prefix}{user_id}:{session_id}"
-            self.redis_client.set(symptoms_key, json.dumps(symptoms))
-            logger.debug(f"保存症状信息成功 - 会话ID: {session_id}")
+            self.retention.touch(user_id, session_id, {symptoms_key: codec.dumps(symptoms)})
+            logger.debug("保存症状信息成功 - 会话ID: %s", session_id)
         except Exception as e:
-            logger.error(f"保存症状信息失败: {str(e)}")
+            logger.error("保存症状信息失败: %s", e)
     
     def get_symptoms(self, session_id, request):
         """获取症状信息"""
@@ -108,36 +116,26 @@ class SessionManager:
         try:
             symptoms_key = f"{self.symptoms_prefix}{user_id}:{session_id}"
             data = self.redis_client.get(symptoms_key)
-            return json.loads(data) if data else {}
+            return codec.loads(data) if data else {}
         except Exception as e:
-            logger.error(f"获取症状信息失败: {str(e)}")
+            logger.error("获取症状信息失败: %s", e)
             return {}
     
     def get_all_sessions(self, request, count=3, offset=0):
         """获取用户的所有会话"""
         user_id = get_user_id(request)
         try:
-            pattern = f"{self.history_prefix}{user_id}:*"
-            cursor = 0
-            session_ids = []
-            
-            while True:
-                cursor, keys = self.redis_client.scan(cursor=cursor, match=pattern, count=100)
-                session_ids.extend([
-                    (k.decode() if isinstance(k, bytes) else k).split(":", 3)[3]
-                    for k in keys
-                ])
-                if cursor == 0:
-                    break
+            # 从用户会话索引读取，不再SCAN整个键空间
+            session_ids = self.retention.session_ids(user_id)
             
-            # 按时间排序
+            # 按创建时间排序
             session_ids = sorted(session_ids, reverse=True)
-            logger.info(f"get_all_sessions: 提取到 session_ids={session_ids}")
+            logger.debug("get_all_sessions: 提取到 session_ids=%s", session_ids)
             sessions = []
             
             for session_id in session_ids[offset:offset+count]:
                 history = self.get_history(session_id, request)
-                logger.info(f"get_all_sessions: session_id={session_id}, history_len={len(history)}")
+                logger.debug("get_all_sessions: session_id=%s, history_len=%s", session_id, len(history))
                 if history:
                     created_at = history[0]['timestamp']
                     updated_at = history[-1]['timestamp']
@@ -151,32 +149,27 @@ class SessionManager:
             
             return sessions
         except Exception as e:
-            logger.error(f"获取会话列表失败: {str(e)}")
+            logger.error("获取会话列表失败: %s", e)
             return []
     
     def clear_session(self, session_id, user_id):
         """清除会话数据"""
         try:
             # 删除会话数据
-            session_key = f"{self.key_prefix}{user_id}:{session_id}"
-            history_key = f"{self.history_prefix}{user_id}:{session_id}"
-            symptoms_key = f"{self.symptoms_prefix}{user_id}:{session_id}"
-            
-            cache.delete(session_key)
-            self.redis_client.delete(history_key)
-            self.redis_client.delete(symptoms_key)
+            # 一次删除会话元数据、历史记录、症状信息、上下文摘要及索引项
+            self.retention.delete_sessions(user_id, [session_id])
             
-            logger.info(f"清除会话数据成功 - 会话ID: {session_id}")
+            logger.info("清除会话数据成功 - 会话ID: %s", session_id)
         except Exception as e:
-            logger.error(f"清除会话数据失败: {str(e)}")
+            logger.error("清除会话数据失败: %s", e)
     
     def _save_session(self, session_id, user_id, session_data):
         """保存会话数据"""
         try:
             session_key = f"{self.key_prefix}{user_id}:{session_id}"
-            cache.set(session_key, session_data, timeout=None)
+            cache.set(session_key, session_data, timeout=self.retention.ttl)
         except Exception as e:
-            logger.error(f"保存会话数据失败: {str(e)}")
+            logger.error("保存会话数据失败: %s", e)
             raise
 
 def get_user_id(request):
@@ -0,0 +1,361 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from openai import BadRequestError
+
+from backend.codec import codec
+from backend.llm_gateway import LLMUnavailableError
+from backend.perf.stand_ins import InMemoryRedis
+from chat.context import ContextWindowManager, estimate_tokens
+from chat.response_cache import ResponseCache
+from chat.retention import HISTORY_PREFIX, SessionRetention
+
+
+def _use_redis(testcase, client):
+    """让回答缓存使用给定的Redis替身"""
+    patcher = mock.patch('chat.response_cache.get_redis_client', return_value=client)
+    patcher.start()
+    testcase.addCleanup(patcher.stop)
+
+
+class ResponseCacheKeyTests(SimpleTestCase):
+    """回答缓存键：只为与上下文无关的问题生成"""
+
+    def setUp(self):
+        _use_redis(self, InMemoryRedis())
+        self.cache = ResponseCache()
+
+    def test_question_with_entity_is_cached_across_phrasings(self):
+        key = self.cache.make_key('请问小麦条锈病怎么防治？', ['小麦条锈病'])
+        self.assertIsNotNone(key)
+        self.assertEqual(key, self.cache.make_key('小麦条锈病怎么防治呢', ['小麦条锈病']))
+
+    def test_question_without_entity_is_not_cached(self):
+        self.assertIsNone(self.cache.make_key('怎么防治', []))
+
+    def test_anaphoric_question_is_not_cached(self):
+        self.assertIsNone(self.cache.make_key('它怎么防治', []))
+        self.assertIsNone(self.cache.make_key('它和小麦条锈病有什么区别', ['小麦条锈病']))
+        self.assertIsNone(self.cache.make_key('这种病和小麦白粉病怎么区分', ['小麦白粉病']))
+
+
+class ResponseCachePurgeTests(SimpleTestCase):
+
+    def test_purge_deletes_cached_answers(self):
+        redis = InMemoryRedis()
+        _use_redis(self, redis)
+        cache = ResponseCache()
+        cache.set(cache.make_key('小麦条锈病怎么防治', ['小麦条锈病']), '喷施三唑酮')
+        self.assertEqual(cache.purge(), 1)
+        self.assertEqual(redis.keys('chat:answer:*'), [])
+
+    def test_purge_without_redis_clears_local_entries(self):
+        _use_redis(self, None)
+        cache = ResponseCache()
+        key = cache.make_key('小麦条锈病怎么防治', ['小麦条锈病'])
+        cache.set(key, '喷施三唑酮')
+        self.assertEqual(cache.purge(), 0)
+        self.assertIsNone(cache.get(key))
+
+
+@override_settings(CHAT_STRUCTURED_ANALYSIS=False)
+class StreamResponseCacheTests(SimpleTestCase):
+    """不同会话以相同文本追问时，不共用缓存的回答"""
+
+    histories = {
+        'rust': [{'role': 'user', 'content': '小麦条锈病有什么症状'}],
+        'mildew': [{'role': 'user', 'content': '小麦白粉病有什么症状'}],
+    }
+
+    def _ask(self, view, session_id, message):
+        messages = self.histories[session_id] + [{'role': 'user', 'content': message}]
+        chunks = list(view._generate_stream_response(messages, session_id, message, request=None))
+        return ''.join(chunk[len('data: '):-2] for chunk in chunks[1:] if chunk != 'data: [DONE]\n\n')
+
+    def test_sessions_with_different_history_do_not_share_answer(self):
+        from chat import views
+
+        _use_redis(self, InMemoryRedis())
+
+        def complete(kind, model, messages, stream):
+            # 回答取决于会话历史中讨论的病害
+            topic = messages[0]['content'][:-len('有什么症状')]
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f'{topic}的防治方法'))])
+
+        gateway = mock.Mock()
+        gateway.complete.side_effect = complete
+        view = views.ChatAPI.__new__(views.ChatAPI)
+        view.llm_gateway = gateway
+
+        with mock.patch.object(views, 'intent_service') as intent_service, \
+                mock.patch.object(views, 'graph_answer_service') as graph_answer_service, \
+                mock.patch.object(views, 'entity_linker') as entity_linker, \
+                mock.patch.object(views, 'session_manager'), \
+                mock.patch.object(views, 'response_cache', ResponseCache()), \
+                mock.patch.object(views.time, 'sleep'):
+            intent_service.recognize_intent.return_value = 'prevention'
+            graph_answer_service.answer.return_value = None
+            entity_linker.link.return_value = []
+
+            rust = self._ask(view, 'rust', '它怎么防治')
+            mildew = self._ask(view, 'mildew', '它怎么防治')
+
+        self.assertEqual(rust, '小麦条锈病的防治方法')
+        self.assertEqual(mildew, '小麦白粉病的防治方法')
+        self.assertEqual(gateway.complete.call_count, 2)
+
+
+class DiagnosisWordingTests(SimpleTestCase):
+    """只有全部症状类别命中时才给出确定的诊断"""
+
+    symptoms = {'plant_part': ['叶片'], 'weather': ['高温'], 'growth_stage': ['拔节期'], 'region': ['河南']}
+
+    def _respond(self, match_ratio):
+        from chat import views
+
+        disease = {
+            'name': '小麦条锈病', 'description': '叶片出现黄色条状孢子堆', 'control_method': '喷施三唑酮',
+            'kind': 'disease', 'match_count': round(match_ratio * 4), 'match_ratio': match_ratio,
+        }
+        view = views.ChatAPI.__new__(views.ChatAPI)
+        return view._build_diagnosis_response([disease], self.symptoms)
+
+    def test_full_match_is_confident(self):
+        self.assertIn('诊断结果为小麦条锈病', self._respond(1.0))
+
+    def test_partial_match_is_tentative(self):
+        response = self._respond(0.25)
+        self.assertNotIn('诊断结果为', response)
+        self.assertIn('可能是小麦条锈病', response)
+        self.assertIn('请补充更多信息', response)
+
+
+class GraphAnswerTests(SimpleTestCase):
+    """图谱直答只回答问到的病原、特征或防治，其他问题交给大模型"""
+
+    details = {
+        'name': '小麦条锈病', 'alias': '黄疸病', 'pathogen': '条形柄锈菌',
+        'description': '叶片出现黄色条状孢子堆', 'control_method': '喷施三唑酮',
+    }
+
+    def _answer(self, intent, message):
+        from chat.services import GraphAnswerService
+
+        with mock.patch('chat.services.entity_linker') as entity_linker:
+            entity_linker.link.return_value = ['小麦条锈病']
+            entity_linker.details.return_value = self.details
+            return GraphAnswerService().answer(intent, message)
+
+    def test_answers_requested_aspect(self):
+        answer = self._answer('knowledge', '条锈病的病原是什么')
+        self.assertIn('病原：条形柄锈菌', answer)
+        self.assertNotIn('防治措施', answer)
+
+    def test_prevention_defaults_to_control_method(self):
+        self.assertIn('防治措施：喷施三唑酮', self._answer('prevention', '条锈病咋弄'))
+
+    def test_knowledge_question_without_aspect_falls_through(self):
+        self.assertIsNone(self._answer('knowledge', '条锈病在哪些地区多发'))
+
+
+class StreamTimerTests(SimpleTestCase):
+    """每条提前结束的路径都要结束计时，否则该请求不计入耗时直方图"""
+
+    def _view(self):
+        from chat import views
+
+        view = views.ChatAPI.__new__(views.ChatAPI)
+        view.client = mock.Mock()
+        view.timer = mock.MagicMock(enabled=False)
+        return view
+
+    def test_empty_message_finishes_timer(self):
+        from django.test import RequestFactory
+        from chat import views
+
+        view = self._view()
+        timer = mock.MagicMock(enabled=False)
+        request = RequestFactory().get('/chat/stream_chat/')
+        request.user = None
+        with mock.patch.object(views, 'new_timer', return_value=timer):
+            view.stream_chat(request)
+        timer.tag.assert_called_once_with('error')
+        timer.finish.assert_called_once_with()
+
+    def test_graph_answer_finishes_timer_before_done(self):
+        from chat import views
+
+        view = self._view()
+        with mock.patch.object(views, 'intent_service') as intent_service, \
+                mock.patch.object(views, 'graph_answer_service') as graph_answer_service, \
+                mock.patch.object(views, 'session_manager'), \
+                mock.patch.object(views.time, 'sleep'):
+            intent_service.recognize_intent.return_value = 'prevention'
+            graph_answer_service.answer.return_value = '防治措施：喷施三唑酮'
+            with override_settings(CHAT_STRUCTURED_ANALYSIS=False):
+                stream = view._generate_stream_response([], 's', '条锈病咋弄', request=None)
+                for chunk in stream:
+                    if chunk == 'data: [DONE]\n\n':
+                        break
+        view.timer.finish.assert_called_once_with()
+
+
+class SessionRetentionTests(SimpleTestCase):
+    """会话保留：滑动过期、每用户上限和整理任务"""
+
+    def setUp(self):
+        patcher = mock.patch('chat.retention.cache')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.redis = InMemoryRedis()
+        self.retention = SessionRetention(self.redis, ttl=3600, max_sessions=2)
+
+    def touch(self, user_id, session_id, now):
+        history_key = f"{HISTORY_PREFIX}{user_id}:{session_id}"
+        history = codec.dumps([{'role': 'user', 'content': '叶片发黄'}])
+        self.retention.touch(user_id, session_id, {history_key: history}, now=now)
+
+    def test_cap_evicts_least_recently_active_session(self):
+        for i, session_id in enumerate(['s1', 's2', 's3']):
+            self.touch(7, session_id, now=1000 + i)
+        self.assertEqual(self.retention.session_ids(7), ['s2', 's3'])
+        self.assertFalse(self.redis.exists(f"{HISTORY_PREFIX}7:s1"))
+        self.assertGreater(self.redis.ttl(f"{HISTORY_PREFIX}7:s3"), 0)
+
+    def test_activity_protects_session_from_eviction(self):
+        self.touch(7, 's1', now=1000)
+        self.touch(7, 's2', now=1001)
+        self.touch(7, 's1', now=1002)
+        self.touch(7, 's3', now=1003)
+        self.assertEqual(self.retention.session_ids(7), ['s1', 's3'])
+
+    def test_anonymous_sessions_are_not_capped(self):
+        for i in range(4):
+            self.touch(None, f's{i}', now=1000 + i)
+        self.assertEqual(self.redis.zcard(self.retention.index_key(None)), 4)
+
+    def test_legacy_sessions_are_indexed_on_first_listing(self):
+        self.redis.set(f"{HISTORY_PREFIX}7:1700000000000", codec.dumps([]))
+        self.assertEqual(self.retention.session_ids(7), ['1700000000000'])
+        self.assertGreater(self.redis.ttl(f"{HISTORY_PREFIX}7:1700000000000"), 0)
+
+    def test_compact_archives_idle_and_prunes_expired_sessions(self):
+        now = time.time()
+        self.touch(7, 'idle', now=now - 7200)
+        self.touch(7, 'active', now=now)
+        self.redis.zadd(self.retention.index_key(7), {'gone': now})
+        self.redis.set(f"{HISTORY_PREFIX}8:legacy", codec.dumps([]))
+
+        dry = self.retention.compact(idle_seconds=3600, dry_run=True)
+        self.assertEqual((dry['archived'], dry['pruned'], dry['ttl_fixed']), (1, 1, 1))
+        self.assertEqual(self.redis.ttl(f"{HISTORY_PREFIX}8:legacy"), -1)
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            stats = self.retention.compact(idle_seconds=3600, archive_dir=archive_dir)
+            with gzip.open(os.path.join(archive_dir, os.listdir(archive_dir)[0]), 'rt', encoding='utf-8') as archive:
+                records = [json.loads(line) for line in archive]
+        self.assertEqual((stats['archived'], stats['pruned'], stats['ttl_fixed']), (1, 1, 1))
+        self.assertEqual([record['session_id'] for record in records], ['idle'])
+        self.assertEqual(records[0]['history'][0]['content'], '叶片发黄')
+        self.assertEqual(self.retention.session_ids(7), ['active'])
+        self.assertFalse(self.redis.exists(f"{HISTORY_PREFIX}7:idle"))
+        self.assertGreater(self.redis.ttl(f"{HISTORY_PREFIX}8:legacy"), 0)
+
+
+class AnalyzeMessageTests(SimpleTestCase):
+    """一次调用识别意图并抽取症状"""
+
+    def _service(self, *results):
+        from chat.services import IntentService
+
+        gateway = mock.Mock()
+        gateway.complete.side_effect = [
+            result if isinstance(result, Exception) else
+            SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=json.dumps(result)))])
+            for result in results
+        ]
+        with mock.patch('chat.services.get_openai_client'), \
+                mock.patch('chat.services.get_llm_gateway', return_value=gateway):
+            return IntentService(), gateway
+
+    def test_model_symptoms_are_normalized_and_imply_diagnosis(self):
+        service, _ = self._service(
+            {'intent': 'unknown', 'plant_part': ['叶子'], 'weather': [], 'growth_stage': [], 'region': ['河南']})
+        intent, symptoms = service.analyze_message('麦子不太对劲')
+        self.assertEqual(intent, 'diagnosis')
+        self.assertEqual(symptoms['region'], '河南')
+
+    def test_json_schema_rejection_retries_in_json_mode(self):
+        rejected = BadRequestError(
+            'response_format json_schema is not supported',
+            response=mock.Mock(status_code=400, headers={}),
+            body=None,
+        )
+        service, gateway = self._service(rejected, {'intent': 'knowledge'})
+        intent, _ = service.analyze_message('条锈病的病原是什么')
+        self.assertEqual(intent, 'knowledge')
+        self.assertEqual(gateway.complete.call_count, 2)
+        self.assertEqual(gateway.complete.call_args.kwargs['response_format'], {'type': 'json_object'})
+        self.assertEqual(service.response_format, {'type': 'json_object'})
+
+    def test_unavailable_model_uses_local_rules(self):
+        service, gateway = self._service(LLMUnavailableError('熔断'))
+        intent, symptoms = service.analyze_message('拔节期叶片发黄')
+        self.assertEqual(intent, 'diagnosis')
+        self.assertEqual(symptoms['plant_part'], '叶片')
+        self.assertEqual(gateway.complete.call_count, 1)
+
+
+class ContextWindowTests(SimpleTestCase):
+    """上下文窗口：最近轮次在预算内原样保留，更早的轮次增量写入摘要"""
+
+    def setUp(self):
+        self.redis = InMemoryRedis()
+        patcher = mock.patch('chat.context.get_redis_binary_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.manager = ContextWindowManager(token_budget=40, summary_budget=100)
+
+    @staticmethod
+    def history(count):
+        return [
+            {'role': 'user' if i % 2 == 0 else 'assistant', 'content': f'第{i}轮消息内容', 'timestamp': i + 1}
+            for i in range(count)
+        ]
+
+    def test_estimate_tokens_counts_cjk_per_character(self):
+        self.assertEqual(estimate_tokens('叶片发黄'), 4)
+        self.assertEqual(estimate_tokens('abcdefgh'), 2)
+        self.assertEqual(estimate_tokens(''), 0)
+
+    def test_short_history_is_kept_verbatim(self):
+        messages = self.manager.build_context('s1', 7, self.history(2))
+        self.assertEqual([m['content'] for m in messages], ['第0轮消息内容', '第1轮消息内容'])
+        self.assertEqual(self.redis.keys('chat:context:*'), [])
+
+    def test_older_turns_are_summarized_incrementally(self):
+        messages = self.manager.build_context('s1', 7, self.history(6))
+        self.assertEqual(messages[0]['role'], 'system')
+        self.assertIn('用户：第0轮消息内容', messages[0]['content'])
+        self.assertEqual(messages[-1]['content'], '第5轮消息内容')
+
+        with mock.patch.object(self.manager, '_summarize_message', wraps=self.manager._summarize_message) as summarize:
+            self.manager.build_context('s1', 7, self.history(8))
+        # 只有新挤出窗口的两条消息需要摘要
+        self.assertEqual(summarize.call_count, 2)
+
+    def test_summary_keeps_only_diagnosis_conclusion(self):
+        line = self.manager._summarize_message(
+            {'role': 'assistant', 'content': '根据您描述的症状，可能是小麦条锈病（与您描述的部分症状相符）。建议喷施三唑酮。'})
+        self.assertEqual(line, '助手：可能是小麦条锈病（与您描述的部分症状相符）')
+
+    def test_oversized_latest_message_is_truncated(self):
+        messages = self.manager.build_context('s1', 7, [{'role': 'user', 'content': '叶' * 200, 'timestamp': 1}])
+        self.assertEqual(len(messages), 1)
+        self.assertLessEqual(estimate_tokens(messages[0]['content']) + 4, 40)
@@ -17,8 +17,8 @@ from rest_framework import viewsets
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.renderers import JSONRenderer, BaseRenderer
-from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from users.authentication import CachedJWTAuthentication
 
 # Django相关导入
 from django.http import StreamingHttpResponse, JsonResponse
@@ -31,77 +31,86 @@ import time
 import json
 import logging
 import random
-import traceback
 
 # 导入服务
-from .services import Neo4jService, IntentService
-from backend.connections import get_openai_client
-from .session import SessionManager
+from .services import Neo4jService, IntentService, GraphAnswerService
+from backend.connections import get_openai_client, get_llm_gateway
+from backend.llm_gateway import LLMUnavailableError
+from .session import SessionManager, get_user_id
 from .utils import keyword_manager
+from .context import context_manager
+from .entities import entity_linker
+from .response_cache import response_cache
+from backend.timing import new_timer, NULL_TIMER
+from backend.registry import services
+from backend.health import get_health_checker
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+LLM_UNAVAILABLE_MESSAGE = "智能问答服务暂时繁忙。请描述小麦的发病部位、气象条件、生育期和种植区，我将根据知识图谱为您诊断。"
+
 WELCOME_MESSAGE = "您好，需要我什么帮助吗？请告诉我小麦的发病情况，包括：\n1. 从哪个部位开始发病\n2. 发病时的气象条件\n3. 发病的生育期\n4. 小麦的种植区"
 
-# 全局单例
-neo4j_service = Neo4jService()
-session_manager = SessionManager()
-intent_service = IntentService()
+# 全局单例：首次访问时才创建，导入本模块（含URL检查、管理命令）不会连接后端
+neo4j_service = services.lazy('chat.neo4j_service', Neo4jService, warm=False)
+session_manager = services.lazy('chat.session_manager', SessionManager, warm=False)
+intent_service = services.lazy('chat.intent_service', IntentService, warm=False)
+graph_answer_service = services.lazy('chat.graph_answer_service', lambda: GraphAnswerService(neo4j_service), warm=False)
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ChatAPI(viewsets.ViewSet):
     """聊天API视图集：处理与聊天相关的所有请求"""
     
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
     
+    # 请求阶段计时器，仅 stream_chat 会替换为真实计时器
+    timer = NULL_TIMER
+    
     def __init__(self, *args, **kwargs):
         """初始化ChatAPI实例"""
         super().__init__(*args, **kwargs)
         self.client = get_openai_client()
+        self.llm_gateway = get_llm_gateway()
         self.neo4j_service = neo4j_service
         logger.debug("API/Neo4j实例初始化完成")
 
     @action(detail=False, methods=['get'], authentication_classes=[], permission_classes=[])
     def stream_chat(self, request):
         """处理流式响应请求"""
-        logger.debug(f"收到stream_chat请求: {dict(request.GET)}")
+        logger.debug("收到stream_chat请求: %s", dict(request.GET))
+        self.timer = new_timer()
         
-        # 支持token从GET参数获取，自动识别用户
+        # 支持token从GET参数获取，自动识别用户（命中缓存时不再查询MySQL）
         token = request.GET.get('token')
         if token:
             try:
-                validated = JWTAuthentication().get_validated_token(token)
-                user = JWTAuthentication().get_user(validated)
-                request.user = user
+                with self.timer.span('auth'):
+                    request.user = CachedJWTAuthentication().authenticate_token(token)
             except Exception as e:
-                logger.warning(f"JWT token 解析失败: {e}")
+                logger.warning("JWT token 解析失败: %s", e)
                 request.user = None
         
         if not self.client:
             logger.error("API客户端未初始化")
-            return StreamingHttpResponse(
-                "data: Error: API client not initialized\n\n",
-                content_type='text/event-stream'
-            )
+            return self._error_stream("API client not initialized")
         
         try:
             message = request.GET.get('message')
             session_id = request.GET.get('session_id', 'default')
-            logger.debug(f"处理消息: {message}, 会话ID: {session_id}, 用户ID: {getattr(request.user, 'id', '匿名')}")
+            logger.debug("处理消息: %s, 会话ID: %s, 用户ID: %s", message, session_id, getattr(request.user, 'id', '匿名'))
             
             if not message:
                 logger.warning("接收到空消息")
-                return StreamingHttpResponse(
-                    "data: Error: Message is required\n\n",
-                    content_type='text/event-stream'
-                )
+                return self._error_stream("Message is required")
 
             # 获取历史对话并构建消息列表
-            history = session_manager.get_history(session_id, request)
-            messages = self.build_messages(message, history)
-            logger.debug(f"构建的消息列表长度: {len(messages)}")
+            with self.timer.span('history'):
+                history = session_manager.get_history(session_id, request)
+            with self.timer.span('context'):
+                messages = self.build_messages(message, history, session_id, get_user_id(request))
+            logger.debug("构建的消息列表长度: %s", len(messages))
 
             response = StreamingHttpResponse(
                 streaming_content=self._generate_stream_response(messages, session_id, message, request),
@@ -113,15 +122,21 @@ class ChatAPI(viewsets.ViewSet):
             response['X-Accel-Buffering'] = 'no'
             response['Access-Control-Allow-Origin'] = '*'
             response['Access-Control-Allow-Headers'] = '*'
+            # 响应头只能带上开始输出前的阶段，其余阶段在结束前以 timing 事件发送
+            if self.timer.enabled:
+                response['Server-Timing'] = self.timer.header()
             
             return response
                 
         except Exception as e:
-            logger.error(f"stream_chat处理异常: {str(e)}", exc_info=True)
-            return StreamingHttpResponse(
-                f"data: Error: {str(e)}\n\n",
-                content_type='text/event-stream'
-            )
+            logger.error("stream_chat处理异常: %s", e, exc_info=True)
+            return self._error_stream(str(e))
+
+    def _error_stream(self, error):
+        """开始输出前出错时直接返回错误事件，计时以 error 标签结束"""
+        self.timer.tag('error')
+        self.timer.finish()
+        return StreamingHttpResponse(f"data: Error: {error}\n\n", content_type='text/event-stream')
 
     @action(detail=False, methods=['post'])
     def create_session(self, request):
@@ -129,13 +144,13 @@ class ChatAPI(viewsets.ViewSet):
         try:
             user = request.user
             session_id = session_manager.create_session(getattr(user, 'id', None))
-            logger.info(f"创建新会话成功 - 用户ID: {getattr(user, 'id', None)}, 会话ID: {session_id}")
+            logger.info("创建新会话成功 - 用户ID: %s, 会话ID: %s", getattr(user, 'id', None), session_id)
             return JsonResponse({
                 'status': 'success',
                 'session_id': session_id
             })
         except Exception as e:
-            logger.error(f"创建会话失败: {str(e)}")
+            logger.error("创建会话失败: %s", e)
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     @action(detail=False, methods=['post'])
@@ -169,7 +184,7 @@ class ChatAPI(viewsets.ViewSet):
             return JsonResponse({'status': 'success'})
             
         except Exception as e:
-            logger.error(f"添加消息失败: {str(e)}")
+            logger.error("添加消息失败: %s", e)
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     @action(detail=False, methods=['get'])
@@ -181,12 +196,12 @@ class ChatAPI(viewsets.ViewSet):
             offset = (page - 1) * size
             
             sessions = session_manager.get_all_sessions(request, count=size, offset=offset)
-            logger.info(f"获取会话列表成功 - 会话数: {len(sessions)}")
+            logger.info("获取会话列表成功 - 会话数: %s", len(sessions))
             
             return JsonResponse({'status': 'success', 'sessions': sessions})
             
         except Exception as e:
-            logger.error(f"获取会话列表失败: {str(e)}")
+            logger.error("获取会话列表失败: %s", e)
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     @action(detail=False, methods=['get'])
@@ -203,7 +218,7 @@ class ChatAPI(viewsets.ViewSet):
             return JsonResponse({'status': 'success', 'messages': history})
             
         except Exception as e:
-            logger.error(f"获取历史记录失败: {str(e)}")
+            logger.error("获取历史记录失败: %s", e)
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     @action(detail=False, methods=['post'])
@@ -221,7 +236,7 @@ class ChatAPI(viewsets.ViewSet):
             return JsonResponse({'status': 'success'})
             
         except Exception as e:
-            logger.error(f"保存症状失败: {str(e)}")
+            logger.error("保存症状失败: %s", e)
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     @action(detail=False, methods=['get'])
@@ -238,7 +253,7 @@ class ChatAPI(viewsets.ViewSet):
             return JsonResponse({'status': 'success', 'symptoms': symptoms})
             
         except Exception as e:
-            logger.error(f"获取症状失败: {str(e)}")
+            logger.error("获取症状失败: %s", e)
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     @action(detail=False, methods=['post'])
@@ -252,12 +267,36 @@ class ChatAPI(viewsets.ViewSet):
                 return JsonResponse({'status': 'error', 'message': 'session_id必填'}, status=400)
                 
             session_manager.clear_session(session_id, user.id)
-            logger.info(f"已清除会话 {session_id} 的所有信息")
+            logger.info("已清除会话 %s 的所有信息", session_id)
             
             return JsonResponse({'status': 'success', 'message': '已清除历史记录和症状信息'})
             
         except Exception as e:
-            logger.error(f"清除历史记录失败: {str(e)}")
+            logger.error("清除历史记录失败: %s", e)
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+
+    @action(detail=False, methods=['get'])
+    def test_connection(self, request):
+        """测试各后端连接，返回各依赖的状态和探测耗时（与 /readyz 共用缓存结果）"""
+        report = get_health_checker().check()
+        return JsonResponse({'status': 'success' if report['ready'] else 'error', 'health': report},
+                            status=200 if report['ready'] else 503)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def llm_metrics(self, request):
+        """获取大模型调用统计（仅管理员）"""
+        if not self.llm_gateway:
+            return JsonResponse({'status': 'error', 'message': 'API客户端未初始化'}, status=500)
+        return JsonResponse({'status': 'success', 'metrics': self.llm_gateway.get_metrics()})
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def purge_response_cache(self, request):
+        """清空回答缓存（仅管理员）"""
+        try:
+            deleted = response_cache.purge()
+            return JsonResponse({'status': 'success', 'deleted': deleted})
+        except Exception as e:
+            logger.error("清空回答缓存失败: %s", e)
             return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
     def _generate_stream_response(self, messages, session_id, original_message, request):
@@ -265,80 +304,148 @@ class ChatAPI(viewsets.ViewSet):
         try:
             yield "data: 正在分析您的问题...\n\n"
             
-            # 首先进行意图识别
-            intent = intent_service.recognize_intent(original_message)
-            logger.info(f"识别到的意图: {intent_service.get_intent_description(intent)}")
+            # 首先进行意图识别（结构化模式下同时抽取症状）
+            symptoms = None
+            with self.timer.span('intent'):
+                if settings.CHAT_STRUCTURED_ANALYSIS:
+                    intent, symptoms = intent_service.analyze_message(original_message)
+                else:
+                    intent = intent_service.recognize_intent(original_message)
+            self.timer.tag(intent)
+            logger.info("识别到的意图: %s", intent_service.get_intent_description(intent))
             
             # 处理基础意图
             if intent in ['greeting', 'farewell', 'thanks']:
                 response_text = self._handle_basic_intent(intent)
                 yield from self._stream_text(response_text)
-                yield "data: [DONE]\n\n"
+                yield from self._finish_stream()
                 return
             
             # 如果是诊断意图，则提取症状信息
             if intent == 'diagnosis':
-                # 提取症状信息
-                symptoms = keyword_manager.extract_symptoms(original_message)
-                logger.info(f"从消息中提取的症状: {symptoms}")
-
-                # 合并历史症状
-                history_symptoms = session_manager.get_symptoms(session_id, request)
-                if history_symptoms:
-                    for k, v in history_symptoms.items():
-                        if k not in symptoms or not symptoms[k]:
-                            symptoms[k] = v
-                logger.info(f"合并后症状: {symptoms}")
-                
-                if symptoms:
-                    # 保存合并后的症状
-                    session_manager.save_symptoms(session_id, request, symptoms)
-                    
-                    # 显示已收集的信息
-                    summary = self._summarize_collected_symptoms(symptoms)
-                    yield from self._stream_text(summary)
-                    yield "data: \\n\\n\n\n"
-                    
-                    # 查询匹配的病害
-                    if self.neo4j_service.is_connected():
-                        diseases = self.neo4j_service.query_disease(symptoms)
-                        diagnosis = self._build_diagnosis_response(diseases, symptoms)
-                        yield from self._stream_text(diagnosis)
-                    
-                    # 保存对话历史
-                    self._save_conversation_history(session_id, request, original_message, diagnosis)
-                    
-                    yield "data: [DONE]\n\n"
+                if symptoms is None:
+                    with self.timer.span('extract'):
+                        symptoms = keyword_manager.extract_symptoms(original_message)
+                handled = yield from self._stream_diagnosis(session_id, request, original_message, symptoms)
+                if handled:
+                    yield from self._finish_stream()
                     return
             
+            # 防治/知识类问题提到图谱中的病害时，直接用图谱属性作答
+            if intent in ('prevention', 'knowledge'):
+                with self.timer.span('graph_answer'):
+                    graph_answer = graph_answer_service.answer(intent, original_message)
+                if graph_answer:
+                    logger.info("使用图谱直答, 意图: %s", intent)
+                    yield from self._stream_text(graph_answer)
+                    self._save_conversation_history(session_id, request, original_message, graph_answer)
+                    yield from self._finish_stream()
+                    return
+
+            # 与上下文无关的知识类问题先查回答缓存，命中则直接输出，不再请求API
+            cache_key = None
+            if intent in response_cache.cacheable_intents:
+                with self.timer.span('response_cache'):
+                    cache_key = response_cache.make_key(original_message, entity_linker.link(original_message))
+                    cached_text = response_cache.get(cache_key) if cache_key else None
+                if cached_text:
+                    logger.info("命中回答缓存: %s", cache_key)
+                    yield from self._stream_text(cached_text)
+                    self._save_conversation_history(session_id, request, original_message, cached_text)
+                    yield from self._finish_stream()
+                    return
+
             # 如果不是诊断意图或没有提取到症状，使用API处理
-            logger.debug(f"准备请求API: model={settings.OPENAI_MODEL}, messages={messages}")
+            logger.debug("准备请求API: model=%s, messages=%s", settings.OPENAI_MODEL, messages)
             try:
-                response = self.client.chat.completions.create(
-                    model=settings.OPENAI_MODEL,
-                    messages=messages,
-                    stream=False
-                )
+                with self.timer.span('llm'):
+                    response = self.llm_gateway.complete(
+                        'completion',
+                        model=settings.OPENAI_MODEL,
+                        messages=messages,
+                        stream=False
+                    )
+            except LLMUnavailableError as e:
+                # 上游故障或熔断时快速失败，改走本地诊断
+                logger.warning("大模型不可用，改用本地诊断: %s", e)
+                with self.timer.span('extract'):
+                    symptoms = keyword_manager.extract_symptoms(original_message)
+                handled = yield from self._stream_diagnosis(session_id, request, original_message, symptoms)
+                if not handled:
+                    yield from self._stream_text(LLM_UNAVAILABLE_MESSAGE)
+                yield from self._finish_stream()
+                return
             except Exception as e:
-                logger.error(f"API非流式请求异常: {str(e)}\n{traceback.format_exc()}")
+                logger.error("API非流式请求异常: %s", e, exc_info=True)
                 yield f"data: Error: API非流式请求异常 - {str(e)}\n\n"
                 return
                 
             response_text = response.choices[0].message.content
-            logger.info(f"API返回内容: {response_text}")
+            logger.debug("API返回内容: %s", response_text)
             if not response_text:
                 response_text = "很抱歉，暂时无法理解您的问题，请补充更多描述。"
+            elif cache_key:
+                response_cache.set(cache_key, response_text)
                 
             yield from self._stream_text(response_text)
             
             # 保存对话历史
             self._save_conversation_history(session_id, request, original_message, response_text)
             
-            yield "data: [DONE]\n\n"
+            yield from self._finish_stream()
             
         except Exception as e:
-            logger.error(f"生成响应时发生错误: {str(e)}\n{traceback.format_exc()}")
+            logger.error("生成响应时发生错误: %s", e, exc_info=True)
             yield f"data: Error: 服务器内部错误 - {str(e)}\n\n"
+        finally:
+            self.timer.finish()
+
+    def _finish_stream(self):
+        """结束计时，输出阶段耗时事件和结束标记"""
+        timing_event = self.timer.sse_event() if self.timer.enabled else None
+        self.timer.finish()
+        if timing_event:
+            yield timing_event
+        yield "data: [DONE]\n\n"
+
+    def _stream_diagnosis(self, session_id, request, original_message, symptoms):
+        """基于症状和知识图谱的本地诊断，流式输出诊断结果
+
+        Returns:
+            bool: 是否已完成诊断（合并历史后仍没有任何症状时返回False）
+        """
+        logger.debug("从消息中提取的症状: %s", symptoms)
+
+        # 合并历史症状
+        with self.timer.span('symptom_store'):
+            history_symptoms = session_manager.get_symptoms(session_id, request)
+        if history_symptoms:
+            for k, v in history_symptoms.items():
+                if k not in symptoms or not symptoms[k]:
+                    symptoms[k] = v
+        logger.info("合并后症状: %s", symptoms)
+        
+        if not symptoms:
+            return False
+            
+        # 保存合并后的症状
+        with self.timer.span('symptom_store'):
+            session_manager.save_symptoms(session_id, request, symptoms)
+        
+        # 显示已收集的信息
+        summary = self._summarize_collected_symptoms(symptoms)
+        yield from self._stream_text(summary)
+        yield "data: \\n\\n\n\n"
+        
+        # 查询匹配的病害（Neo4j不可用时由本地图谱快照提供）
+        with self.timer.span('query_disease'):
+            diseases = self.neo4j_service.query_disease(symptoms)
+        diagnosis = self._build_diagnosis_response(diseases, symptoms)
+        yield from self._stream_text(diagnosis)
+        
+        # 保存对话历史
+        self._save_conversation_history(session_id, request, original_message, diagnosis)
+        return True
 
     def _handle_basic_intent(self, intent):
         """处理基础意图（问候、告别、感谢）"""
@@ -350,33 +457,44 @@ class ChatAPI(viewsets.ViewSet):
         return responses.get(intent, "抱歉，我没有理解您的意思。")
 
     def _stream_text(self, text):
-        """流式输出文本"""
-        for char in text:
-            if char == '\n':
-                yield "data: \\n\n\n"
-            else:
-                yield f"data: {char}\n\n"
-            time.sleep(0.05)
+        """流式输出文本（逐字间隔0.05秒，间隔合计计入 stream_delay 阶段）"""
+        delayed = 0.0
+        try:
+            for char in text:
+                if char == '\n':
+                    yield "data: \\n\n\n"
+                else:
+                    yield f"data: {char}\n\n"
+                start = time.perf_counter()
+                time.sleep(0.05)
+                delayed += time.perf_counter() - start
+        finally:
+            self.timer.add('stream_delay', delayed)
 
     def _save_conversation_history(self, session_id, request, user_message, assistant_message):
         """保存对话历史"""
-        history = session_manager.get_history(session_id, request)
-        history.append({
-            'role': 'user',
-            'content': user_message,
-            'timestamp': time.time()
-        })
-        history.append({
-            'role': 'assistant',
-            'content': assistant_message,
-            'timestamp': time.time()
-        })
-        if len(history) > 50:
-            history = history[-50:]
-        session_manager.save_history(session_id, request, history)
-
-    def build_messages(self, message, history):
-        """构建发送给AI的消息列表"""
+        with self.timer.span('save_history'):
+            history = session_manager.get_history(session_id, request)
+            history.append({
+                'role': 'user',
+                'content': user_message,
+                'timestamp': time.time()
+            })
+            history.append({
+                'role': 'assistant',
+                'content': assistant_message,
+                'timestamp': time.time()
+            })
+            if len(history) > 50:
+                history = history[-50:]
+            session_manager.save_history(session_id, request, history)
+
+    def build_messages(self, message, history, session_id='default', user_id=None):
+        """构建发送给AI的消息列表
+
+        历史记录经上下文窗口管理器裁剪：最近几轮按token预算原样保留，
+        更早的轮次以滚动摘要形式提供，请求规模不随对话长度增长。
+        """
         return [
             {
                 "role": "system",
@@ -389,7 +507,7 @@ class ChatAPI(viewsets.ViewSet):
                 
                 请使用专业但易懂的语言，必要时解释专业术语。"""
             }
-        ] + history + [{"role": "user", "content": message}]
+        ] + context_manager.build_context(session_id, user_id, history) + [{"role": "user", "content": message}]
 
     def _summarize_collected_symptoms(self, symptoms):
         """总结已收集的症状信息"""
@@ -482,11 +600,22 @@ class ChatAPI(viewsets.ViewSet):
                 elif category == 'region':
                     info.append(f"种植区：{format_symptom_value(value)}")
             response += "\n" + "，".join(info)
-            response += f"\n\n诊断结果为{disease['name']}。"
-            response += f"\n病害特征：{disease['description']}"
+            name = f"{disease['name']}（虫害）" if disease.get('kind') == 'pest' else disease['name']
+            # 只有提供的症状类别全部命中时才给出确定的诊断，部分命中时只作为可能的结果
+            confident = disease.get('match_ratio', 1) >= 1
+            if confident:
+                response += f"\n\n诊断结果为{name}。"
+            else:
+                response += f"\n\n可能是{name}（与您描述的部分症状相符）。"
+            if disease.get('kind') == 'pest':
+                response += f"\n为害特征：{disease['description']}"
+            else:
+                response += f"\n病害特征：{disease['description']}"
             response += f"\n防治建议：{disease['control_method']}"
             if 'prevention' in disease:
                 response += f"\n预防措施：{disease['prevention']}"
+            if not confident:
+                response += "\n\n请补充更多信息，以便我更准确地判断。"
             return response
         
         # 多个可能的病害，列出简要信息
@@ -502,11 +631,13 @@ class ChatAPI(viewsets.ViewSet):
             elif category == 'region':
                 info.append(f"种植区：{format_symptom_value(value)}")
         response += "\n" + "，".join(info)
-        response += "\n\n可能的病害有："
+        response += "\n\n可能的病虫害有："
         
         # 按匹配度排序疾病列表
         for i, disease in enumerate(diseases, 1):
             response += f"\n{i}. {disease['name']}"
+            if disease.get('kind') == 'pest':
+                response += "（虫害）"
             response += f"\n   主要特征: {disease['description'][:100]}..."
         
         response += "\n\n请补充更多信息，以便我更准确地判断。"
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from backend.connections import get_neo4j_driver
+from backend.graph_snapshot import export_snapshot
+
+class Command(BaseCommand):
+    help = '从Neo4j导出本地图谱快照（Neo4j不可用时用于诊断和图谱查询）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help=f'快照文件路径，默认 {settings.GRAPH_SNAPSHOT_PATH}')
+
+    def handle(self, *args, **options):
+        try:
+            driver = get_neo4j_driver()
+            if driver is None:
+                raise RuntimeError('Neo4j连接未初始化')
+            node_count, edge_count = export_snapshot(driver, options['path'])
+            self.stdout.write(self.style.SUCCESS(f'图谱快照导出成功: {node_count} 个节点，{edge_count} 条关系'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'图谱快照导出失败: {str(e)}'))
@@ -1,13 +1,84 @@
+import json
 from django.core.management.base import BaseCommand
 from backend.graph_manager import GraphManager
+from backend.ingestion import format_timings
+from backend.timing import RequestTimer
+
+KIND_NAMES = {'disease': '病害', 'pest': '虫害'}
+CATEGORY_NAMES = {
+    'plant_part': '部位',
+    'weather': '气象',
+    'growth_stage': '生育期',
+    'region': '地区',
+    'host_crop': '寄主作物',
+    'natural_enemy': '天敌',
+}
+STATUS_NAMES = {'added': '新增', 'changed': '变化', 'unchanged': '不变', 'removed': '删除'}
 
 class Command(BaseCommand):
     help = '初始化知识图谱数据'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--disease-file', default=None, help='病害数据文件（CSV或XLSX），默认 static/File/小麦病害信息.csv')
+        parser.add_argument('--pest-file', default=None, help='虫害数据文件（CSV或XLSX），默认 static/File/小麦虫害信息.csv')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='关键词提取进程数，0表示使用全部CPU核心，1表示在当前进程中提取')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='只解析和提取并与当前图谱比较，不写入Neo4j或本地快照')
+        parser.add_argument('--report', default=None, help='预演时把完整差异报告以JSON写入该文件')
+
     def handle(self, *args, **options):
+        timer = RequestTimer()
         try:
             manager = GraphManager()
-            manager.init_graph()
-            self.stdout.write(self.style.SUCCESS('知识图谱初始化成功'))
+            kwargs = {
+                'disease_file': options['disease_file'],
+                'pest_file': options['pest_file'],
+                'workers': options['workers'],
+                'timer': timer,
+            }
+            if options['dry_run']:
+                report = manager.dry_run(**kwargs)
+                self._print_report(report, options['verbosity'])
+                if options['report']:
+                    with open(options['report'], 'w', encoding='utf-8') as f:
+                        json.dump(report, f, ensure_ascii=False, indent=2)
+                    self.stdout.write(f'差异报告已写入 {options["report"]}')
+            else:
+                manager.init_graph(**kwargs)
+                self.stdout.write(self.style.SUCCESS('知识图谱初始化成功'))
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'初始化失败: {str(e)}')) 
\ No newline at end of file
+            self.stdout.write(self.style.ERROR(f'初始化失败: {str(e)}'))
+        finally:
+            if timer.stages:
+                self.stdout.write(f'阶段耗时: {format_timings(timer.stages)}，合计 {timer.elapsed():.2f}s')
+
+    def _print_report(self, report, verbosity):
+        """逐行输出提取结果；verbosity 为0时只输出汇总，为1时省略不变的行"""
+        if verbosity > 0:
+            for row in report['rows']:
+                if row['status'] == 'unchanged' and verbosity < 2:
+                    continue
+                self.stdout.write(f"[{STATUS_NAMES[row['status']]}] {KIND_NAMES[row['kind']]} {row['name']}")
+                for category, targets in row['links'].items():
+                    line = f"    {CATEGORY_NAMES.get(category, category)}: {'、'.join(targets) or '-'}"
+                    changes = [f"+{name}" for name in row['added'].get(category, [])]
+                    changes += [f"-{name}" for name in row['removed'].get(category, [])]
+                    if changes:
+                        line += f"  ({' '.join(changes)})"
+                    self.stdout.write(line)
+                for category, targets in row['removed'].items():
+                    if category not in row['links']:
+                        self.stdout.write(f"    {CATEGORY_NAMES.get(category, category)}: -  "
+                                          f"({' '.join('-' + name for name in targets)})")
+                if row['properties']:
+                    self.stdout.write(f"    属性变化: {'、'.join(row['properties'])}")
+            for item in report['removed']:
+                self.stdout.write(f"[{STATUS_NAMES['removed']}] {KIND_NAMES.get(item['kind'], item['kind'])} {item['name']}")
+
+        summary = report['summary']
+        for kind in report['counts']:
+            self.stdout.write(f"{KIND_NAMES[kind]}数据: 成功 {report['counts'][kind]} 条，失败 {report['errors'][kind]} 条")
+        self.stdout.write(self.style.SUCCESS(
+            '预演完成（未写入图谱）: ' + '，'.join(f"{STATUS_NAMES[status]} {count}" for status, count in summary.items())
+        ))
@@ -1,27 +1,75 @@
 from django.core.management.base import BaseCommand
-from knowledge.views import KnowledgeGraphAPI
-from neo4j import GraphDatabase
 from django.conf import settings
-from backend.graph_manager import GraphManager, get_neo4j_driver
+from backend.graph_migration import GraphMigration, Neo4jSource, SnapshotSource, Neo4jTarget
+from backend.graph_snapshot import export_snapshot
 
 class Command(BaseCommand):
-    help = '将现有的图谱数据迁移到Neo4j数据库'
+    help = '将图谱数据分批迁移到Neo4j数据库（源为本地快照或另一个Neo4j实例），支持断点续传'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', default=None,
+                            help=f'源图谱快照文件，未指定 --source-uri 时使用，默认 {settings.GRAPH_SNAPSHOT_PATH}')
+        parser.add_argument('--source-uri', default=None, help='源Neo4j地址，指定后从该实例迁移')
+        parser.add_argument('--source-user', default=None, help='源Neo4j用户名，默认与目标相同')
+        parser.add_argument('--source-password', default=None, help='源Neo4j密码，默认与目标相同')
+        parser.add_argument('--target-uri', default=None, help='目标Neo4j地址，默认 NEO4J_URI')
+        parser.add_argument('--target-user', default=None, help='目标Neo4j用户名，默认 NEO4J_USER')
+        parser.add_argument('--target-password', default=None, help='目标Neo4j密码，默认 NEO4J_PASSWORD')
+        parser.add_argument('--batch-size', type=int, default=settings.GRAPH_MIGRATION_BATCH_SIZE,
+                            help='每批节点或关系数')
+        parser.add_argument('--workers', type=int, default=settings.GRAPH_MIGRATION_WORKERS, help='并行写入线程数')
+        parser.add_argument('--checkpoint', default=settings.GRAPH_MIGRATION_CHECKPOINT_PATH, help='检查点文件')
+        parser.add_argument('--resume', action='store_true', help='从检查点继续上一次中断的迁移')
+        parser.add_argument('--clear-target', action='store_true', help='从头开始迁移前清空目标库')
 
     def handle(self, *args, **options):
+        from neo4j import GraphDatabase
+
+        target_uri = options['target_uri'] or settings.NEO4J_URI
+        target_auth = (options['target_user'] or settings.NEO4J_USER,
+                       options['target_password'] or settings.NEO4J_PASSWORD)
+        drivers = []
         try:
-            # 先测试Neo4j连接
-            driver = get_neo4j_driver()
-            with driver.session() as session:
-                session.run("MATCH (n) RETURN count(n) as count")
-            # 连接成功后再执行迁移
-            api = KnowledgeGraphAPI()
-            api.load_graph_data()
-            self.stdout.write(self.style.SUCCESS('数据迁移成功'))
-            
+            target_driver = GraphDatabase.driver(target_uri, auth=target_auth)
+            drivers.append(target_driver)
+            # 先测试目标连接，避免读取源数据后才发现无法写入
+            target_driver.verify_connectivity()
+
+            if options['source_uri']:
+                source_driver = GraphDatabase.driver(options['source_uri'], auth=(
+                    options['source_user'] or target_auth[0], options['source_password'] or target_auth[1]))
+                drivers.append(source_driver)
+                source = Neo4jSource(source_driver, options['source_uri'])
+            else:
+                source = SnapshotSource(options['snapshot'] or settings.GRAPH_SNAPSHOT_PATH)
+
+            migration = GraphMigration(
+                source,
+                Neo4jTarget(target_driver, target_uri),
+                options['checkpoint'],
+                batch_size=options['batch_size'],
+                workers=options['workers']
+            )
+            result = migration.run(resume=options['resume'], clear_target=options['clear_target'])
+            seconds = max(result['seconds'], 1e-9)
+            self.stdout.write(self.style.SUCCESS(
+                f"数据迁移成功: 节点 {result['done']['nodes']} 个，关系 {result['done']['edges']} 条，"
+                f"跳过 {sum(result['skipped'].values())} 条，耗时 {result['seconds']:.2f}s，"
+                f"{(result['done']['nodes'] + result['done']['edges']) / seconds:.0f} 条/秒"
+            ))
+
+            if target_uri == settings.NEO4J_URI:
+                # 迁入本项目使用的库后刷新本地快照，Neo4j不可用时诊断使用迁移后的数据
+                export_snapshot(target_driver)
+
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'数据迁移失败: {str(e)}\n'
+                               f'已完成的批次记录在检查点 {options["checkpoint"]}，修复后加 --resume 重新运行可继续迁移\n'
                                f'请检查Neo4j服务是否启动，以及连接配置是否正确:\n'
-                               f'URI: {settings.NEO4J_URI}\n'
-                               f'User: {settings.NEO4J_USER}')
-            ) 
\ No newline at end of file
+                               f'URI: {target_uri}\n'
+                               f'User: {target_auth[0]}')
+            )
+        finally:
+            for driver in drivers:
+                driver.close()
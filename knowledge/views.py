@@ -32,7 +32,7 @@ class KnowledgeGraphAPI(viewsets.ViewSet):
     def graph(self, request):
         """获取完整的知识图谱数据"""
         try:
-            if not self.service.is_connected():
+            if not self.service.is_available():
                 return Response(
                     {'error': 'Neo4j数据库未连接,请检查Neo4j是否启动'},
                     status=500
@@ -42,7 +42,7 @@ class KnowledgeGraphAPI(viewsets.ViewSet):
             return Response(graph_data)
                 
         except Exception as e:
-            logger.error(f"获取图谱数据失败: {str(e)}")
+            logger.error("获取图谱数据失败: %s", e)
             return Response(
                 {'error': f'获取图谱数据失败: {str(e)}'},
                 status=500
@@ -63,7 +63,7 @@ class KnowledgeGraphAPI(viewsets.ViewSet):
             return Response(node_data)
                 
         except Exception as e:
-            logger.error(f"获取节点详情失败: {str(e)}")
+            logger.error("获取节点详情失败: %s", e)
             return Response({'error': str(e)}, status=500)
 
     @action(detail=False, methods=['GET'])
@@ -80,7 +80,7 @@ class KnowledgeGraphAPI(viewsets.ViewSet):
             return Response(related_nodes)
             
         except Exception as e:
-            logger.error(f"获取相关节点失败: {str(e)}")
+            logger.error("获取相关节点失败: %s", e)
             return Response({'error': str(e)}, status=500)
 
     @action(detail=False, methods=['GET'])
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
-    verbose_name = '用户管理' 
\ No newline at end of file
+    verbose_name = '用户管理'
+
+    def ready(self):
+        """用户保存或删除后失效其已缓存的token，禁用账号、修改角色立即生效"""
+        from users.authentication import invalidate_cached_tokens
+        user_model = self.get_model('User')
+        post_save.connect(invalidate_cached_tokens, sender=user_model, dispatch_uid='users.invalidate_tokens_on_save')
+        post_delete.connect(invalidate_cached_tokens, sender=user_model, dispatch_uid='users.invalidate_tokens_on_delete')
@@ -0,0 +1,212 @@
+"""
+用户认证模块
+
+提供带缓存的JWT认证，包括：
+- 每次请求校验token签名和有效期（不访问数据库），request.auth 为校验后的token
+- 进程内LRU + Redis两级缓存 token -> 用户快照，省去每次请求查询MySQL
+- 用户保存或删除时主动失效缓存（见 invalidate_cached_tokens，在 UsersConfig.ready 中注册）
+"""
+
+import time
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+from backend.connections import get_redis_client
+from backend.metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CachedUser:
+    """缓存中的用户快照：只保留请求链路用到的字段，避免每次请求查询MySQL"""
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, account='', role='user', is_active=True, is_staff=False, is_superuser=False):
+        self.id = id
+        self.pk = id
+        self.account = account
+        self.role = role
+        self.is_active = is_active
+        self.is_staff = is_staff
+        self.is_superuser = is_superuser
+
+    @property
+    def is_admin(self):
+        """判断是否为管理员"""
+        return self.role == 'admin'
+
+    @classmethod
+    def from_user(cls, user):
+        """从User模型实例生成快照"""
+        return cls(
+            id=user.id,
+            account=getattr(user, 'account', ''),
+            role=getattr(user, 'role', 'user'),
+            is_active=user.is_active,
+            is_staff=user.is_staff,
+            is_superuser=user.is_superuser
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'account': self.account,
+            'role': self.role,
+            'is_active': self.is_active,
+            'is_staff': self.is_staff,
+            'is_superuser': self.is_superuser
+        }
+
+    def __str__(self):
+        return f'{self.account}({self.role})'
+
+
+class TokenCache:
+    """token -> 用户快照的两级缓存
+
+    - 进程内LRU：命中时不访问任何外部服务，条目寿命不超过 JWT_CACHE_LOCAL_TTL，
+      以限制其他进程禁用账号后的最大滞后时间
+    - Redis：跨进程共享，条目寿命等于token剩余有效期
+    """
+
+    def __init__(self):
+        self.key_prefix = "auth:token:"
+        self.user_index_prefix = "auth:user_tokens:"
+        self.max_size = getattr(settings, 'JWT_CACHE_LOCAL_SIZE', 1024)
+        self.local_ttl = getattr(settings, 'JWT_CACHE_LOCAL_TTL', 60)
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def token_key(raw_token):
+        """token本身不落盘，只用其摘要作为键"""
+        if isinstance(raw_token, str):
+            raw_token = raw_token.encode('utf-8')
+        return hashlib.sha256(raw_token).hexdigest()
+
+    def get(self, digest):
+        """按token摘要获取用户快照，未命中返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._local.get(digest)
+            if entry is not None:
+                expires_at, user = entry
+                if expires_at > now:
+                    self._local.move_to_end(digest)
+                    record_cache('token', 'local_hit')
+                    return user
+                del self._local[digest]
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return None
+        try:
+            data = redis_client.get(f"{self.key_prefix}{digest}")
+            record_cache('token', 'hit' if data else 'miss')
+            if not data:
+                return None
+            payload = json.loads(data)
+            user = CachedUser(**payload['user'])
+            self._set_local(digest, user, payload['exp'])
+            return user
+        except Exception as e:
+            logger.warning("读取token缓存失败: %s", e)
+            return None
+
+    def set(self, digest, user, exp):
+        """缓存用户快照，exp为token过期时间戳"""
+        remaining = int(exp - time.time())
+        if remaining <= 0:
+            return
+        self._set_local(digest, user, exp)
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return
+        try:
+            index_key = f"{self.user_index_prefix}{user.id}"
+            pipe = redis_client.pipeline()
+            pipe.set(f"{self.key_prefix}{digest}", json.dumps({'user': user.to_dict(), 'exp': exp}), ex=remaining)
+            pipe.sadd(index_key, digest)
+            pipe.expire(index_key, int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds()))
+            pipe.execute()
+        except Exception as e:
+            logger.warning("写入token缓存失败: %s", e)
+
+    def invalidate_user(self, user_id):
+        """失效某个用户的全部缓存token"""
+        with self._lock:
+            for digest in [d for d, (_, u) in self._local.items() if u.id == user_id]:
+                del self._local[digest]
+
+        redis_client = get_redis_client()
+        if redis_client is None:
+            return
+        try:
+            index_key = f"{self.user_index_prefix}{user_id}"
+            digests = redis_client.smembers(index_key)
+            keys = [f"{self.key_prefix}{d}" for d in digests] + [index_key]
+            redis_client.delete(*keys)
+            logger.info("已失效用户 %s 的 %s 个token缓存", user_id, len(digests))
+        except Exception as e:
+            logger.error("失效token缓存失败: %s", e)
+
+    def _set_local(self, digest, user, exp):
+        expires_at = min(exp, time.time() + self.local_ttl)
+        with self._lock:
+            self._local[digest] = (expires_at, user)
+            self._local.move_to_end(digest)
+            while len(self._local) > self.max_size:
+                self._local.popitem(last=False)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """带缓存的JWT认证：token每次都校验签名和有效期，用户只在缓存未命中时查询数据库"""
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return self._cached_user(raw_token, validated_token), validated_token
+
+    def authenticate_token(self, raw_token):
+        """校验token并返回用户（快照），失败时抛出 InvalidToken/AuthenticationFailed"""
+        return self._cached_user(raw_token, self.get_validated_token(raw_token))
+
+    def _cached_user(self, raw_token, validated_token):
+        digest = TokenCache.token_key(raw_token)
+        user = token_cache.get(digest)
+        if user is not None:
+            return user
+
+        user = CachedUser.from_user(self.get_user(validated_token))
+        token_cache.set(digest, user, validated_token['exp'])
+        return user
+
+
+def invalidate_cached_tokens(sender, instance, update_fields=None, **kwargs):
+    """用户保存（含后台、ORM修改启用状态和角色）或删除后失效其已缓存的token
+
+    登录时只更新 last_login，不影响缓存的用户快照，不做失效。
+    """
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.invalidate_user(instance.pk)
+
+
+# 全局token缓存实例
+token_cache = TokenCache()
@@ -108,6 +108,7 @@ class User(AbstractUser):
     def disable_account(self):
         """禁用账号"""
         self.is_active = False
+        # 保存后由 post_save 信号失效该用户已缓存的token，下次请求重新走数据库校验
         self.save()
     
     def enable_account(self):